@@ -1,33 +1,77 @@
 import os
+import time
 
-import pandas as pd
+from flask import Flask, g, jsonify, render_template, request, redirect, url_for
 
-from datetime import datetime, timedelta
-from shapely.geometry import Point
-from flask import Flask, render_template, request, redirect, url_for
+from src.api import foodbank_geojson, parse_origin, search_results
+from src.backend.data_store import STORE
+from src.backend.frontend_handler import SHARDS, foodfind_asap, foodfind_nearest
+from src.backend.metrics import METRICS
+from src.coordinates import get_coords_from_coords, get_coords_from_postcode, LongLat
+from src.display import ROW_FRAGMENTS, html_table, search_markers
 
-from src.backend.frontend_handler import foodfind_asap, foodfind_nearest
-from src.coordinates import get_coords_from_coords, get_coords_from_postcode, PC_LIST
-from src.display import html_table
 
-
-MAP_CENTRE = [53.4, -1.4]
+MAP_CENTRE = SHARDS.region_config().get("MAP_CENTRE", [53.4, -1.4])
 MAP_ZOOM = 11
 
+# postcode autocomplete, bounded number of matches and browser cache lifetime
+POSTCODE_MATCH_LIMIT = 10
+POSTCODE_CACHE_SECONDS = 24 * 60 * 60
+
+# browser cache lifetime of foodbank locations, revalidated by ETag after
+GEOJSON_CACHE_SECONDS = 60 * 60
+
+# maximum number of origins in one batch search
+BATCH_ORIGIN_LIMIT = 5000
+
+
+# load the default region and render the results table cells of every
+# foodbank up front
+FOODBANKS = STORE.default_shard.foodbanks
+with STORE.timed("index", "row_fragments"):
+    ROW_FRAGMENTS.add(FOODBANKS, region=SHARDS.default)
+
+
+# request metrics, shared with the other workers through the metrics directory
+METRICS.directory = STORE.config.get("METRICS_DIR")
+
+
+def record_process_metrics():
+    """ Records start up timings, including data loaded lazily since, for `/metrics`. """
+    for (phase, step), seconds in list(STORE.timings.items()):
+        METRICS.set_gauge("foodfinder_startup_seconds", seconds, phase=phase, step=step)
+
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY")
 
 
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    if "request_start" in g:
+        METRICS.observe(
+            "foodfinder_request_seconds",
+            time.perf_counter() - g.request_start,
+            endpoint=request.endpoint or "unknown",
+        )
+        record_process_metrics()
+        METRICS.flush()
+    return response
+
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     # Handle case, no search
     if request.method == "GET":
         return render_template(
             "index.html",
-            pc_list=PC_LIST,
             foodbanks="",
-            df=pd.DataFrame(),
+            markers=search_markers(FOODBANKS.iloc[:0]),
             map_zoom=MAP_ZOOM,
             marker=MAP_CENTRE,
         )
@@ -41,11 +85,13 @@ def index():
         if query_location == "postcode":
             postcode = request.form["pcode"].replace(" ", "")
             map_zoom = MAP_ZOOM + 2
-            marker = get_coords_from_postcode(postcode)
+            with METRICS.timed("geocode"):
+                marker = get_coords_from_postcode(postcode, SHARDS)
         
         elif query_location == "coords":
             map_zoom = MAP_ZOOM + 2
-            marker = get_coords_from_coords(request.form["coords"])
+            with METRICS.timed("geocode"):
+                marker = get_coords_from_coords(request.form["coords"])
             print(marker)
 
         else:
@@ -78,7 +124,7 @@ def index():
                 print("Looking for nearest")
                 foodbanks = foodfind_nearest(
                     method="place_from",
-                    place_from=Point(marker[1], marker[0]),
+                    place_from=LongLat(marker[1], marker[0]),
                     dist_range=range * 1000,
                     days=days,
                 )
@@ -89,24 +135,82 @@ def index():
                 )
             else:
                 foodbanks = foodfind_asap(
-                    method="place_from", place_from=Point(marker[1], marker[0]), dist_range=range * 1000
+                    method="place_from", place_from=LongLat(marker[1], marker[0]), dist_range=range * 1000
                 )
 
-        foodbanks["color"] = "cyan"  # based on days to opening
-        msk_today = foodbanks.opening.str.contains(datetime.now().strftime("%A"))
-        msk_tomorrow = foodbanks.opening.str.contains(
-            (datetime.now() + timedelta(days=1)).strftime("%A")
-        )
-        foodbanks.loc[msk_today | msk_tomorrow, "color"] = "blue"
-
-        return render_template(
-            "index.html",
-            pc_list=PC_LIST,
-            foodbanks=html_table(foodbanks),
-            df=foodbanks,
-            map_zoom=map_zoom,
-            marker=marker,
-        )        
+        with METRICS.timed("html_table"):
+            table = html_table(foodbanks)
+        with METRICS.timed("markers"):
+            markers = search_markers(foodbanks)
+        with METRICS.timed("render"):
+            return render_template(
+                "index.html",
+                foodbanks=table,
+                markers=markers,
+                map_zoom=map_zoom,
+                marker=marker,
+            )
+
+
+@app.route("/api/postcodes")
+def postcodes():
+    """ Postcodes of any region starting with the `prefix` query argument, for autocomplete and validation. """
+    prefix = request.args.get("prefix", "")
+    limit = request.args.get("limit", POSTCODE_MATCH_LIMIT, type=int)
+    limit = max(0, min(limit, POSTCODE_MATCH_LIMIT))
+
+    response = jsonify(SHARDS.prefix_search(prefix, limit))
+    response.cache_control.public = True
+    response.cache_control.max_age = POSTCODE_CACHE_SECONDS
+    return response
+
+
+@app.route("/api/foodbanks.geojson")
+def foodbanks_geojson():
+    """ Foodbank locations of a region as GeoJSON, cacheable and revalidated by ETag. """
+    try:
+        body, etag = foodbank_geojson(request.args.get("region"))
+    except ValueError as error:
+        return jsonify(error=str(error)), 404
+
+    response = app.response_class(body, mimetype="application/geo+json")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = GEOJSON_CACHE_SECONDS
+    return response.make_conditional(request)
+
+
+@app.route("/api/search", methods=["GET", "POST"])
+def search():
+    """ JSON search from one origin, given as a postcode or lat and long. """
+    params = request.get_json(silent=True) or request.values.to_dict()
+    try:
+        results = search_results([parse_origin(params)], params)
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    return jsonify(results=results[0])
+
+
+@app.route("/api/search/batch", methods=["POST"])
+def search_batch():
+    """ JSON search from many origins in one vectorised pass, results in origin order. """
+    params = request.get_json(silent=True) or {}
+    origins = params.get("origins")
+    if not isinstance(origins, list) or not 0 < len(origins) <= BATCH_ORIGIN_LIMIT:
+        return jsonify(error=f"origins must be a list of 1 to {BATCH_ORIGIN_LIMIT} origins"), 400
+    try:
+        results = search_results([parse_origin(origin) for origin in origins], params)
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    return jsonify(results=results)
+
+
+@app.route("/metrics")
+def metrics():
+    """ Request stage timings, result counts and start up timings of every worker, in the
+    Prometheus text format. """
+    record_process_metrics()
+    return app.response_class(METRICS.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/about")
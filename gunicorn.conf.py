@@ -0,0 +1,46 @@
+""" Gunicorn configuration, loading and indexing the data once in the master
+
+The app is preloaded in the master, which builds every lazily built index and
+then freezes the loaded objects out of the cyclic garbage collector before
+forking. Workers then share the data's memory pages copy-on-write, rather than
+each loading their own copy, e.g.
+
+    gunicorn -c gunicorn.conf.py app:app
+    python -m src.backend.scripts.memory_report --pidfile gunicorn.pid
+"""
+
+import gc
+import os
+import shutil
+
+# collections in the master would touch every object's header, copying pages
+# the workers could share, so collect once before freezing instead
+gc.disable()
+
+preload_app = True
+workers = int(os.environ.get("WEB_CONCURRENCY", 8))
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+pidfile = os.environ.get("GUNICORN_PIDFILE", "gunicorn.pid")
+
+
+def on_starting(server):
+    # metrics of workers from a previous run
+    from src.backend.metrics import METRICS
+
+    if METRICS.directory:
+        shutil.rmtree(METRICS.directory, ignore_errors=True)
+
+
+def when_ready(server):
+    from src.api import foodbank_geojson
+    from src.backend.data_store import STORE
+
+    STORE.warm()
+    foodbank_geojson()
+    gc.collect()
+    gc.freeze()
+    server.log.info("Data loaded and frozen in the master:\n%s", STORE.report())
+
+
+def post_fork(server, worker):
+    gc.enable()
@@ -0,0 +1,110 @@
+# Utilities for the JSON search API
+import hashlib
+import json
+from datetime import datetime
+from functools import lru_cache
+
+from src.backend.frontend_handler import SHARDS, foodfind_batch
+from src.backend.open_times import WEEK
+
+
+# foodbank details included with each search result
+FOODBANK_FIELDS = ["name", "postcode", "opening", "lat", "long"]
+
+
+@lru_cache(maxsize=None)
+def foodbank_records(region):
+    """ Helper, details of each foodbank of a region by ID, built on first use of the region. """
+    foodbanks = SHARDS.get(region).foodbanks
+    return foodbanks.set_index("ID")[FOODBANK_FIELDS].to_dict("index")
+
+
+def parse_origin(origin):
+    """ Helper, postcode string or (long, lat) pair out of a JSON origin object. """
+    if not isinstance(origin, dict):
+        raise ValueError("each origin must be an object with a postcode, or lat and long")
+    if "postcode" in origin:
+        return str(origin["postcode"])
+    try:
+        return (float(origin["long"]), float(origin["lat"]))
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("each origin must be an object with a postcode, or lat and long")
+
+
+def parse_search(params):
+    """ Helper, keyword arguments for `foodfind_batch` out of JSON search parameters. """
+    try:
+        search = {
+            "query_type": str(params.get("query_type", "nearest")).lower(),
+            "dist_range": float(params.get("dist_range", 5000)),
+            "num_results": int(params.get("num_results", 20)),
+            "engine": str(params.get("engine", "od")),
+        }
+        days = params.get("days", WEEK)
+        if isinstance(days, str):
+            days = days.split(",")
+        if isinstance(days, dict):
+            # day names to whether they are selected
+            if not all(isinstance(selected, bool) for selected in days.values()):
+                raise ValueError("days must map day names to true or false")
+        elif all(isinstance(day, str) for day in days):
+            days = dict.fromkeys(days, True)
+        else:
+            raise ValueError("days must be day names")
+        search["days"] = {day.strip().capitalize(): selected for day, selected in days.items()}
+        if "time_stamp" in params:
+            search["time_stamp"] = datetime.fromisoformat(params["time_stamp"])
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"invalid search parameters: {error}")
+
+    unknown_days = set(search["days"]) - set(WEEK)
+    if unknown_days:
+        raise ValueError(f"{sorted(unknown_days)} are not valid days. Expecting any of {WEEK}")
+    return search
+
+
+def search_results(origins, params):
+    """ Runs one batch search, returning a list of compact result records for each origin. """
+    results = foodfind_batch(origins, **parse_search(params))
+
+    records = [[] for _ in origins]
+    columns = ["origin", "rank", "ID", "distance", "region"]
+    if "time_to_open" in results.columns:
+        results = results.assign(time_to_open=results["time_to_open"].dt.total_seconds() // 60)
+        columns.append("time_to_open")
+    for row in results[columns].itertuples(index=False):
+        record = {"rank": int(row.rank), "ID": int(row.ID), **foodbank_records(row.region)[row.ID]}
+        record["distance"] = round(float(row.distance))
+        if "time_to_open" in columns:
+            record["time_to_open"] = int(row.time_to_open)
+        records[row.origin].append(record)
+    return records
+
+
+# serialised foodbank locations and their ETags, by region
+FOODBANK_GEOJSON = {}
+
+
+def foodbank_geojson(region=None):
+    """ GeoJSON feature collection of a region's foodbanks and its ETag, serialised once per region. """
+    region = region or SHARDS.default
+    if region not in FOODBANK_GEOJSON:
+        foodbanks = SHARDS.get(region).foodbanks
+        features = [
+            {
+                "type": "Feature",
+                "id": foodbank_id,
+                "geometry": {"type": "Point", "coordinates": [long, lat]},
+                "properties": {"name": name, "postcode": postcode},
+            }
+            for foodbank_id, long, lat, name, postcode in zip(
+                foodbanks["ID"].tolist(),
+                foodbanks["long"].tolist(),
+                foodbanks["lat"].tolist(),
+                foodbanks["name"].tolist(),
+                foodbanks["postcode"].tolist(),
+            )
+        ]
+        body = json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":"))
+        FOODBANK_GEOJSON[region] = (body, hashlib.sha1(body.encode()).hexdigest())
+    return FOODBANK_GEOJSON[region]
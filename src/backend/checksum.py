@@ -0,0 +1,12 @@
+"""Checksums of data files, for detecting changed inputs"""
+import hashlib
+
+
+def file_checksum(path: str) -> str:
+    """sha256 checksum of a file's contents, read in blocks so large archives
+    are never held in memory"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
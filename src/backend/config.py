@@ -0,0 +1,45 @@
+"""Pipeline configuration, with per region overrides"""
+import toml
+
+CONFIG_FILEPATH = "pipeline.toml"
+
+
+def load_config(path: str = CONFIG_FILEPATH) -> dict:
+    """Pipeline configuration, including any `[regions.<name>]` tables"""
+    with open(path, "r") as f:
+        return toml.load(f)
+
+
+def region_config(config: dict, name: str | None = None) -> dict:
+    """Configuration for one region
+
+    Parameters
+    ----------
+    config : dict
+        pipeline configuration
+    name : str, optional
+        region name, by default `DEFAULT_REGION`
+
+    Returns
+    -------
+    dict
+        top level configuration overlaid with the region's
+        `[regions.<name>]` table, with the region name as 'REGION'
+
+    Raises
+    ------
+    ValueError
+        when `name` is not a configured region.
+    """
+    regions = config.get("regions", {})
+    name = name or config.get("DEFAULT_REGION")
+    merged = {key: value for key, value in config.items() if key != "regions"}
+    if not regions:
+        return merged
+    if name not in regions:
+        raise ValueError(
+            f"{name} is not a configured region. Expecting one of {set(regions)}"
+        )
+    merged.update(regions[name])
+    merged["REGION"] = name
+    return merged
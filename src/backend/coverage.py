@@ -0,0 +1,125 @@
+"""Foodbank coverage of every postcode, by day of the week and walking radius,
+computed from the OD matrix in a few array operations"""
+import numpy as np
+import pandas as pd
+
+from src.backend.od_matrix import ODMatrix
+from src.backend.open_times import WEEK
+
+
+def coverage(od_matrix: ODMatrix, day_masks: np.ndarray, radii) -> pd.DataFrame:
+    """Foodbanks open within each radius of every postcode on each day
+
+    Equivalent to a `foodfind_nearest` search per postcode, day and radius,
+    but counted over the whole OD matrix at once.
+
+    Parameters
+    ----------
+    od_matrix : ODMatrix
+        OD matrix from the postcodes to the foodbanks
+    day_masks : np.ndarray
+        opening days bit mask indexed by foodbank ID, see
+        `RegionShard.day_masks`. Foodbanks without one never open
+    radii : array-like
+        radius thresholds in meters, no larger than the maximum radius the
+        OD matrix was built with
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per postcode, day and radius with columns 'postcode', 'day',
+        'radius', 'reachable' (foodbanks open that day within the radius) and
+        'nearest' (distance in meters to the nearest foodbank open that day,
+        NaN if none is in the OD matrix)
+    """
+    radii = np.sort(np.asarray(radii, dtype=float))
+    n_postcodes = len(od_matrix.postcodes)
+    codes = od_matrix.postcode_codes()
+    distances = np.asarray(od_matrix.distances)
+    ids = np.asarray(od_matrix.ids, dtype=np.int64)
+    masks = np.zeros(len(ids), dtype=np.int64)
+    known = ids < len(day_masks)
+    masks[known] = day_masks[ids[known]]
+
+    reachable = np.zeros((n_postcodes, len(WEEK), len(radii)), dtype=np.int64)
+    nearest = np.full((n_postcodes, len(WEEK)), np.nan, dtype=np.float32)
+    for day in range(len(WEEK)):
+        is_open = (masks >> day) & 1 == 1
+        open_codes, open_distances = codes[is_open], distances[is_open]
+
+        # pairs are grouped by postcode nearest first, so the first open pair
+        # of each postcode is its nearest
+        first = np.ones(len(open_codes), dtype=bool)
+        first[1:] = open_codes[1:] != open_codes[:-1]
+        nearest[open_codes[first], day] = open_distances[first]
+
+        for i, radius in enumerate(radii):
+            reachable[:, day, i] = np.bincount(
+                open_codes[open_distances <= radius], minlength=n_postcodes
+            )
+
+    n_radii = len(radii)
+    return pd.DataFrame(
+        {
+            "postcode": np.repeat(od_matrix.postcodes, len(WEEK) * n_radii),
+            "day": np.tile(np.repeat(WEEK, n_radii), n_postcodes),
+            "radius": np.tile(radii, n_postcodes * len(WEEK)),
+            "reachable": reachable.ravel(),
+            "nearest": np.repeat(nearest.ravel(), n_radii),
+        }
+    )
+
+
+def coverage_gaps(table: pd.DataFrame, postcode_index, radius: float) -> dict:
+    """GeoJSON layer of the postcodes with no foodbank open within a radius on
+    at least one day
+
+    Parameters
+    ----------
+    table : pd.DataFrame
+        coverage table, grouped by postcode as returned by `coverage`
+    postcode_index : PostcodeIndex
+        postcode coordinates. Postcodes missing from it are left out
+    radius : float
+        radius threshold in meters, one of the table's radii
+
+    Returns
+    -------
+    dict
+        GeoJSON feature collection with a point per postcode, with properties
+        'postcode', 'radius', 'days' (days without a foodbank open within the
+        radius) and 'nearest' (distance in meters to the nearest foodbank open
+        on each of those days, None if none is in the OD matrix)
+    """
+    gaps = table[(table["radius"] == radius) & (table["reachable"] == 0)]
+    postcodes = gaps["postcode"].to_numpy()
+    nearest = gaps["nearest"].to_numpy(dtype=float).round(1).astype(object)
+    nearest[pd.isna(gaps["nearest"]).to_numpy()] = None
+
+    # rows of the table are grouped by postcode, split them at each new one
+    starts = np.flatnonzero(postcodes[1:] != postcodes[:-1]) + 1
+    postcodes = postcodes[np.r_[0, starts]] if len(postcodes) else postcodes
+    days = np.split(gaps["day"].to_numpy(), starts)
+    nearest = np.split(nearest, starts)
+    coords = postcode_index.lookup_many(postcodes)
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [long, lat]},
+            "properties": {
+                "postcode": postcode,
+                "radius": float(radius),
+                "days": days,
+                "nearest": distances,
+            },
+        }
+        for postcode, days, distances, lat, long in zip(
+            postcodes.tolist(),
+            [group.tolist() for group in days],
+            [group.tolist() for group in nearest],
+            coords[:, 0].tolist(),
+            coords[:, 1].tolist(),
+        )
+        if not np.isnan(lat)
+    ]
+    return {"type": "FeatureCollection", "features": features}
@@ -0,0 +1,161 @@
+"""Shared data store, loading each dataset once on first use and timing the
+startup phases"""
+import os
+import time
+from contextlib import contextmanager
+from functools import cached_property
+
+from src.backend.config import load_config
+
+# default region data, prebuilt binary snapshots are preferred over csv files
+POSTCODE_SNAPSHOT_PATH = "data/postcode_index"
+POSTCODE_PATH = "data/shef_pc_coords_lookup.csv"
+FOODBANKS_PATH = "data/foodbank_coords.csv"
+OD_SNAPSHOT_PATH = "data/foodbank_postcode_od"
+OD_MATRIX_PATH = "data/foodbank_postcode_od.csv"
+
+# phases reported, in start up order
+PHASES = ["import", "load", "index"]
+
+
+class DataStore:
+    """Datasets shared by the app, each loaded exactly once on first use
+
+    Heavy dependencies are imported by the code paths that need them, so
+    importing the app only pays for the data it touches. The time spent
+    importing, loading and building indexes is recorded for `report`.
+
+    Parameters
+    ----------
+    postcode_snapshot_path : str, optional
+        postcode index snapshot, see `PostcodeIndex.save`
+    postcode_path : str, optional
+        postcode lookup csv, read when there is no snapshot
+    foodbanks_path : str, optional
+        foodbanks csv
+    od_snapshot_path : str, optional
+        OD matrix snapshot directory, see `write_od_snapshot`
+    od_matrix_path : str, optional
+        OD matrix csv, read when there is no snapshot
+    """
+
+    def __init__(
+        self,
+        postcode_snapshot_path: str = POSTCODE_SNAPSHOT_PATH,
+        postcode_path: str = POSTCODE_PATH,
+        foodbanks_path: str = FOODBANKS_PATH,
+        od_snapshot_path: str = OD_SNAPSHOT_PATH,
+        od_matrix_path: str = OD_MATRIX_PATH,
+    ):
+        self.postcode_snapshot_path = postcode_snapshot_path
+        self.postcode_path = postcode_path
+        self.foodbanks_path = foodbanks_path
+        self.od_snapshot_path = od_snapshot_path
+        self.od_matrix_path = od_matrix_path
+        self.timings = {}
+
+    def use_config(self, config: dict):
+        """Read the data files named in a region configuration instead, see
+        `region_config`. Must be called before any dataset is loaded, as
+        modules keep references to them"""
+        data_dir = config["DATA_DIR"]
+        self.__init__(
+            postcode_snapshot_path=os.path.join(data_dir, config["POSTCODE_SNAPSHOT_DIRNAME"]),
+            postcode_path=os.path.join(data_dir, config["POSTCODE_FILENAME"]),
+            foodbanks_path=os.path.join(data_dir, config["FOODBANK_FILENAME"]),
+            od_snapshot_path=os.path.join(data_dir, config["OD_SNAPSHOT_DIRNAME"]),
+            od_matrix_path=os.path.join(data_dir, config["OD_FILENAME"]),
+        )
+        self.config = config
+
+    @contextmanager
+    def timed(self, phase: str, name: str):
+        """Record the time spent in a block, under a phase and name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            key = (phase, name)
+            self.timings[key] = self.timings.get(key, 0) + time.perf_counter() - start
+
+    @cached_property
+    def config(self) -> dict:
+        """Pipeline configuration"""
+        with self.timed("load", "config"):
+            return load_config()
+
+    @cached_property
+    def postcode_index(self):
+        """Postcode index of the default region, from its snapshot when built"""
+        with self.timed("import", "coordinates"):
+            from src.coordinates import PostcodeIndex
+
+        with self.timed("load", "postcode_index"):
+            if os.path.exists(self.postcode_snapshot_path):
+                return PostcodeIndex.from_snapshot(self.postcode_snapshot_path)
+            return PostcodeIndex.from_csv(self.postcode_path)
+
+    @cached_property
+    def shards(self):
+        """Region shards, with the default region pinned, see `ShardStore`"""
+        with self.timed("import", "regions"):
+            from src.backend.regions import ShardStore
+
+        shards = ShardStore(self.config, loader=self.load_shard)
+        shards.pinned.add(shards.default)
+        return shards
+
+    @cached_property
+    def default_shard(self):
+        """Data shard of the default region, sharing the postcode index"""
+        with self.timed("import", "regions"):
+            import pandas as pd
+            from src.backend.od_matrix import load_od_matrix
+            from src.backend.regions import RegionShard
+
+        name = self.shards.default
+        postcode_index = self.postcode_index
+        with self.timed("load", "foodbanks"):
+            foodbanks = pd.read_csv(self.foodbanks_path)
+        with self.timed("load", "od_matrix"):
+            od_matrix = load_od_matrix(self.od_snapshot_path, self.od_matrix_path)
+        with self.timed("index", "default_shard"):
+            return RegionShard(name, postcode_index, foodbanks, od_matrix)
+
+    def load_shard(self, config: dict):
+        """Shard loader for `ShardStore`, reusing the default shard"""
+        if config.get("REGION", self.shards.default) == self.shards.default:
+            return self.default_shard
+        from src.backend.regions import RegionShard
+
+        with self.timed("load", f"region {config['REGION']}"):
+            return RegionShard.from_config(config)
+
+    def warm(self):
+        """Load the default region and build every lazily built index"""
+        shard = self.default_shard
+        with self.timed("import", "scipy"):
+            import scipy.spatial  # noqa: F401
+        with self.timed("import", "pyproj"):
+            import pyproj  # noqa: F401
+        with self.timed("index", "od_postcodes"):
+            shard.od_matrix.postcode_search
+        with self.timed("index", "postcode_tree"):
+            shard.postcode_tree
+        with self.timed("index", "distance_engines"):
+            shard.distance_engines
+
+    def report(self) -> str:
+        """Time spent in each start up phase, as a plain text table"""
+        lines = [f"{'phase':<8}{'step':<24}{'ms':>8}"]
+        for phase in PHASES:
+            steps = [(name, t) for (p, name), t in self.timings.items() if p == phase]
+            for name, seconds in steps:
+                lines.append(f"{phase:<8}{name:<24}{seconds * 1000:>8.1f}")
+            total = sum(seconds for _, seconds in steps)
+            lines.append(f"{phase:<8}{'total':<24}{total * 1000:>8.1f}")
+        return "\n".join(lines)
+
+
+# datasets shared across the app
+STORE = DataStore()
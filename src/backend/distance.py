@@ -0,0 +1,100 @@
+"""Exact distances from any coordinate to every foodbank"""
+import numpy as np
+import pandas as pd
+
+from src.backend.projection import to_bng
+
+# mean earth radius in meters, for haversine distances
+EARTH_RADIUS = 6371008.8
+
+VALID_METRICS = {"projected", "haversine"}
+
+
+class DistanceEngine:
+    """Vectorised distance engine over a fixed set of foodbanks
+
+    With only a few dozen foodbanks, computing the distance from a starting
+    location to all of them is a single NumPy expression, which is cheaper
+    and more precise than snapping to a postcode and looking up the
+    precomputed OD matrix.
+
+    Parameters
+    ----------
+    foodbanks : pd.DataFrame
+        foodbanks with columns 'ID', 'lat' and 'long' in CRS EPSG 4326
+    metric : str, optional
+        one of {"projected", "haversine"}. "projected" measures straight
+        line distances in CRS EPSG 27700, matching `build_od.py`, and
+        "haversine" measures great circle distances. By default "projected"
+
+    Raises
+    ------
+    ValueError
+        when invalid `metric` argument is provided.
+    """
+
+    def __init__(self, foodbanks: pd.DataFrame, metric: str = "projected"):
+        if metric not in VALID_METRICS:
+            raise ValueError(
+                f"{metric} is not a valid metric. Expecting one of {VALID_METRICS}"
+            )
+        self.metric = metric
+        self.ids = foodbanks["ID"].to_numpy()
+        if metric == "projected":
+            self.x, self.y = to_bng().transform(
+                foodbanks["long"].to_numpy(), foodbanks["lat"].to_numpy()
+            )
+        else:
+            self.x = np.radians(foodbanks["long"].to_numpy())
+            self.y = np.radians(foodbanks["lat"].to_numpy())
+
+    def distances(self, long, lat) -> np.ndarray:
+        """Distances in meters from one or many starting locations
+
+        Parameters
+        ----------
+        long : float or array-like
+            starting longitude(s) in CRS EPSG 4326
+        lat : float or array-like
+            starting latitude(s) in CRS EPSG 4326
+
+        Returns
+        -------
+        np.ndarray
+            distances of shape (n_locations, n_foodbanks), with foodbanks in
+            the same order as `ids`
+        """
+        long = np.atleast_1d(np.asarray(long, dtype=float))[:, None]
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))[:, None]
+        if self.metric == "projected":
+            x, y = to_bng().transform(long, lat)
+            return np.hypot(self.x - x, self.y - y)
+
+        long, lat = np.radians(long), np.radians(lat)
+        a = (
+            np.sin((self.y - lat) / 2) ** 2
+            + np.cos(lat) * np.cos(self.y) * np.sin((self.x - long) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+    def query(self, long: float, lat: float, dist_range: float) -> pd.DataFrame:
+        """Foodbanks within range of a starting location, nearest first
+
+        Parameters
+        ----------
+        long : float
+            starting longitude in CRS EPSG 4326
+        lat : float
+            starting latitude in CRS EPSG 4326
+        dist_range : float
+            maximum distance in meters
+
+        Returns
+        -------
+        pd.DataFrame
+            columns 'ID' and 'distance', one row per foodbank in range
+        """
+        distances = self.distances(long, lat)[0]
+        order = np.argsort(distances, kind="stable")
+        order = order[distances[order] <= dist_range]
+        return pd.DataFrame({"ID": self.ids[order], "distance": distances[order]})
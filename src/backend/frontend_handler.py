@@ -1,27 +1,320 @@
 """Functions for handling front end requests"""
-from datetime import datetime, timedelta
-
-import geopandas as gpd
+from datetime import datetime
+import numpy as np
 import pandas as pd
-from shapely.geometry import Point
-from src.backend.utils import convert_to_geodataframe, snap_to_nearest_postcode
+from src.backend.data_store import STORE
+from src.backend.metrics import COUNT_BUCKETS, METRICS
+from src.backend.open_times import days_to_mask
+from src.backend.query_cache import QueryCache
+from src.backend.regions import RegionShard
+from src.backend.utils import convert_to_geodataframe, points_to_array
+from src.coordinates import LongLat, canonical_postcode
 
-# set the valid methods for filtering/searching and other constants
+# set the valid methods and distance engines for filtering/searching and other
+# constants
 VALID_METHODS = {"postcode", "place_from"}
-OD_MATRIX_PATH = "data/foodbank_postcode_od.csv"
-FOODBANKS_PATH = "data/foodbank_coords.csv"
+VALID_ENGINES = {"od", "projected", "haversine"}
+VALID_QUERY_TYPES = {"nearest", "asap"}
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 300  # seconds
+
+# regions served, each a data shard loaded on first query, including the
+# default region (od matrix memory-mapped from its binary snapshot when built)
+SHARDS = STORE.shards
+
+# default region data, module attributes loaded on first use
+DEFAULT_SHARD_ATTRIBUTES = {
+    "DEFAULT_SHARD": None,
+    "OD_MATRIX": "od_matrix",
+    "FOODBANKS": "foodbanks",
+    "SCHEDULE": "schedule",
+    "DAY_MASKS": "day_masks",
+    "DISTANCE_ENGINES": "distance_engines",
+}
+
+# cache of the foodbanks near recent search origins. Data is loaded once, so
+# the app is restarted to serve rebuilt data files
+QUERY_CACHE = QueryCache(
+    maxsize=QUERY_CACHE_SIZE,
+    ttl=QUERY_CACHE_TTL,
+    on_evict=lambda: METRICS.increment("foodfinder_query_cache_evictions_total"),
+)
+
+
+def __getattr__(name):
+    if name in DEFAULT_SHARD_ATTRIBUTES:
+        attribute = DEFAULT_SHARD_ATTRIBUTES[name]
+        shard = STORE.default_shard
+        return shard if attribute is None else getattr(shard, attribute)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def check_arguments(method: str, engine: str):
+    """raises a ValueError when invalid `method` or `engine` argument is
+    provided."""
+    if method not in VALID_METHODS:
+        raise ValueError(
+            f"{method} is not a valid method. Expecting one of {VALID_METHODS}"
+        )
+    if engine not in VALID_ENGINES:
+        raise ValueError(
+            f"{engine} is not a valid engine. Expecting one of {VALID_ENGINES}"
+        )
+
+
+def query_origin(
+    method: str,
+    postcode: str,
+    place_from: LongLat,
+    engine: str,
+    shard: RegionShard | None = None,
+) -> tuple:
+    """resolves a starting location to a hashable origin for caching.
+
+    Places searched with the OD matrix are snapped to the nearest postcode in
+    the region of `shard` up front, so they share cached results with
+    searches from that postcode.
+
+    Returns
+    -------
+    tuple
+        `method`, `postcode` and the origin, which is the canonical postcode
+        or rounded (long, lat) of `place_from`
+
+    Raises
+    ------
+    ValueError
+        when invalid `method` or `engine` argument is provided.
+    """
+    check_arguments(method, engine)
+    if method == "place_from" and engine == "od":
+        method = "postcode"
+        postcode = (shard or SHARDS.get()).snap_many([(place_from.x, place_from.y)])[0]
+    if method == "postcode":
+        return method, postcode, canonical_postcode(postcode)
+    return method, postcode, (round(place_from.x, 6), round(place_from.y, 6))
+
+
+def foodbanks_in_range(
+    method: str,
+    postcode: str,
+    place_from: LongLat,
+    dist_range: float,
+    engine: str = "od",
+    shard: RegionShard | None = None,
+) -> pd.DataFrame:
+    """finds foodbanks within range of a starting location, in one region.
+
+    Parameters
+    ----------
+    method : str
+        method to use to interprut starting location. must be one of
+        {"postcode", "place_from"}
+    postcode : str
+        starting postcode
+    place_from : LongLat
+        starting lat/long coordinates
+    dist_range : float
+        maximum desirable distance in meters
+    engine : str, optional
+        distance engine, one of {"od", "projected", "haversine"}. "od" looks
+        up the precomputed OD matrix, snapping `place_from` to the nearest
+        postcode. The others compute exact distances from the starting
+        location to every foodbank. By default "od"
+    shard : RegionShard, optional
+        region to search, by default the default region
+
+    Returns
+    -------
+    pd.DataFrame
+        columns 'ID' and 'distance', one row per foodbank in range, nearest
+        first
+
+    Raises
+    ------
+    ValueError
+        when invalid `method` or `engine` argument is provided.
+    """
+
+    # capture error when incorrect method or engine is provided
+    check_arguments(method, engine)
+    shard = shard or SHARDS.get()
+
+    if engine == "od":
+        # handle snapping a place to the nearest post code
+        if method == "place_from":
+            postcode = shard.snap_many([(place_from.x, place_from.y)])[0]
+        return shard.od_matrix.query(postcode, dist_range)
+
+    if method == "postcode":
+        coords = shard.postcode_index.lookup(postcode)
+        if coords is None:
+            return pd.DataFrame({"ID": [], "distance": []}).astype(
+                {"ID": "int64", "distance": "float64"}
+            )
+        place_from = LongLat(coords[1], coords[0])
+    return shard.distance_engines[engine].query(place_from.x, place_from.y, dist_range)
+
+
+def region_searches(
+    method: str,
+    postcode: str,
+    place_from: LongLat,
+    dist_range: float,
+    engine: str,
+    region: str | None = None,
+) -> list:
+    """regions to search from a starting location, and how to search each.
+
+    The home region, holding the starting postcode or containing the
+    starting place, is searched with `engine`. Adjacent regions within
+    `dist_range` of the starting location are searched by exact distance,
+    since their OD matrices only cover their own postcodes. Shards are
+    loaded on first use.
+
+    Parameters
+    ----------
+    method : str
+        method to use to interprut starting location. must be one of
+        {"postcode", "place_from"}
+    postcode : str
+        starting postcode
+    place_from : LongLat
+        starting lat/long coordinates
+    dist_range : float
+        maximum desirable distance in meters
+    engine : str
+        distance engine, one of {"od", "projected", "haversine"}
+    region : str | None, optional
+        home region, by default found from the starting location
+
+    Returns
+    -------
+    list
+        (shard, method, postcode, place_from, engine) arguments for
+        `foodbanks_in_range`, home region first
+    """
+    if region is None and method == "postcode":
+        region = SHARDS.region_for_postcode(postcode)
+    elif region is None:
+        region = SHARDS.region_for_point(place_from.x, place_from.y)
+    home = SHARDS.get(region)
+    searches = [(home, method, postcode, place_from, engine)]
+
+    if method == "postcode":
+        coords = home.postcode_index.lookup(postcode)
+        if coords is None:
+            return searches
+        place_from = LongLat(coords[1], coords[0])
+    for name in SHARDS.adjacent(home.name, place_from.x, place_from.y, dist_range):
+        searches.append(
+            (
+                SHARDS.get(name),
+                "place_from",
+                postcode,
+                place_from,
+                "projected" if engine == "od" else engine,
+            )
+        )
+    return searches
+
 
-# read od matrix and foodbanks
-OD_MATRIX = pd.read_csv(OD_MATRIX_PATH)
-FOODBANKS = pd.read_csv(FOODBANKS_PATH)
+def search_regions(searches: list, dist_range: float) -> pd.DataFrame:
+    """foodbanks within range from each region searched, merged with
+    foodbank information and sorted by distance.
+
+    Parameters
+    ----------
+    searches : list
+        regions to search, see `region_searches`
+    dist_range : float
+        maximum desirable distance in meters
+
+    Returns
+    -------
+    pd.DataFrame
+        foodbanks in range, with the name of their region as 'region'
+    """
+    frames = [
+        shard.foodbank_details(
+            foodbanks_in_range(method, postcode, place_from, dist_range, engine, shard)
+        ).assign(region=shard.name)
+        for shard, method, postcode, place_from, engine in searches
+    ]
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True).sort_values(
+        "distance", kind="stable", ignore_index=True
+    )
+
+
+def nearby_foodbanks(
+    searches: list, engine: str, origin, dist_range: float
+) -> pd.DataFrame:
+    """foodbanks within range of a search origin, see `search_regions`, from
+    the cache when recently searched.
+
+    Only the candidates near the origin are cached, so filters by day and
+    rankings by time until opening are always computed afresh.
+
+    Parameters
+    ----------
+    searches : list
+        regions to search, see `region_searches`
+    engine : str
+        distance engine, one of {"od", "projected", "haversine"}
+    origin : str | tuple
+        canonical starting location, see `query_origin`
+    dist_range : float
+        maximum desirable distance in meters
+
+    Returns
+    -------
+    pd.DataFrame
+        cached foodbanks in range, not to be modified
+    """
+    key = (searches[0][0].name, engine, origin, dist_range)
+    nearby = QUERY_CACHE.get(key)
+    if nearby is not None:
+        METRICS.increment("foodfinder_query_cache_hits_total")
+        return nearby
+
+    METRICS.increment("foodfinder_query_cache_misses_total")
+    with METRICS.timed("od_filter"):
+        nearby = search_regions(searches, dist_range)
+    QUERY_CACHE.put(key, nearby)
+    return nearby
+
+
+def search_result(df: pd.DataFrame, geometry: bool = False) -> pd.DataFrame:
+    """copy of search results, with foodbank geometries when requested.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        search results, with columns 'lat' and 'long' in CRS EPSG 4326
+    geometry : bool, optional
+        return a GeoDataFrame with a 'geometry' column in CRS EPSG 4326,
+        importing geopandas, by default False
+
+    Returns
+    -------
+    pd.DataFrame
+        copy of the search results, a GeoDataFrame when `geometry` is True
+    """
+    METRICS.observe("foodfinder_search_results", len(df), COUNT_BUCKETS)
+    if geometry:
+        with METRICS.timed("geometry"):
+            return convert_to_geodataframe(df.copy(), crs="EPSG:4326")
+    return df.copy()
 
 
 def foodfind_nearest(
     method: str,
     postcode: str = "S1 1AD",
-    place_from: type[Point] = Point(-1.470599, 53.379244),
+    place_from: LongLat = LongLat(-1.470599, 53.379244),
     dist_range: float = 5000,
-    days: dict = {
+    days: dict | int = {
         "Monday": True,
         "Tuesday": True,
         "Wednesday": True,
@@ -31,7 +324,10 @@ def foodfind_nearest(
         "Sunday": True,
     },
     num_results: int = 20,
-) -> gpd.GeoDataFrame:
+    engine: str = "od",
+    region: str | None = None,
+    geometry: bool = False,
+) -> pd.DataFrame:
     """finds and filters to nearest foodbanks, by distance and days available.
 
     Parameters
@@ -41,20 +337,31 @@ def foodfind_nearest(
         {"postcode", "place_from"}
     postcode : str, optional
         starting postcode, by default "S1 1AD"
-    place_from : type[Point], optional
-        starting lat/long coordinates, by default Point(-1.470599, 53.379244)
+    place_from : LongLat, optional
+        starting lat/long coordinates, by default LongLat(-1.470599, 53.379244)
     dist_range : float, optional
         maximum desirable distance in meters, by default 5000
-    days : dict, optional
-        days of the week showing user availability, by default { "Monday":
-        True, "Tuesday": True, "Wednesday": True, "Thursday": True, "Friday":
-        True, "Saturday": True, "Sunday": True,}
+    days : dict | int, optional
+        days of the week showing user availability, as a dict of day names to
+        booleans or a bit mask with bit 0 set for Monday, by default {
+        "Monday": True, "Tuesday": True, "Wednesday": True, "Thursday": True,
+        "Friday": True, "Saturday": True, "Sunday": True,}
     num_results : int, optional
         maximum number of results to return, by default 20
+    engine : str, optional
+        distance engine, one of {"od", "projected", "haversine"}. See
+        `foodbanks_in_range`, by default "od"
+    region : str | None, optional
+        region to search from, by default found from the starting location.
+        Adjacent regions in range are searched too, see `region_searches`
+    geometry : bool, optional
+        return a GeoDataFrame with foodbank geometries, for analysis. By
+        default False, returning a plain DataFrame without importing
+        geopandas
 
     Returns
     -------
-    gpd.GeoDataFrame
+    pd.DataFrame
         nearest foodbanks, sorted by distances, within a users' range and day
         request. Contains columns:
             - 'ID' unique identifier for foodbank
@@ -67,67 +374,59 @@ def foodfind_nearest(
             - 'email' foodbank email
             - 'website' foodbank website
             - 'opening' foodbank opening/closing times as a string
+            - 'day_mask' foodbank opening days as a bit mask
             - 'referral_required' whether or not a referral is required to use
             the foodbank.
             - 'deliver_option' whether or not a delivery option is available
             - 'lat' foodbank lattitude in CRS EPSG 4326
             - 'long' foodbank longitude in CRS EPSG 4326
-            - 'geometry' foodbank geometry in CRS EPSG 4326
+            - 'region' region the foodbank is in
+            - 'geometry' foodbank geometry in CRS EPSG 4326, only when
+            `geometry` is True
         Note: this dataframe will be empty if no foodbanks are found
 
     Raises
     ------
     ValueError
-        when invalid `method` argument is provided.
+        when invalid `method` or `engine` argument is provided.
     """
 
-    # capture error when incorrect method is provided
-    if method not in VALID_METHODS:
-        raise ValueError(
-            f"{method} is not a valid method. Expecting one of {VALID_METHODS}"
-        )
+    day_mask = days_to_mask(days)
+    check_arguments(method, engine)
+    with METRICS.timed("origin"):
+        searches = region_searches(method, postcode, place_from, dist_range, engine, region)
+        home = searches[0][0]
+        method, postcode, origin = query_origin(method, postcode, place_from, engine, home)
+        # search the home region from the snapped postcode, not snapping again
+        searches[0] = (home, method, postcode, place_from, engine)
 
-    # handle snapping a place to the nearest post code
-    if method == "place_from":
-        postcode = snap_to_nearest_postcode(place_from)["postcode"]
-    
-    # filter to near by foodbanks and sort by distance
-    near_foodbanks = OD_MATRIX[
-        (OD_MATRIX.postcode == postcode) & (OD_MATRIX.distance <= dist_range)
-    ].drop(columns=['postcode']).sort_values('distance').reset_index(drop=True)
-
-    # merge on foodbank information
-    foodbanks_df = near_foodbanks.merge(FOODBANKS, on="ID", how="left")
-
-    # filter further to requested days - lower casing all the strings
-    requested_days = [
-        day.lower() for day, value in days.items() if value is True
-    ]
-    foodbanks_df = foodbanks_df[
-        (
-            foodbanks_df[
-                "opening"
-            ].str.lower().str.contains("|".join(requested_days))
-        )
-        | (foodbanks_df["opening"].str.lower().str.contains("all"))
-    ]
+    # filter to near by foodbanks, sorted by distance, merged with foodbank
+    # information
+    foodbanks_df = nearby_foodbanks(searches, engine, origin, dist_range)
 
-    # convert to geodataframe and limit results
-    foodbanks_gdf = convert_to_geodataframe(foodbanks_df, crs="EPSG:4326")
-    foodbanks_gdf = foodbanks_gdf.reset_index(drop=True)
-    foodbanks_gdf = foodbanks_gdf.iloc[0:num_results]
+    # filter further to foodbanks open on any of the requested days
+    with METRICS.timed("day_filter"):
+        foodbanks_df = foodbanks_df[
+            (foodbanks_df["day_mask"].to_numpy() & day_mask) != 0
+        ]
 
-    return foodbanks_gdf
+    # limit results
+    foodbanks_df = foodbanks_df.reset_index(drop=True)
+    foodbanks_df = foodbanks_df.iloc[0:num_results]
+    return search_result(foodbanks_df, geometry)
 
 
 def foodfind_asap(
     method: str,
     postcode: str = "S1 1AA",
-    place_from: type[Point] = Point(-1.470599, 53.379244),
+    place_from: LongLat = LongLat(-1.470599, 53.379244),
     dist_range: float = 5000,     # 5km
-    time_stamp: datetime = datetime.now(),
-    num_results: int = 20
-) -> gpd.GeoDataFrame:
+    time_stamp: datetime | None = None,
+    num_results: int = 20,
+    engine: str = "od",
+    region: str | None = None,
+    geometry: bool = False,
+) -> pd.DataFrame:
     """finds and filters to nearest foodbanks by distance, and returns
     them sorted by the next 'available'/open foodbank.
 
@@ -138,19 +437,29 @@ def foodfind_asap(
         {"postcode", "place_from"}
     postcode : str, optional
         starting postcode, by default "S1 1AD"
-    place_from : type[Point], optional
-        starting lat/long coordinates, by default Point(-1.470599, 53.379244)
+    place_from : LongLat, optional
+        starting lat/long coordinates, by default LongLat(-1.470599, 53.379244)
     dist_range : float, optional
         maximum desirable distance in meters, by default 5000
     time_stamp : datetime, optional
         timestamp denoting start time to next open/available foodbank, by
-        default `datetime.now()`
+        default the current time
     num_results : int, optional
         maximum number of results to return, by default 20
+    engine : str, optional
+        distance engine, one of {"od", "projected", "haversine"}. See
+        `foodbanks_in_range`, by default "od"
+    region : str | None, optional
+        region to search from, by default found from the starting location.
+        Adjacent regions in range are searched too, see `region_searches`
+    geometry : bool, optional
+        return a GeoDataFrame with foodbank geometries, for analysis. By
+        default False, returning a plain DataFrame without importing
+        geopandas
 
     Returns
     -------
-    gpd.GeoDataFrame
+    pd.DataFrame
         nearest foodbanks, sorted by distances, within a users' range and day
         request. Contains columns:
             - 'ID' unique identifier for foodbank
@@ -163,52 +472,253 @@ def foodfind_asap(
             - 'email' foodbank email
             - 'website' foodbank website
             - 'opening' foodbank opening/closing times as a string
+            - 'day_mask' foodbank opening days as a bit mask
             - 'referral_required' whether or not a referral is required to use
             the foodbank.
             - 'deliver_option' whether or not a delivery option is available
             - 'lat' foodbank lattitude in CRS EPSG 4326
             - 'long' foodbank longitude in CRS EPSG 4326
-            - 'geometry' foodbank geometry in CRS EPSG 4326
+            - 'region' region the foodbank is in
+            - 'time_to_open' time until the foodbank next opens, zero if it
+            is open at `time_stamp`
+            - 'geometry' foodbank geometry in CRS EPSG 4326, only when
+            `geometry` is True
         Note: this dataframe will be empty if no foodbanks are found
 
     Raises
     ------
     ValueError
-        when invalid `method` argument is provided.
+        when invalid `method` or `engine` argument is provided.
     """
 
-    # capture error when incorrect method is provided
-    if method not in VALID_METHODS:
+    if time_stamp is None:
+        time_stamp = datetime.now()
+
+    check_arguments(method, engine)
+    with METRICS.timed("origin"):
+        searches = region_searches(method, postcode, place_from, dist_range, engine, region)
+        home = searches[0][0]
+        method, postcode, origin = query_origin(method, postcode, place_from, engine, home)
+        # search the home region from the snapped postcode, not snapping again
+        searches[0] = (home, method, postcode, place_from, engine)
+    foodbanks_nearby = nearby_foodbanks(searches, engine, origin, dist_range)
+
+    # rank by time until next opening at `time_stamp`, even for cached
+    # foodbanks, then distance, dropping foodbanks with no known opening times
+    with METRICS.timed("open_filter"):
+        ids = foodbanks_nearby["ID"].to_numpy()
+        regions = foodbanks_nearby["region"].to_numpy()
+        minutes_to_open = np.full(len(foodbanks_nearby), np.inf)
+        for shard, *_ in searches:
+            in_region = regions == shard.name
+            minutes_to_open[in_region] = shard.schedule.minutes_to_open(
+                ids[in_region], time_stamp
+            )
+        order = np.lexsort((foodbanks_nearby["distance"].to_numpy(), minutes_to_open))
+        order = order[np.isfinite(minutes_to_open[order])][:num_results]
+
+        out_df = foodbanks_nearby.iloc[order].reset_index(drop=True)
+        out_df["time_to_open"] = pd.to_timedelta(minutes_to_open[order], unit="min")
+    return search_result(out_df, geometry)
+
+
+def foodfind_batch(
+    origins: list,
+    query_type: str = "nearest",
+    dist_range: float = 5000,
+    days: dict | int = 0b1111111,
+    time_stamp: datetime | None = None,
+    num_results: int = 20,
+    engine: str = "od",
+    region: str | None = None,
+) -> pd.DataFrame:
+    """finds foodbanks for many starting locations in one vectorised pass.
+
+    Results match `foodfind_nearest` or `foodfind_asap` for each origin, but
+    as one lightweight table of foodbank IDs without foodbank details or
+    geometries. Origins are grouped by home region, see `region_searches`,
+    and each group is searched in one pass without consulting adjacent
+    regions.
+
+    Parameters
+    ----------
+    origins : list
+        starting locations, each a postcode string, or a Point or (long,
+        lat) pair in CRS EPSG 4326
+    query_type : str, optional
+        one of {"nearest", "asap"}, by default "nearest"
+    dist_range : float, optional
+        maximum desirable distance in meters, by default 5000
+    days : dict | int, optional
+        days of the week showing user availability for "nearest" queries, as
+        a dict of day names to booleans or a bit mask with bit 0 set for
+        Monday, by default every day
+    time_stamp : datetime, optional
+        start time for "asap" queries, by default the current time
+    num_results : int, optional
+        maximum number of results per origin, by default 20
+    engine : str, optional
+        distance engine, one of {"od", "projected", "haversine"}. See
+        `foodbanks_in_range`, by default "od"
+    region : str | None, optional
+        region to search for every origin, by default the home region of
+        each origin
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per result, grouped by origin in input order and ranked
+        within each origin. Contains columns:
+            - 'origin' position of the starting location in `origins`
+            - 'rank' rank of the foodbank for the origin, from 1
+            - 'ID' unique identifier for foodbank
+            - 'distance' distance between start location and foodbank in
+            meters
+            - 'region' region the foodbank is in
+            - 'time_to_open' time until the foodbank next opens, for "asap"
+            queries only
+        Origins with an unknown postcode have no rows.
+
+    Raises
+    ------
+    ValueError
+        when invalid `query_type` or `engine` argument is provided.
+    """
+    if query_type not in VALID_QUERY_TYPES:
         raise ValueError(
-            f"{method} is not a valid method. Expecting one of {VALID_METHODS}"
+            f"{query_type} is not a valid query type. Expecting one of "
+            f"{VALID_QUERY_TYPES}"
         )
+    check_arguments("postcode", engine)
+    if time_stamp is None:
+        time_stamp = datetime.now()
+    day_mask = days_to_mask(days)
 
-    # handle snapping a place to the nearest post code
-    if method == "place_from":
-        postcode = snap_to_nearest_postcode(place_from)["postcode"]
+    # split origins into postcodes and coordinates
+    is_postcode = np.array([isinstance(origin, str) for origin in origins], dtype=bool)
+    postcodes = np.array(
+        [origin if isinstance(origin, str) else "" for origin in origins], dtype=object
+    )
+    coords = np.full((len(origins), 2), np.nan)
+    if (~is_postcode).any():
+        coords[~is_postcode] = points_to_array(
+            [origin for origin in origins if not isinstance(origin, str)]
+        )
 
-    foodbanks_nearby = OD_MATRIX[(OD_MATRIX["postcode"] == postcode) &
-                                 (OD_MATRIX["distance"] <= dist_range)]
+    # home region of each origin, as `region_searches` finds it
+    homes = np.full(len(origins), region or SHARDS.default, dtype=object)
+    if region is None and SHARDS.regions:
+        for ind in np.flatnonzero(is_postcode):
+            homes[ind] = SHARDS.region_for_postcode(postcodes[ind])
+        for ind in np.flatnonzero(~is_postcode & np.isfinite(coords).all(axis=1)):
+            homes[ind] = SHARDS.region_for_point(*coords[ind])
 
-    foodbanks_nearby = pd.merge(
-        foodbanks_nearby[["ID", "distance"]], FOODBANKS, on="ID"
+    # pairs in range and available, from each region's origins in one pass
+    parts = [
+        (
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0),
+            np.zeros(0),
+            np.zeros(0, dtype=object),
+        )
+    ]
+    for name in dict.fromkeys(homes):
+        rows = np.flatnonzero(homes == name)
+        shard = SHARDS.get(name)
+        origin, ids, distances = region_pairs(
+            shard, postcodes[rows], coords[rows], is_postcode[rows], engine
+        )
+        keep = distances <= dist_range
+        if query_type == "nearest":
+            keep &= (shard.day_masks[ids] & day_mask) != 0
+            minutes_to_open = np.zeros(len(ids))
+        else:
+            minutes_to_open = shard.schedule.minutes_to_open(ids, time_stamp)
+            keep &= np.isfinite(minutes_to_open)
+        parts.append(
+            (
+                rows[origin[keep]],
+                ids[keep],
+                distances[keep].astype(np.float64),
+                minutes_to_open[keep],
+                np.full(keep.sum(), shard.name, dtype=object),
+            )
+        )
+    origin, ids, distances, minutes_to_open, regions = (
+        np.concatenate(arrays) for arrays in zip(*parts)
     )
 
-    days = []
+    # rank within each origin and limit results
+    order = np.lexsort((distances, minutes_to_open, origin))
+    origin = origin[order]
+    group_starts = np.searchsorted(origin, origin, side="left")
+    rank = np.arange(len(origin)) - group_starts + 1
+    top = rank <= num_results
+
+    results = pd.DataFrame(
+        {
+            "origin": origin[top],
+            "rank": rank[top],
+            "ID": ids[order][top],
+            "distance": distances[order][top],
+            "region": regions[order][top],
+        }
+    )
+    if query_type == "asap":
+        results["time_to_open"] = pd.to_timedelta(
+            minutes_to_open[order][top], unit="min"
+        )
+    return results
 
-    for x in range(1, 7):
-        days.append((time_stamp + timedelta(days=x)).strftime("%A"))
 
-    df = foodbanks_nearby[
-        foodbanks_nearby["opening"].str.contains(time_stamp.strftime("%A"))
-    ].sort_values("distance")
-    for day in days:
-        df2 = foodbanks_nearby[
-            foodbanks_nearby["opening"].str.contains(day)
-        ].sort_values("distance")
-        df = pd.concat([df, df2])
+def region_pairs(
+    shard: RegionShard,
+    postcodes: np.ndarray,
+    coords: np.ndarray,
+    is_postcode: np.ndarray,
+    engine: str,
+) -> tuple:
+    """every origin/foodbank pair of a batch of origins in one region, see
+    `foodfind_batch`.
+
+    Parameters
+    ----------
+    shard : RegionShard
+        region to search
+    postcodes : np.ndarray
+        starting postcode of each origin, "" for coordinates
+    coords : np.ndarray
+        (long, lat) of each origin, NaN for postcodes
+    is_postcode : np.ndarray
+        whether each origin is a postcode
+    engine : str
+        distance engine, one of {"od", "projected", "haversine"}
 
-    out_df = df.reset_index(drop=True).head(num_results)
-    foodbanks_gdf = convert_to_geodataframe(out_df, crs="EPSG:4326")
+    Returns
+    -------
+    tuple
+        arrays of origin position, foodbank ID and distance for each pair,
+        grouped by origin. Foodbanks missing from the region's foodbanks are
+        dropped, as `RegionShard.foodbank_details` does
+    """
+    if engine == "od":
+        snap = ~is_postcode & np.isfinite(coords).all(axis=1)
+        if snap.any():
+            postcodes = postcodes.copy()
+            postcodes[snap] = shard.snap_many(coords[snap])
+        origin, ids, distances = shard.od_matrix.rows_many(postcodes)
+    else:
+        if is_postcode.any():
+            coords = coords.copy()
+            coords[is_postcode] = shard.postcode_index.lookup_many(
+                postcodes[is_postcode]
+            )[:, ::-1]
+        distance_engine = shard.distance_engines[engine]
+        distances = distance_engine.distances(coords[:, 0], coords[:, 1]).ravel()
+        origin = np.repeat(np.arange(len(postcodes)), len(distance_engine.ids))
+        ids = np.tile(distance_engine.ids, len(postcodes))
 
-    return foodbanks_gdf
+    ids = ids.astype(np.int64)
+    known = shard.foodbank_positions(ids) >= 0
+    return origin[known], ids[known], distances[known]
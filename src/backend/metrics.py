@@ -0,0 +1,195 @@
+"""Request stage timings and counts, exported in the Prometheus text format
+and aggregated across worker processes"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# histogram bucket upper bounds, for durations in seconds and result counts
+DURATION_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+    0.5, 1.0, 2.5,
+)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50)
+
+# help text of each exported metric
+METRIC_HELP = {
+    "foodfinder_stage_seconds": "Time spent in each stage of handling a request",
+    "foodfinder_request_seconds": "Time spent handling each request, by endpoint",
+    "foodfinder_search_results": "Foodbanks found by each search",
+    "foodfinder_query_cache_hits_total": "Searches answered from the query cache",
+    "foodfinder_query_cache_misses_total": "Searches missing the query cache",
+    "foodfinder_query_cache_evictions_total": "Results expired or evicted from the query cache",
+    "foodfinder_startup_seconds": "Time spent starting up, by phase and step",
+}
+
+
+def label_key(labels: dict) -> str:
+    """Prometheus label set, e.g. 'stage="geocode"', sorted by label name"""
+    return ",".join(f'{name}="{value}"' for name, value in sorted(labels.items()))
+
+
+def with_label(key: str, name: str, value) -> str:
+    """Label set `key` with one more label"""
+    return ",".join(filter(None, [key, label_key({name: value})]))
+
+
+class Metrics:
+    """Histograms, counters and gauges of one worker process
+
+    Observations are kept in memory, and written to a file per process in
+    `directory` at most every `flush_interval` seconds, so any worker can
+    serve the metrics of all of them. Files of processes that have exited
+    are dropped, which Prometheus sees as a counter reset.
+
+    Parameters
+    ----------
+    directory : str, optional
+        directory shared by the worker processes, by default None to only
+        export this process
+    flush_interval : float, optional
+        minimum seconds between writes of this process's file, by default 1
+    """
+
+    def __init__(self, directory: str | None = None, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.flushed = 0.0
+
+    def observe(self, name: str, value: float, buckets: tuple = DURATION_BUCKETS, **labels):
+        """Add an observation to a histogram"""
+        self.record((name, label_key(labels)), value, buckets)
+
+    def record(self, key: tuple, value: float, buckets: tuple = DURATION_BUCKETS):
+        """Add an observation to the histogram of a (name, label set) key"""
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    "buckets": list(buckets), "counts": [0] * (len(buckets) + 1), "sum": 0.0
+                }
+            histogram["counts"][bisect_left(buckets, value)] += 1
+            histogram["sum"] += value
+
+    @contextmanager
+    def timed(self, stage: str):
+        """Record the time spent in a block as a request stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(
+                ("foodfinder_stage_seconds", f'stage="{stage}"'), time.perf_counter() - start
+            )
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        """Add to a counter of this process"""
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_counter(self, name: str, value: float, **labels):
+        """Set the running total of a counter in this process"""
+        self.counters[(name, label_key(labels))] = value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge, exported per worker process"""
+        self.gauges[(name, label_key(labels))] = value
+
+    def snapshot(self) -> dict:
+        """Metrics of this process, as JSON serialisable data"""
+        with self.lock:
+            return {
+                kind: [[name, key, value] for (name, key), value in metrics.items()]
+                for kind, metrics in [
+                    ("histograms", self.histograms),
+                    ("counters", self.counters),
+                    ("gauges", self.gauges),
+                ]
+            }
+
+    def flush(self, force: bool = False):
+        """Write this process's metrics to its file, at most every
+        `flush_interval` seconds unless forced"""
+        now = time.monotonic()
+        if self.directory is None or (not force and now - self.flushed < self.flush_interval):
+            return
+        self.flushed = now
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def worker_snapshots(self) -> dict:
+        """Snapshots of every live worker process keyed by process ID,
+        removing the files of exited processes"""
+        snapshots = {os.getpid(): self.snapshot()}
+        if self.directory is None or not os.path.isdir(self.directory):
+            return snapshots
+        self.flush(force=True)
+        for filename in os.listdir(self.directory):
+            pid, ext = os.path.splitext(filename)
+            if ext != ".json" or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                os.remove(path)
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(path, "r") as f:
+                    snapshots[int(pid)] = json.load(f)
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        """Metrics of every worker process in the Prometheus text format,
+        summing histograms and counters and labelling gauges by worker"""
+        histograms, counters, gauges = {}, {}, {}
+        for pid, snapshot in self.worker_snapshots().items():
+            for name, key, histogram in snapshot["histograms"]:
+                total = histograms.setdefault(
+                    (name, key),
+                    {"buckets": histogram["buckets"], "counts": [0] * len(histogram["counts"]), "sum": 0.0},
+                )
+                total["counts"] = [a + b for a, b in zip(total["counts"], histogram["counts"])]
+                total["sum"] += histogram["sum"]
+            for name, key, value in snapshot["counters"]:
+                counters[(name, key)] = counters.get((name, key), 0) + value
+            for name, key, value in snapshot["gauges"]:
+                gauges[(name, with_label(key, "worker", pid))] = value
+
+        lines = []
+        for kind, metrics in [("histogram", histograms), ("counter", counters), ("gauge", gauges)]:
+            for name in sorted({name for name, _ in metrics}):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (metric, key), value in sorted(metrics.items()):
+                    if metric != name:
+                        continue
+                    if kind != "histogram":
+                        lines.append(f"{name}{{{key}}} {value}" if key else f"{name} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value["buckets"] + ["+Inf"], value["counts"]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{{{with_label(key, 'le', bound)}}} {cumulative}")
+                    labels = f"{{{key}}}" if key else ""
+                    lines.append(f"{name}_sum{labels} {value['sum']}")
+                    lines.append(f"{name}_count{labels} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+# metrics of this process, shared by the app and backend
+METRICS = Metrics()
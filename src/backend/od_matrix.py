@@ -0,0 +1,408 @@
+"""Compact binary snapshot of the foodbank/postcode OD matrix
+
+The snapshot is a directory of `.npy` files written by `build_od.py` next to
+the OD matrix csv, in compressed sparse row (CSR) layout. Postcodes are
+canonical and integer coded by their position in a sorted array, found by a
+binary search, and the foodbanks for postcode `i` are stored at
+`offsets[i]:offsets[i + 1]` of the ID (uint16) and distance (float32) arrays,
+sorted by distance. A range query is then a postcode search, an offset lookup
+plus a `searchsorted`, independent of the number of pairs in the matrix.
+
+The files are memory-mapped read-only, so every gunicorn worker shares the
+same pages instead of parsing and holding its own copy of the csv.
+"""
+import os
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+from src.coordinates import canonical_postcode
+
+# file names within a snapshot directory
+POSTCODES_FILENAME = "postcodes.npy"
+OFFSETS_FILENAME = "offsets.npy"
+IDS_FILENAME = "ID.npy"
+DISTANCES_FILENAME = "distance.npy"
+
+
+def save_array(path: str, array: np.ndarray):
+    """Save an array as a `.npy` file, replacing any existing file atomically
+    so processes with the old file memory-mapped keep a consistent view"""
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, np.asarray(array))
+    os.replace(path + ".tmp", path)
+
+
+class ODMatrix:
+    """Foodbank/postcode OD matrix in CSR layout
+
+    Parameters
+    ----------
+    postcodes : np.ndarray
+        unique postcode strings, the position of a postcode is its code
+    offsets : np.ndarray
+        start of each postcode's OD pairs, with a final entry for the total
+        number of pairs
+    ids : np.ndarray
+        foodbank ID of each OD pair
+    distances : np.ndarray
+        distance in meters of each OD pair, ascending for each postcode
+    """
+
+    def __init__(self, postcodes, offsets, ids, distances):
+        self.postcodes = postcodes
+        self.offsets = offsets
+        self.ids = ids
+        self.distances = distances
+
+    @cached_property
+    def postcode_search(self) -> tuple:
+        """Sorted canonical postcodes and the code of each, for binary
+        searches, built on first use
+
+        `build_od.py` writes the postcodes canonical and sorted, so the
+        matrix's own, possibly memory-mapped, array is searched directly and
+        the codes are None. Older snapshots get a sorted canonical copy, held
+        in NumPy arrays rather than Python objects so forked workers keep
+        sharing its pages.
+        """
+        canonical = np.array(
+            [canonical_postcode(postcode) for postcode in self.postcodes.tolist()],
+            dtype=str,
+        )
+        if np.array_equal(canonical, self.postcodes) and (
+            canonical[1:] > canonical[:-1]
+        ).all():
+            return self.postcodes, None
+        order = np.argsort(canonical, kind="stable")
+        return canonical[order], order
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def codes_many(self, postcodes) -> np.ndarray:
+        """Code of each postcode, in any spacing or case, -1 where not in the
+        matrix"""
+        canonical = np.array([canonical_postcode(pc) for pc in postcodes], dtype=str)
+        sorted_postcodes, codes = self.postcode_search
+        if not len(canonical) or not len(sorted_postcodes):
+            return np.full(len(canonical), -1, dtype=np.int64)
+        found = np.searchsorted(sorted_postcodes, canonical).clip(
+            0, len(sorted_postcodes) - 1
+        )
+        present = sorted_postcodes[found] == canonical
+        if codes is not None:
+            found = codes[found]
+        return np.where(present, found, -1).astype(np.int64)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "ODMatrix":
+        """Build from a dataframe with columns 'ID', 'postcode' and 'distance'"""
+        postcode_codes, postcodes = pd.factorize(df["postcode"], sort=True)
+        distances = df["distance"].to_numpy(dtype=np.float32)
+
+        # group pairs by postcode, nearest foodbank first
+        order = np.lexsort((distances, postcode_codes))
+        offsets = np.zeros(len(postcodes) + 1, dtype=np.int64)
+        counts = np.bincount(postcode_codes, minlength=len(postcodes))
+        np.cumsum(counts, out=offsets[1:])
+        return cls(
+            postcodes=np.asarray(postcodes, dtype=str),
+            offsets=offsets,
+            ids=df["ID"].to_numpy(dtype=np.uint16)[order],
+            distances=distances[order],
+        )
+
+    def row(self, postcode: str) -> tuple:
+        """Foodbank IDs and distances for a postcode, nearest first
+
+        Parameters
+        ----------
+        postcode : str
+            starting postcode, in any spacing or case
+
+        Returns
+        -------
+        tuple
+            views of the ID and distance arrays, empty if the postcode is not
+            in the matrix
+        """
+        code = self.codes_many([postcode])[0]
+        if code < 0:
+            return self.ids[:0], self.distances[:0]
+        start, end = self.offsets[code], self.offsets[code + 1]
+        return self.ids[start:end], self.distances[start:end]
+
+    def postcode_codes(self) -> np.ndarray:
+        """Postcode code of each OD pair"""
+        return np.repeat(
+            np.arange(len(self.postcodes)), np.diff(self.offsets)
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """OD matrix as a dataframe with columns 'ID', 'postcode' and 'distance'"""
+        return pd.DataFrame(
+            {
+                "ID": self.ids.astype(np.int64),
+                "postcode": self.postcodes[self.postcode_codes()],
+                "distance": self.distances,
+            }
+        )
+
+    def replace_foodbanks(
+        self, remove_ids, postcode_codes, ids, distances
+    ) -> "ODMatrix":
+        """Patch the matrix, dropping some foodbanks and merging in new pairs
+
+        Pairs are merged into each postcode's distance order without
+        recomputing or resorting the rest of the matrix.
+
+        Parameters
+        ----------
+        remove_ids : array-like
+            IDs of foodbanks whose pairs are dropped
+        postcode_codes : np.ndarray
+            postcode code of each new pair
+        ids : np.ndarray
+            foodbank ID of each new pair
+        distances : np.ndarray
+            distance in meters of each new pair
+
+        Returns
+        -------
+        ODMatrix
+            patched in-memory matrix
+        """
+        codes = self.postcode_codes()
+        keep = ~np.isin(self.ids, np.asarray(remove_ids, dtype=self.ids.dtype))
+        codes, old_ids, old_distances = codes[keep], self.ids[keep], self.distances[keep]
+
+        # merge on a (postcode code, distance) key, which the pairs are sorted by
+        postcode_codes = np.asarray(postcode_codes, dtype=np.int64)
+        distances = np.asarray(distances, dtype=np.float32)
+        order = np.lexsort((distances, postcode_codes))
+        postcode_codes, distances = postcode_codes[order], distances[order]
+        ids = np.asarray(ids)[order]
+        scale = float(max(old_distances.max(initial=0), distances.max(initial=0))) + 1
+        positions = np.searchsorted(
+            codes * scale + old_distances,
+            postcode_codes * scale + distances,
+            side="right",
+        )
+
+        offsets = np.zeros_like(self.offsets)
+        counts = np.bincount(codes, minlength=len(self.postcodes))
+        counts += np.bincount(postcode_codes, minlength=len(self.postcodes))
+        np.cumsum(counts, out=offsets[1:])
+        return ODMatrix(
+            postcodes=self.postcodes,
+            offsets=offsets,
+            ids=np.insert(old_ids, positions, ids.astype(self.ids.dtype)),
+            distances=np.insert(old_distances, positions, distances),
+        )
+
+    def save(self, snapshot_dir: str):
+        """Write the matrix as a binary snapshot
+
+        Parameters
+        ----------
+        snapshot_dir : str
+            directory to write the snapshot files to, created if missing
+        """
+        os.makedirs(snapshot_dir, exist_ok=True)
+        offsets_path = os.path.join(snapshot_dir, OFFSETS_FILENAME)
+        if os.path.exists(offsets_path):
+            os.remove(offsets_path)
+        save_array(os.path.join(snapshot_dir, POSTCODES_FILENAME), self.postcodes)
+        save_array(os.path.join(snapshot_dir, IDS_FILENAME), self.ids)
+        save_array(os.path.join(snapshot_dir, DISTANCES_FILENAME), self.distances)
+
+        # written last, marking the snapshot as complete
+        save_array(offsets_path, self.offsets)
+
+    def rows_many(self, postcodes) -> tuple:
+        """Foodbank IDs and distances for many postcodes in one pass
+
+        Parameters
+        ----------
+        postcodes : iterable
+            starting postcodes, in any spacing or case
+
+        Returns
+        -------
+        tuple
+            arrays of the position of the starting postcode in `postcodes`,
+            foodbank ID and distance for every OD pair of every postcode,
+            grouped by starting postcode and nearest first. Postcodes not in
+            the matrix have no pairs.
+        """
+        codes = self.codes_many(postcodes)
+        starts = np.where(codes >= 0, self.offsets[codes], 0)
+        lengths = np.where(codes >= 0, self.offsets[codes + 1] - starts, 0)
+
+        # gather every row's slice of the pair arrays at once
+        origins = np.repeat(np.arange(len(codes)), lengths)
+        row_starts = np.cumsum(lengths) - lengths
+        pos = np.arange(lengths.sum()) - row_starts[origins] + starts[origins]
+        return origins, self.ids[pos], self.distances[pos]
+
+    def query(
+        self, postcode: str, dist_range: float, num_results: int | None = None
+    ) -> pd.DataFrame:
+        """Foodbanks within range of a postcode, nearest first
+
+        Parameters
+        ----------
+        postcode : str
+            starting postcode, in any spacing or case
+        dist_range : float
+            maximum distance in meters
+        num_results : int, optional
+            maximum number of foodbanks to return, by default all in range
+
+        Returns
+        -------
+        pd.DataFrame
+            columns 'ID' and 'distance', one row per foodbank in range. Empty
+            if the postcode is not in the matrix.
+        """
+        ids, distances = self.row(postcode)
+        end = np.searchsorted(distances, dist_range, side="right")
+        if num_results is not None:
+            end = min(end, num_results)
+        return pd.DataFrame(
+            {
+                "ID": ids[:end].astype(np.int64),
+                "distance": distances[:end].astype(np.float64),
+            }
+        )
+
+
+def write_od_snapshot(df: pd.DataFrame, snapshot_dir: str) -> ODMatrix:
+    """Write an OD matrix dataframe as a binary snapshot
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        OD matrix with columns 'ID', 'postcode' and 'distance'
+    snapshot_dir : str
+        directory to write the snapshot files to, created if missing
+
+    Returns
+    -------
+    ODMatrix
+        the in-memory matrix that was written
+    """
+    od_matrix = ODMatrix.from_frame(df)
+    od_matrix.save(snapshot_dir)
+    return od_matrix
+
+
+class ODSnapshotWriter:
+    """Streams an OD matrix to a binary snapshot, a chunk of postcodes at a time
+
+    Chunks must be written in postcode code order, with each chunk's pairs
+    grouped by postcode code and nearest first, so pairs can be appended to
+    disk without holding the whole matrix in memory.
+
+    Parameters
+    ----------
+    snapshot_dir : str
+        directory to write the snapshot files to, created if missing
+    postcodes : np.ndarray
+        sorted unique postcode strings, the position of a postcode is its code
+    """
+
+    def __init__(self, snapshot_dir: str, postcodes: np.ndarray):
+        os.makedirs(snapshot_dir, exist_ok=True)
+        self.snapshot_dir = snapshot_dir
+
+        # mark any existing snapshot as incomplete until closed
+        offsets_path = os.path.join(snapshot_dir, OFFSETS_FILENAME)
+        if os.path.exists(offsets_path):
+            os.remove(offsets_path)
+
+        self.postcodes = np.asarray(postcodes, dtype=str)
+        self.counts = np.zeros(len(self.postcodes), dtype=np.int64)
+        self.raw_files = {
+            filename: open(os.path.join(snapshot_dir, filename + ".raw"), "wb")
+            for filename in [IDS_FILENAME, DISTANCES_FILENAME]
+        }
+
+    def write(self, postcode_codes, ids, distances):
+        """Append a chunk of OD pairs
+
+        Parameters
+        ----------
+        postcode_codes : np.ndarray
+            postcode code of each pair
+        ids : np.ndarray
+            foodbank ID of each pair
+        distances : np.ndarray
+            distance in meters of each pair
+        """
+        self.counts += np.bincount(postcode_codes, minlength=len(self.counts))
+        np.asarray(ids, dtype=np.uint16).tofile(self.raw_files[IDS_FILENAME])
+        np.asarray(distances, dtype=np.float32).tofile(
+            self.raw_files[DISTANCES_FILENAME]
+        )
+
+    def close(self):
+        """Finish writing, converting the appended pairs to `.npy` files"""
+        offsets = np.zeros(len(self.counts) + 1, dtype=np.int64)
+        np.cumsum(self.counts, out=offsets[1:])
+        save_array(os.path.join(self.snapshot_dir, POSTCODES_FILENAME), self.postcodes)
+
+        for filename, dtype in [(IDS_FILENAME, np.uint16), (DISTANCES_FILENAME, np.float32)]:
+            self.raw_files[filename].close()
+            raw_path = os.path.join(self.snapshot_dir, filename + ".raw")
+            path = os.path.join(self.snapshot_dir, filename)
+            out = np.lib.format.open_memmap(
+                path + ".tmp",
+                mode="w+",
+                dtype=dtype,
+                shape=(int(offsets[-1]),),
+            )
+            if offsets[-1]:
+                out[:] = np.memmap(raw_path, dtype=dtype, mode="r")
+            out.flush()
+            del out
+            os.replace(path + ".tmp", path)
+            os.remove(raw_path)
+
+        # written last, marking the snapshot as complete
+        save_array(os.path.join(self.snapshot_dir, OFFSETS_FILENAME), offsets)
+
+
+def read_od_snapshot(snapshot_dir: str, mmap_mode: str | None = "r") -> ODMatrix:
+    """Memory-map a binary OD matrix snapshot read-only, or read it into
+    memory when `mmap_mode` is None"""
+    def load(filename):
+        return np.load(os.path.join(snapshot_dir, filename), mmap_mode=mmap_mode)
+
+    return ODMatrix(
+        postcodes=load(POSTCODES_FILENAME),
+        offsets=load(OFFSETS_FILENAME),
+        ids=load(IDS_FILENAME),
+        distances=load(DISTANCES_FILENAME),
+    )
+
+
+def load_od_matrix(snapshot_dir: str, csv_path: str) -> ODMatrix:
+    """Load the OD matrix, preferring the binary snapshot over the csv
+
+    Parameters
+    ----------
+    snapshot_dir : str
+        binary snapshot directory written by `build_od.py`
+    csv_path : str
+        OD matrix csv, used when no snapshot has been built
+
+    Returns
+    -------
+    ODMatrix
+        loaded OD matrix
+    """
+    if os.path.exists(os.path.join(snapshot_dir, OFFSETS_FILENAME)):
+        return read_od_snapshot(snapshot_dir)
+    return ODMatrix.from_frame(pd.read_csv(csv_path))
@@ -13,30 +13,79 @@ Days = [
     "Saturday",
     "Sunday",
 ]
+WEEK = list(Days)
 Days = Days + [x + "s" for x in Days]
 DAYS = [x.upper() for x in Days]
 days = [x.lower() for x in Days]
 weekdays = Days + DAYS + days
 
 
+# bit mask with every day of the week set, bit 0 is Monday
+ALL_DAYS_MASK = (1 << len(WEEK)) - 1
+
+# single days or day ranges, e.g. "Tuesday" or "Monday to Friday"
+DAY_RANGE_PATTERN = re.compile(
+    f"({'|'.join(WEEK)})s?(?:\\s+to\\s+({'|'.join(WEEK)})s?)?", re.IGNORECASE
+)
+
+
+def opening_day_mask(text):
+    """Days a foodbank opens as a bit mask, with bit 0 set for Monday through
+    to bit 6 for Sunday. Day ranges such as "Sunday to Tuesday" wrap around the
+    week and "all" days sets every bit."""
+    if not isinstance(text, str):
+        return 0
+    if re.search(r"\ball\b", text, re.IGNORECASE):
+        return ALL_DAYS_MASK
+
+    mask = 0
+    for first, last in DAY_RANGE_PATTERN.findall(text):
+        start = WEEK.index(first.capitalize())
+        end = WEEK.index(last.capitalize()) if last else start
+        for day in range((end - start) % len(WEEK) + 1):
+            mask |= 1 << ((start + day) % len(WEEK))
+    return mask
+
+
+def days_to_mask(days):
+    """Requested days as a bit mask, from a dict of day names to booleans, or
+    an existing bit mask."""
+    if isinstance(days, int):
+        return days
+    return sum(1 << WEEK.index(day) for day, value in days.items() if value is True)
+
+
+def day_range(first, last=None):
+    """Day names from `first` to `last` inclusive, wrapping around the week.
+    Just `first`, as written, when there is no `last` day."""
+    if last is None:
+        return [first]
+    start, end = weekdays.index(first) % 7, weekdays.index(last) % 7
+    return [WEEK[(start + day) % 7] for day in range((end - start) % 7 + 1)]
+
+
 def parse_opening_str(text, id_name):
     row_list = []
-    result = re.search(
+    # every day and time on every line, as `opening_day_mask` counts them,
+    # listed from the last line up
+    results = re.finditer(
         f"({'|'.join(weekdays)})"
-        + r" *([0-9\.:]+) *[-–]? *([0-9\.:]+)\n?(.*)",  # noqa:W605
+        + f"(?: +to +({'|'.join(weekdays)}))?"
+        + r" *([0-9]{1,2}[\.:][0-9]{2})(?: *[-–] *([0-9]{1,2}[\.:][0-9]{2}))?",  # noqa:W605
         text,
     )
-    if result:
-        if len(result.groups()) > 3:
-            row_list = parse_opening_str(result.groups()[3], id_name)
-        row_list.append(
-            {
-                "id": id_name,
-                "day": result.groups()[0],
-                "start": result.groups()[1],
-                "end": result.groups()[2],
-            }
-        )
+    for result in reversed(list(results)):
+        first, last, start, end = result.groups()
+        # a single time is taken as the opening time
+        for day in day_range(first, last):
+            row_list.append(
+                {
+                    "id": id_name,
+                    "day": day,
+                    "start": start,
+                    "end": end or start,
+                }
+            )
     return row_list
 
 
@@ -72,3 +121,78 @@ def sort_by_time_to_open(df_out, time_now=datetime.now()):
     df_out["time_to_open"] = (df_out["day_start"] - time_weird) % np.timedelta64(7, "D")
     df_out.loc[now_msk, "time_to_open"] = np.timedelta64(0, "D")
     return df_out.sort_values("time_to_open").reset_index(drop=True)
+
+
+# minutes in a week, for modular arithmetic on minute-of-week times
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+
+def minute_of_week(time_stamp):
+    """Minutes since midnight on Monday"""
+    return (time_stamp.weekday() * 24 + time_stamp.hour) * 60 + time_stamp.minute
+
+
+def time_to_minutes(text):
+    """Minutes since midnight from a time string such as "9.30" or "09:30" """
+    hours, minutes = re.split(r"[\.:]", text)
+    return int(hours) * 60 + int(minutes)
+
+
+class OpeningSchedule:
+    """Foodbank opening intervals as integer minute-of-week arrays
+
+    Parameters
+    ----------
+    ids : np.ndarray
+        foodbank ID of each opening interval
+    starts : np.ndarray
+        minute of the week each interval opens
+    ends : np.ndarray
+        minute of the week each interval closes
+    """
+
+    def __init__(self, ids, starts, ends):
+        self.ids, self.positions = np.unique(np.asarray(ids), return_inverse=True)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.lengths = (np.asarray(ends, dtype=np.int64) - self.starts) % MINUTES_PER_WEEK
+
+    @classmethod
+    def from_foodbanks(cls, df, col_in="opening", col_id="ID"):
+        """Build from foodbanks with free text opening times, via `parse_open_times`"""
+        intervals = parse_open_times(df, col_in=col_in, col_id=col_id)
+        days = intervals["day"].apply(week_day_num).astype(int) - 1
+        starts = days * 24 * 60 + intervals["start"].apply(time_to_minutes)
+        ends = days * 24 * 60 + intervals["end"].apply(time_to_minutes)
+        return cls(intervals["id"].to_numpy(), starts.to_numpy(), ends.to_numpy())
+
+    def minutes_to_open(self, ids, time_stamp):
+        """Minutes from `time_stamp` until each foodbank next opens
+
+        Parameters
+        ----------
+        ids : array-like
+            foodbank IDs
+        time_stamp : datetime
+            time to measure from
+
+        Returns
+        -------
+        np.ndarray
+            minutes until each foodbank next opens, 0 if it is open at
+            `time_stamp` and inf if it has no known opening times
+        """
+        # time until each interval opens, or 0 when open now
+        since_start = (minute_of_week(time_stamp) - self.starts) % MINUTES_PER_WEEK
+        waits = np.where(
+            since_start <= self.lengths, 0, MINUTES_PER_WEEK - since_start
+        ).astype(float)
+
+        # earliest interval per foodbank
+        best = np.full(len(self.ids), np.inf)
+        np.minimum.at(best, self.positions, waits)
+
+        ids = np.asarray(ids)
+        if not len(self.ids):
+            return np.full(len(ids), np.inf)
+        pos = np.clip(np.searchsorted(self.ids, ids), 0, len(self.ids) - 1)
+        return np.where(self.ids[pos] == ids, best[pos], np.inf)
@@ -0,0 +1,12 @@
+"""Projection between lat/long and British National Grid coordinates"""
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def to_bng():
+    """reusable lat/long (EPSG 4326) -> British National Grid (EPSG 27700,
+    meters) transformer, taking and returning (x, y) = (long, lat) order.
+    pyproj is imported and the transformer created on first use"""
+    from pyproj import Transformer
+
+    return Transformer.from_crs("EPSG:4326", "EPSG:27700", always_xy=True)
@@ -0,0 +1,79 @@
+"""Bounded LRU cache with TTL eviction for search results"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """Least recently used cache of query results
+
+    Entries expire `ttl` seconds after they are stored. Cached results are
+    computed from data loaded once at start up, so the app is restarted to
+    serve rebuilt data files.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        maximum number of cached results, by default 1024
+    ttl : float, optional
+        seconds a result stays valid, by default 300
+    on_evict : callable, optional
+        called with no arguments for each result evicted, expired or least
+        recently used, e.g. to count evictions in the request metrics
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Cached result for `key`, or None when missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                self.evicted()
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """Cache `value` for `key`, evicting the least recently used result when full"""
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evicted()
+
+    def evicted(self):
+        """Count one evicted result, called holding the lock"""
+        self.evictions += 1
+        if self.on_evict is not None:
+            self.on_evict()
+
+    def clear(self):
+        """Drop every cached result"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        """Hit, miss and eviction counters and current size"""
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.entries),
+            }
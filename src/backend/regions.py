@@ -0,0 +1,362 @@
+"""Region partitioned data shards, loaded lazily and evicted under a memory
+budget"""
+import os
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+from src.backend.config import region_config
+from src.backend.distance import DistanceEngine
+from src.backend.od_matrix import load_od_matrix
+from src.backend.open_times import OpeningSchedule, opening_day_mask
+from src.backend.projection import to_bng
+from src.coordinates import PostcodeIndex, canonical_postcode
+
+
+def distance_to_bounds(long: float, lat: float, bounds: list) -> float:
+    """Projected distance in meters from a point to a [south, west, north,
+    east] bounding box in CRS EPSG 4326, zero inside the box"""
+    south, west, north, east = bounds
+    x, y = to_bng().transform(long, lat)
+    edge_x, edge_y = to_bng().transform(
+        min(max(long, west), east), min(max(lat, south), north)
+    )
+    return float(np.hypot(x - edge_x, y - edge_y))
+
+
+class RegionShard:
+    """Postcode index, foodbanks, OD matrix and spatial index for one region
+
+    Parameters
+    ----------
+    name : str
+        region name
+    postcode_index : PostcodeIndex
+        postcodes in the region
+    foodbanks : pd.DataFrame
+        foodbanks in the region. Postcodes are canonicalised and a 'day_mask'
+        column of opening days is added in place
+    od_matrix : ODMatrix
+        OD matrix from the region's postcodes to its foodbanks
+    """
+
+    def __init__(self, name, postcode_index, foodbanks, od_matrix):
+        self.name = name
+        self.postcode_index = postcode_index
+        self.od_matrix = od_matrix
+
+        # parse opening days once, as a bit mask with bit 0 set for Monday
+        foodbanks["postcode"] = foodbanks["postcode"].map(canonical_postcode)
+        foodbanks["day_mask"] = foodbanks["opening"].map(opening_day_mask)
+        self.foodbanks = foodbanks
+
+        # parse opening times once, as minute-of-week intervals
+        self.schedule = OpeningSchedule.from_foodbanks(foodbanks)
+
+        # opening day bit masks indexed by foodbank ID, for vectorised lookups
+        self.day_masks = np.zeros(foodbanks["ID"].max() + 1, dtype=np.int64)
+        self.day_masks[foodbanks["ID"]] = foodbanks["day_mask"]
+
+        # row positions indexed by foodbank ID, -1 for unknown IDs
+        self.foodbank_rows = np.full(foodbanks["ID"].max() + 1, -1, dtype=np.int64)
+        self.foodbank_rows[foodbanks["ID"]] = np.arange(len(foodbanks))
+
+    @cached_property
+    def distance_engines(self) -> dict:
+        """Exact distance engines, bypassing the OD matrix, built on first use"""
+        return {
+            metric: DistanceEngine(self.foodbanks, metric=metric)
+            for metric in ["projected", "haversine"]
+        }
+
+    @cached_property
+    def postcode_tree(self):
+        """Spatial index over the projected postcode centroids, built on first
+        use"""
+        from scipy.spatial import cKDTree
+
+        index = self.postcode_index
+        x, y = to_bng().transform(index.long, index.lat)
+        return cKDTree(np.column_stack([x, y]))
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """Load a region's shard from the data files named in its configuration
+
+        Parameters
+        ----------
+        config : dict
+            region configuration, see `region_config`
+
+        Returns
+        -------
+        RegionShard
+            the loaded shard
+        """
+        data_dir = config["DATA_DIR"]
+        postcode_snapshot = os.path.join(data_dir, config["POSTCODE_SNAPSHOT_DIRNAME"])
+        if os.path.exists(postcode_snapshot):
+            postcode_index = PostcodeIndex.from_snapshot(postcode_snapshot)
+        else:
+            postcode_index = PostcodeIndex.from_csv(
+                os.path.join(data_dir, config["POSTCODE_FILENAME"])
+            )
+        return cls(
+            config.get("REGION"),
+            postcode_index,
+            pd.read_csv(os.path.join(data_dir, config["FOODBANK_FILENAME"])),
+            load_od_matrix(
+                os.path.join(data_dir, config["OD_SNAPSHOT_DIRNAME"]),
+                os.path.join(data_dir, config["OD_FILENAME"]),
+            ),
+        )
+
+    def foodbank_positions(self, ids: np.ndarray) -> np.ndarray:
+        """Row position in the region's foodbanks of each foodbank ID, -1 for
+        IDs not in them, e.g. from an OD matrix built before the foodbanks
+        changed"""
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = np.full(len(ids), -1, dtype=np.int64)
+        known = (ids >= 0) & (ids < len(self.foodbank_rows))
+        rows[known] = self.foodbank_rows[ids[known]]
+        return rows
+
+    def foodbank_details(self, found: pd.DataFrame) -> pd.DataFrame:
+        """Foodbank information for search results, like a left merge on 'ID'
+        but taking rows by position
+
+        Parameters
+        ----------
+        found : pd.DataFrame
+            search results with columns 'ID' and 'distance'
+
+        Returns
+        -------
+        pd.DataFrame
+            columns 'ID' and 'distance' followed by the other foodbank
+            columns, in the order of `found`. IDs not in the region's
+            foodbanks are dropped
+        """
+        rows = self.foodbank_positions(found["ID"].to_numpy())
+        keep = rows >= 0
+
+        details = self.foodbanks.take(rows[keep]).reset_index(drop=True)
+        details.insert(1, "distance", found["distance"].to_numpy()[keep])
+        return details
+
+    def snap_many(self, coords) -> np.ndarray:
+        """Nearest postcode in the region to each (long, lat) pair of an (n, 2)
+        array"""
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        x, y = to_bng().transform(coords[:, 0], coords[:, 1])
+        _, ind = self.postcode_tree.query(np.column_stack([x, y]))
+        return self.postcode_index.postcodes[ind]
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the shard, in bytes"""
+        od_matrix = self.od_matrix
+        index = self.postcode_index
+        arrays = [
+            od_matrix.postcodes,
+            od_matrix.offsets,
+            od_matrix.ids,
+            od_matrix.distances,
+            self.day_masks,
+            self.foodbank_rows,
+            index.postcodes,
+            index.lat,
+            index.long,
+        ]
+        # only count the spatial index once it is built
+        if "postcode_tree" in self.__dict__:
+            arrays.append(self.postcode_tree.data)
+        return int(
+            sum(array.nbytes for array in arrays)
+            + self.foodbanks.memory_usage(deep=True).sum()
+        )
+
+
+class ShardStore:
+    """Region shards loaded on first use and evicted under a memory budget
+
+    Only the configuration is read up front, so startup cost does not grow
+    with the number of regions. Each region is configured by a
+    `[regions.<name>]` table in the pipeline configuration, which may set:
+
+        - 'DATA_DIR' directory holding the region's data files
+        - 'BOUNDS' [south, west, north, east] extent in CRS EPSG 4326, for
+        routing coordinates to the region
+        - 'OUTWARD_CODES' postcode outward codes in the region, for routing
+        postcodes to the region
+        - 'ADJACENT' neighbouring regions consulted for cross-border searches
+        - 'MAP_CENTRE' [lat, long] initial map centre
+
+    Parameters
+    ----------
+    config : dict
+        pipeline configuration
+    memory_budget : int, optional
+        bytes of shard data to keep loaded, least recently used shards
+        beyond the budget are evicted. By default `SHARD_MEMORY_BUDGET_MB`
+        from the configuration, or no limit
+    loader : callable, optional
+        loads a `RegionShard` from a region configuration, by default
+        `RegionShard.from_config`
+    """
+
+    def __init__(self, config: dict, memory_budget: int | None = None, loader=None):
+        self.config = config
+        self.regions = config.get("regions", {})
+        self.default = config.get("DEFAULT_REGION", "default")
+        if memory_budget is None and "SHARD_MEMORY_BUDGET_MB" in config:
+            memory_budget = config["SHARD_MEMORY_BUDGET_MB"] * 2**20
+        self.memory_budget = memory_budget
+        self.loader = loader or RegionShard.from_config
+        self.shards = OrderedDict()
+        self.pinned = set()
+        self.lock = threading.RLock()
+        # held while a region loads, so it loads once without blocking
+        # searches of other regions
+        self.load_locks = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def region_config(self, name: str | None = None) -> dict:
+        """Configuration for one region, by default the default region"""
+        return region_config(self.config, name or self.default)
+
+    def add(self, shard: RegionShard, pinned: bool = True):
+        """Register an already loaded shard, never evicted when pinned"""
+        with self.lock:
+            self.shards[shard.name] = shard
+            if pinned:
+                self.pinned.add(shard.name)
+
+    def get(self, name: str | None = None) -> RegionShard:
+        """Shard for a region, loading it on first use
+
+        Raises
+        ------
+        ValueError
+            when `name` is not a configured region.
+        """
+        name = name or self.default
+        shard = self.loaded(name)
+        if shard is not None:
+            return shard
+
+        config = self.region_config(name)
+        with self.lock:
+            load_lock = self.load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            # loaded by another thread while waiting
+            shard = self.loaded(name)
+            if shard is not None:
+                return shard
+
+            shard = self.loader(config)
+            shard.name = name
+            with self.lock:
+                self.shards[name] = shard
+                self.loads += 1
+                self.evict(keep=name)
+            return shard
+
+    def loaded(self, name: str) -> RegionShard | None:
+        """Shard for a region if it is loaded, marking it recently used"""
+        with self.lock:
+            shard = self.shards.get(name)
+            if shard is not None:
+                self.shards.move_to_end(name)
+            return shard
+
+    def evict(self, keep: str | None = None):
+        """Drop least recently used shards until within the memory budget"""
+        if self.memory_budget is None:
+            return
+        with self.lock:
+            sizes = {name: shard.nbytes() for name, shard in self.shards.items()}
+            for name in list(self.shards):
+                if sum(sizes.values()) <= self.memory_budget:
+                    break
+                if name in self.pinned or name == keep:
+                    continue
+                del self.shards[name]
+                del sizes[name]
+                self.evictions += 1
+
+    def region_for_postcode(self, postcode: str) -> str | None:
+        """Region holding a postcode, by default the default region
+
+        Loaded shards are checked first, then regions listing the postcode's
+        outward code in 'OUTWARD_CODES'.
+        """
+        postcode = canonical_postcode(postcode)
+        with self.lock:
+            for name, shard in self.shards.items():
+                if postcode in shard.postcode_index:
+                    return name
+        outward = postcode.split(" ")[0]
+        for name, region in self.regions.items():
+            if outward in region.get("OUTWARD_CODES", []) and postcode in self.get(name).postcode_index:
+                return name
+        return self.default
+
+    def lookup(self, postcode: str) -> list | None:
+        """Coordinates [lat, long] of a postcode in the region holding it, see
+        `region_for_postcode`, None if not present"""
+        return self.get(self.region_for_postcode(postcode)).postcode_index.lookup(postcode)
+
+    def prefix_search(self, prefix: str, limit: int = 10) -> list:
+        """Up to `limit` canonical postcodes starting with a prefix, in sorted
+        order, from every region that could hold them
+
+        The default region and loaded regions are searched, and regions
+        with an outward code in 'OUTWARD_CODES' that the prefix could start,
+        loading them on first use.
+        """
+        key = "".join(str(prefix).split()).upper()
+        if not key or limit <= 0:
+            return []
+        with self.lock:
+            names = [self.default, *self.shards]
+        for name, region in self.regions.items():
+            codes = region.get("OUTWARD_CODES", [])
+            if any(code.startswith(key) or key.startswith(code) for code in codes):
+                names.append(name)
+
+        matches = set()
+        for name in dict.fromkeys(names):
+            matches.update(self.get(name).postcode_index.prefix_search(key, limit))
+        return sorted(matches, key=lambda postcode: postcode.replace(" ", ""))[:limit]
+
+    def region_for_point(self, long: float, lat: float) -> str | None:
+        """First region whose 'BOUNDS' contain a point, by default the default
+        region"""
+        for name, region in self.regions.items():
+            if "BOUNDS" in region and distance_to_bounds(long, lat, region["BOUNDS"]) == 0:
+                return name
+        return self.default
+
+    def adjacent(self, name: str, long: float, lat: float, dist_range: float) -> list:
+        """Regions adjacent to `name` whose 'BOUNDS' come within `dist_range`
+        meters of a point"""
+        return [
+            neighbour
+            for neighbour in self.regions.get(name, {}).get("ADJACENT", [])
+            if "BOUNDS" in self.regions.get(neighbour, {})
+            and distance_to_bounds(long, lat, self.regions[neighbour]["BOUNDS"]) <= dist_range
+        ]
+
+    def stats(self) -> dict:
+        """Configured and loaded regions, loads, evictions and loaded bytes"""
+        with self.lock:
+            return {
+                "regions": len(self.regions),
+                "loaded": list(self.shards),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "nbytes": sum(shard.nbytes() for shard in self.shards.values()),
+            }
@@ -0,0 +1,151 @@
+"""Walking distances over a local road and footpath network extract"""
+import numpy as np
+import pandas as pd
+
+from src.backend.projection import to_bng
+
+# distances held in float64 by each batch of Dijkstra searches, 32MB
+BATCH_CELLS = 2**22
+
+
+class RoadNetwork:
+    """Undirected network of walkable road and footpath segments
+
+    Locations are snapped to their nearest network node, and distances over
+    the network are found by a Dijkstra search from each origin node, with no
+    routing service involved.
+
+    Parameters
+    ----------
+    nodes : pd.DataFrame
+        network nodes with columns 'node' (identifier), 'lat' and 'long' in
+        CRS EPSG 4326
+    edges : pd.DataFrame
+        network segments with columns 'u' and 'v' (node identifiers) and
+        'length' in meters. Segments are walkable in both directions
+
+    Raises
+    ------
+    ValueError
+        when an edge refers to a node missing from `nodes`.
+    """
+
+    def __init__(self, nodes: pd.DataFrame, edges: pd.DataFrame):
+        from scipy.sparse import coo_matrix
+
+        node_ids = nodes["node"].to_numpy()
+        order = np.argsort(node_ids, kind="stable")
+        sorted_ids = node_ids[order]
+        ends = []
+        for column in ["u", "v"]:
+            ids = edges[column].to_numpy()
+            found = np.searchsorted(sorted_ids, ids).clip(0, len(sorted_ids) - 1)
+            if not (sorted_ids[found] == ids).all():
+                raise ValueError(
+                    f"Network edges refer to nodes missing from the nodes in '{column}'"
+                )
+            ends.append(order[found])
+
+        # keep the shortest of any parallel segments, as building the sparse
+        # graph would sum them
+        segments = (
+            pd.DataFrame(
+                {
+                    "a": np.minimum(*ends),
+                    "b": np.maximum(*ends),
+                    "length": edges["length"].to_numpy(dtype=float),
+                }
+            )
+            .groupby(["a", "b"], as_index=False)["length"]
+            .min()
+        )
+        segments = segments[segments["a"] != segments["b"]]
+
+        self.x, self.y = to_bng().transform(
+            nodes["long"].to_numpy(), nodes["lat"].to_numpy()
+        )
+        n_nodes = len(nodes)
+        self.graph = coo_matrix(
+            (
+                segments["length"].to_numpy(),
+                (segments["a"].to_numpy(), segments["b"].to_numpy()),
+            ),
+            shape=(n_nodes, n_nodes),
+        ).tocsr()
+
+    @classmethod
+    def from_csv(cls, nodes_path: str, edges_path: str) -> "RoadNetwork":
+        """Load a network from node and edge csv files, see `RoadNetwork`"""
+        return cls(
+            pd.read_csv(nodes_path, usecols=["node", "lat", "long"]),
+            pd.read_csv(edges_path, usecols=["u", "v", "length"]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def snap(self, x: np.ndarray, y: np.ndarray) -> tuple:
+        """Nearest network node to each projected location
+
+        Parameters
+        ----------
+        x, y : np.ndarray
+            locations in CRS EPSG 27700
+
+        Returns
+        -------
+        tuple
+            node position and straight line distance to it in meters, for
+            each location
+        """
+        from scipy.spatial import cKDTree
+
+        tree = cKDTree(np.column_stack([self.x, self.y]))
+        access, node = tree.query(np.column_stack([x, y]))
+        return node, access
+
+    def distances_from(
+        self,
+        sources: np.ndarray,
+        limit: float = np.inf,
+        targets: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """Shortest network distances from each source node to each target node
+
+        One Dijkstra search is run per source, a batch of sources at a time so
+        that only a batch of full float64 rows is held at once. Each batch is
+        narrowed to the target columns and stored as float32.
+
+        Parameters
+        ----------
+        sources : np.ndarray
+            source node positions
+        limit : float, optional
+            distance in meters beyond which nodes are left unreached, by
+            default no limit
+        targets : np.ndarray, optional
+            target node positions, by default every node
+
+        Returns
+        -------
+        np.ndarray
+            float32 distances in meters of shape (n_sources, n_targets),
+            infinite for unreached nodes
+        """
+        from scipy.sparse.csgraph import dijkstra
+
+        sources = np.asarray(sources)
+        n_targets = len(self) if targets is None else len(targets)
+        distances = np.empty((len(sources), n_targets), dtype=np.float32)
+        batch_size = max(1, BATCH_CELLS // max(1, len(self)))
+        for start in range(0, len(sources), batch_size):
+            batch = dijkstra(
+                self.graph,
+                directed=False,
+                indices=sources[start : start + batch_size],
+                limit=limit,
+            )
+            distances[start : start + batch_size] = (
+                batch if targets is None else batch[:, targets]
+            )
+        return distances
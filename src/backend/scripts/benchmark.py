@@ -0,0 +1,253 @@
+""" Utility script to benchmark searches on synthetic datasets of growing size
+
+Times the search functions, the results table and a full search POST to the
+app on each synthetic dataset, building any that are missing with
+`make_synthetic`. Reports latency percentiles and peak memory, and compares
+them with the stored baseline, exiting with an error on a regression, e.g.
+
+    python -m src.backend.scripts.benchmark --scales 1 10
+    python -m src.backend.scripts.benchmark --update-baseline
+
+Each scale runs in its own process, so its load time and peak resident
+memory are measured from a cold start.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from src.backend.config import load_config
+from src.backend.scripts.make_synthetic import make_synthetic, synthetic_config
+
+# start time of asap searches, a weekday lunchtime
+ASAP_TIME = datetime(2023, 5, 11, 12, 10)
+
+# search range in meters, within `BENCHMARK_OD_MAX_RADIUS`
+SEARCH_RANGE = 5000
+
+# metrics compared with the baseline
+COMPARED_METRICS = ["p50_ms", "peak_kb"]
+
+
+def latency_stats(seconds):
+    """ Latency distribution of a list of timings, in milliseconds """
+    ms = np.asarray(seconds) * 1000
+    return {
+        "n": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def search_form(postcode):
+    """ Form posted to the app for a nearest search from a postcode """
+    return {
+        "query_type": "nearest",
+        "query_location": "postcode",
+        "pcode": postcode,
+        "range_val": str(SEARCH_RANGE / 1000),
+        "Monday": "on",
+    }
+
+
+def measure(function, inputs, setup=None, budget=10.0):
+    """ Times `function` on each input in turn, until the inputs or the time budget
+    in seconds run out, then traces the peak memory allocated by one more call.
+    `setup` runs untimed before each call, e.g. to clear caches. """
+    timings = []
+    deadline = time.perf_counter() + budget
+    for value in inputs:
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function(value)
+        timings.append(time.perf_counter() - start)
+        if time.perf_counter() > deadline:
+            break
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    function(inputs[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {**latency_stats(timings), "peak_kb": peak / 1024}
+
+
+def run_scale(config, scale, repeat=200, budget=10.0, seed=0):
+    """ Benchmarks one synthetic dataset, loading it as the app's data store.
+    Must run in a fresh process, before the app is imported. """
+    from src.backend.data_store import STORE
+
+    start = time.perf_counter()
+    STORE.use_config(synthetic_config(config, scale))
+
+    import app
+    from src.backend.frontend_handler import QUERY_CACHE, foodfind_asap, foodfind_nearest
+    from src.backend.open_times import parse_open_times
+    from src.backend.utils import snap_to_nearest_postcode
+    from src.coordinates import LongLat
+    from src.display import html_table
+
+    STORE.warm()
+    load_seconds = time.perf_counter() - start
+
+    # random postcodes and points across the dataset
+    rng = np.random.default_rng(seed)
+    index = STORE.postcode_index
+    picks = rng.integers(len(index), size=repeat)
+    postcodes = index.postcodes[picks].tolist()
+    points = [
+        LongLat(long, lat)
+        for long, lat in zip(
+            index.long[picks] + rng.normal(0, 0.002, repeat),
+            index.lat[picks] + rng.normal(0, 0.002, repeat),
+        )
+    ]
+    foodbanks = STORE.default_shard.foodbanks
+    results = [foodfind_nearest("postcode", postcode=pc, dist_range=SEARCH_RANGE) for pc in postcodes]
+    # a search redirected for an unknown postcode would not time a search
+    client = app.app.test_client()
+    if client.post("/", data=search_form(postcodes[0])).status_code != 200:
+        raise RuntimeError(f"Search from {postcodes[0]} did not render results")
+
+    functions = {
+        "foodfind_nearest": (
+            lambda pc: foodfind_nearest("postcode", postcode=pc, dist_range=SEARCH_RANGE),
+            postcodes,
+        ),
+        "foodfind_asap": (
+            lambda pc: foodfind_asap(
+                "postcode", postcode=pc, dist_range=SEARCH_RANGE, time_stamp=ASAP_TIME
+            ),
+            postcodes,
+        ),
+        "snap_to_nearest_postcode": (snap_to_nearest_postcode, points),
+        "parse_open_times": (
+            lambda df: parse_open_times(df, col_in="opening", col_id="ID"),
+            [foodbanks] * repeat,
+        ),
+        "html_table": (html_table, results),
+        "post_search": (
+            lambda pc: client.post("/", data=search_form(pc)),
+            postcodes,
+        ),
+    }
+    report = {
+        name: measure(function, inputs, setup=QUERY_CACHE.clear, budget=budget)
+        for name, (function, inputs) in functions.items()
+    }
+    report["process"] = {
+        "postcodes": len(index),
+        "foodbanks": len(foodbanks),
+        "load_s": load_seconds,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    return report
+
+
+def compare_baseline(results, baseline, tolerance):
+    """ Regressions beyond `tolerance` times the baseline, as readable lines.
+    Scales and functions missing from the baseline are not compared. """
+    regressions = []
+    for scale, functions in results.items():
+        for name, stats in functions.items():
+            base = baseline.get(scale, {}).get(name)
+            if base is None or name == "process":
+                continue
+            for metric in COMPARED_METRICS:
+                if base.get(metric) and stats[metric] > tolerance * base[metric]:
+                    regressions.append(
+                        f"{scale} {name} {metric} {stats[metric]:.2f}, baseline {base[metric]:.2f}"
+                    )
+    return regressions
+
+
+def format_report(results):
+    """ Plain text table of the benchmark results of each scale """
+    lines = []
+    for scale, functions in results.items():
+        process = functions["process"]
+        lines.append(
+            f"{scale}: {process['postcodes']} postcodes, {process['foodbanks']} foodbanks, "
+            f"loaded in {process['load_s']:.2f}s, peak memory {process['rss_mb']:.0f} MB"
+        )
+        lines.append(
+            f"  {'function':<26}{'n':>5}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'peak KiB':>10}"
+        )
+        for name, stats in functions.items():
+            if name == "process":
+                continue
+            lines.append(
+                f"  {name:<26}{stats['n']:>5}{stats['p50_ms']:>10.3f}{stats['p90_ms']:>10.3f}"
+                f"{stats['p99_ms']:>10.3f}{stats['max_ms']:>10.3f}{stats['peak_kb']:>10.0f}"
+            )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", help="multiples of the Sheffield size, by default `BENCHMARK_SCALES`")
+    parser.add_argument("--repeat", type=int, default=200, help="calls timed per function")
+    parser.add_argument("--budget", type=float, default=10.0, help="seconds of timed calls per function")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    config = load_config()
+    if args.worker is not None:
+        print(json.dumps(run_scale(config, args.worker, args.repeat, args.budget)))
+        return
+
+    results = {}
+    for scale in args.scales or config["BENCHMARK_SCALES"]:
+        data_dir = synthetic_config(config, scale)["DATA_DIR"]
+        if not os.path.exists(os.path.join(data_dir, config["OD_SNAPSHOT_DIRNAME"])):
+            print(f"Building {scale}x dataset")
+            make_synthetic(config, scale)
+        worker = subprocess.run(
+            [sys.executable, "-m", "src.backend.scripts.benchmark", "--worker", str(scale),
+             "--repeat", str(args.repeat), "--budget", str(args.budget)],
+            capture_output=True, text=True, check=True,
+        )
+        results[f"{scale}x"] = json.loads(worker.stdout.splitlines()[-1])
+    print(format_report(results))
+
+    baseline_path = config["BENCHMARK_BASELINE"]
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(baseline_path):
+            with open(baseline_path, "r") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(baseline_path, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline written to {baseline_path}")
+        return
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}, run with --update-baseline to store one")
+        return
+
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    regressions = compare_baseline(results, baseline, config["BENCHMARK_TOLERANCE"])
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {config['BENCHMARK_TOLERANCE']}x the baseline")
+
+
+if __name__ == "__main__":
+    main()
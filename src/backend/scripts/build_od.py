@@ -1,99 +1,473 @@
 """ Utility script to generate a postcode/foodbank OD matrix """
 
+import argparse
+import hashlib
+import json
 import os
-import toml
+import resource
+import time
+
 import numpy as np
 import pandas as pd
-import geopandas as gpd
+
+from src.backend.checksum import file_checksum
+from src.backend.config import load_config, region_config
+from src.backend.od_matrix import ODSnapshotWriter, read_od_snapshot
+from src.backend.projection import to_bng
+from src.backend.road_network import RoadNetwork
+from src.coordinates import PostcodeIndex, canonical_postcode
+
+# build manifest, written alongside the binary snapshot
+MANIFEST_FILENAME = "manifest.json"
 
 
-def convert_to_geodataframe(
-    df: pd.DataFrame,
-    lat: str = 'lat',
-    long: str = 'long',
-    crs: str = 'EPSG:4326',
-) -> gpd.GeoDataFrame:
-    """Convert pandas dataframe to a geopandas dataframe
+def read_projected(path: str, columns: list) -> tuple:
+    """Read a csv with 'lat' and 'long' columns, projecting them to CRS EPSG
+    27700
 
     Parameters
     ----------
-    df : pd.DataFrame
-        input pandas dataframe
-    lat : str, optional
-        latitude column name, by default 'lat'
-    long : str, optional
-        longitude column name, by default 'long'
-    crs : str, optional
-        coordinate reference system to use, by default 'EPSG:4326'
+    path : str
+        csv file path
+    columns : list
+        identifying columns to keep, as well as coordinates
 
     Returns
     -------
-    gpd.GeoDataFrame
-        output geopandas dataframe
+    tuple
+        dataframe of the identifying columns, and x and y coordinate arrays in
+        meters
     """
-    return gpd.GeoDataFrame(
-        df,
-        geometry=gpd.points_from_xy(x=df[long], y=df[lat]),
-        crs=crs,
+    df = pd.read_csv(path, usecols=columns + ["lat", "long"])
+    x, y = to_bng().transform(df["long"].to_numpy(), df["lat"].to_numpy())
+    return df[columns], x, y
+
+
+def od_pairs(
+    postcode_x: np.ndarray,
+    postcode_y: np.ndarray,
+    foodbank_x: np.ndarray,
+    foodbank_y: np.ndarray,
+    max_radius: float,
+) -> tuple:
+    """Distances between a chunk of postcodes and every foodbank, by
+    broadcasting projected coordinate arrays
+
+    Parameters
+    ----------
+    postcode_x, postcode_y : np.ndarray
+        postcode coordinates in meters
+    foodbank_x, foodbank_y : np.ndarray
+        foodbank coordinates in meters
+    max_radius : float
+        pairs further apart than this, in meters, are dropped
+
+    Returns
+    -------
+    tuple
+        arrays of postcode position, foodbank position and distance for each
+        pair within `max_radius`, grouped by postcode and nearest first
+    """
+    # only foodbanks near the chunk's bounding box can be in range, with a
+    # meter to spare for rounding distances to float32
+    margin = max_radius + 1
+    near = np.flatnonzero(
+        (foodbank_x >= postcode_x.min() - margin)
+        & (foodbank_x <= postcode_x.max() + margin)
+        & (foodbank_y >= postcode_y.min() - margin)
+        & (foodbank_y <= postcode_y.max() + margin)
     )
+    distances = np.hypot(
+        postcode_x[:, None] - foodbank_x[None, near],
+        postcode_y[:, None] - foodbank_y[None, near],
+    ).astype(np.float32)
+    return nearest_pairs(distances, max_radius, near)
 
 
-def main():
+def network_pairs(
+    postcode_nodes: np.ndarray,
+    postcode_access: np.ndarray,
+    foodbank_access: np.ndarray,
+    node_distances: np.ndarray,
+    max_radius: float,
+) -> tuple:
+    """Walking distances between a chunk of postcodes and every foodbank over
+    a road network
 
-    # Load config
-    with open(CONFIG_FILEPATH, "r") as f:
-        config = toml.load(f)
-
-    # read foodbank data
-    # TODO: change this temporary usecols list to required subset
-    foodbank_df = pd.read_csv(
-        os.path.join(
-            config["DATA_DIR"], config["FOODBANK_FILENAME"],
-        ),
+    Parameters
+    ----------
+    postcode_nodes : np.ndarray
+        column of `node_distances` for the network node nearest each postcode
+    postcode_access, foodbank_access : np.ndarray
+        straight line distances in meters from each postcode and foodbank to
+        its nearest network node
+    node_distances : np.ndarray
+        float32 network distances in meters from each foodbank's node to the
+        nodes nearest the postcodes, of shape (n_foodbanks, n_postcode_nodes),
+        see `RoadNetwork.distances_from`
+    max_radius : float
+        pairs further apart than this, in meters, are dropped
+
+    Returns
+    -------
+    tuple
+        arrays of postcode position, foodbank position and distance for each
+        pair within `max_radius`, grouped by postcode and nearest first
+    """
+    distances = (
+        node_distances[:, postcode_nodes].T
+        + postcode_access[:, None]
+        + foodbank_access[None, :]
+    ).astype(np.float32)
+    return nearest_pairs(distances, max_radius)
+
+
+def nearest_pairs(
+    distances: np.ndarray, max_radius: float, foodbank_pos: np.ndarray | None = None
+) -> tuple:
+    """Pairs within `max_radius` of a (postcodes, foodbanks) distance array,
+    grouped by postcode and nearest first
+
+    Parameters
+    ----------
+    distances : np.ndarray
+        distances in meters from each postcode to each foodbank
+    max_radius : float
+        pairs further apart than this, in meters, are dropped
+    foodbank_pos : np.ndarray, optional
+        foodbank position of each column, by default the column position
+
+    Returns
+    -------
+    tuple
+        arrays of postcode position, foodbank position and distance for each
+        pair
+    """
+    # sort each postcode's foodbanks by distance, then prune to the radius
+    order = np.argsort(distances, axis=1, kind="stable")
+    distances = np.take_along_axis(distances, order, axis=1)
+    foodbank_pos = order if foodbank_pos is None else foodbank_pos[order]
+    # unreachable pairs over a road network are infinitely far apart
+    keep = distances <= min(max_radius, np.finfo(np.float32).max)
+    postcode_pos = np.broadcast_to(
+        np.arange(len(distances))[:, None], distances.shape
+    )
+    return postcode_pos[keep], foodbank_pos[keep], distances[keep]
+
+
+def foodbank_fingerprints(foodbanks: pd.DataFrame) -> dict:
+    """Fingerprint of each foodbank's ID, postcode and coordinates, keyed by
+    ID as a string"""
+    return {
+        str(row.ID): hashlib.sha1(
+            f"{row.ID}|{row.postcode}|{row.lat!r}|{row.long!r}".encode()
+        ).hexdigest()
+        for row in foodbanks.itertuples(index=False)
+    }
+
+
+def build_manifest(config: dict, method: str = "straight") -> dict:
+    """Manifest of the inputs an OD matrix is built from
+
+    Parameters
+    ----------
+    config : dict
+        pipeline configuration
+    method : str, optional
+        how distances are measured, "straight" line or over the road
+        "network", by default "straight"
+
+    Returns
+    -------
+    dict
+        checksum of the postcode lookup, the maximum radius, the distance
+        method and a fingerprint for each foodbank
+    """
+    data_dir = config["DATA_DIR"]
+    foodbanks = pd.read_csv(
+        os.path.join(data_dir, config["FOODBANK_FILENAME"]),
         usecols=["ID", "postcode", "lat", "long"],
     )
+    return {
+        "postcodes": file_checksum(os.path.join(data_dir, config["POSTCODE_FILENAME"])),
+        "max_radius": config.get("OD_MAX_RADIUS"),
+        "method": method,
+        "foodbanks": foodbank_fingerprints(foodbanks),
+    }
+
 
-    # read postcode data
-    postcode_df = pd.read_csv(
-        os.path.join(
-            config["DATA_DIR"], config["POSTCODE_FILENAME"],
-        ),
-        usecols=["postcode", "lat", "long"],
+def read_manifest(snapshot_dir: str) -> dict | None:
+    """Manifest of the previous build, None if there is none"""
+    path = os.path.join(snapshot_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def previous_method(config: dict) -> str | None:
+    """Distance method, "straight" or "network", of the previous build
+    recorded in its manifest, None if there is no previous build"""
+    previous = read_manifest(os.path.join(config["DATA_DIR"], config["OD_SNAPSHOT_DIRNAME"]))
+    if previous is None:
+        return None
+    return previous.get("method", "straight")
+
+
+def write_manifest(snapshot_dir: str, manifest: dict):
+    """Write the manifest of a build alongside its snapshot"""
+    with open(os.path.join(snapshot_dir, MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f, indent=1)
+
+
+def update_od(config: dict, write_csv: bool = False) -> int | None:
+    """Incrementally update the OD matrix for added, moved and removed
+    foodbanks
+
+    Foodbanks are fingerprinted against the manifest of the previous build.
+    Distances are computed for added or moved foodbanks only, in time
+    proportional to the number of postcodes, and their pairs merged into the
+    memory-mapped matrix along with dropping removed foodbanks. The other
+    pairs are not recomputed or resorted, but as the snapshot is one array
+    per field in CSR layout, its ID, distance and offset files are rewritten
+    with the patched arrays, a sequential copy of 6 bytes per pair.
+
+    Parameters
+    ----------
+    config : dict
+        pipeline configuration
+    write_csv : bool, optional
+        whether to rewrite the csv export of the whole matrix, by default
+        False, leaving the export as of the last full build
+
+    Returns
+    -------
+    int | None
+        number of OD pairs in the updated matrix, or None when a full build
+        is needed because there is no previous build, the postcodes or
+        maximum radius have changed, or it measured distances over the road
+        network
+    """
+    data_dir = config["DATA_DIR"]
+    snapshot_dir = os.path.join(data_dir, config["OD_SNAPSHOT_DIRNAME"])
+    max_radius = config.get("OD_MAX_RADIUS", np.inf)
+
+    previous = read_manifest(snapshot_dir)
+    manifest = build_manifest(config)
+    if previous is None or any(
+        previous.get(key, "straight") != manifest[key]
+        for key in ["postcodes", "max_radius", "method"]
+    ):
+        return None
+
+    changed = [
+        foodbank_id for foodbank_id, fingerprint in manifest["foodbanks"].items()
+        if previous["foodbanks"].get(foodbank_id) != fingerprint
+    ]
+    removed = [
+        foodbank_id for foodbank_id in previous["foodbanks"]
+        if foodbank_id not in manifest["foodbanks"]
+    ]
+    od_matrix = read_od_snapshot(snapshot_dir)
+    print(f"{len(changed)} foodbanks added or moved, {len(removed)} removed")
+    if not changed and not removed:
+        return len(od_matrix)
+
+    # distances from every postcode to the added or moved foodbanks only
+    postcode_codes = np.zeros(0, dtype=np.int64)
+    changed_ids = np.zeros(0, dtype=np.int64)
+    distances = np.zeros(0, dtype=np.float32)
+    if changed:
+        foodbanks, foodbank_x, foodbank_y = read_projected(
+            os.path.join(data_dir, config["FOODBANK_FILENAME"]), ["ID"]
+        )
+        is_changed = foodbanks["ID"].astype(str).isin(changed).to_numpy()
+        postcodes, postcode_x, postcode_y = read_projected(
+            os.path.join(data_dir, config["POSTCODE_FILENAME"]), ["postcode"]
+        )
+        postcode_pos, foodbank_pos, distances = od_pairs(
+            postcode_x,
+            postcode_y,
+            foodbank_x[is_changed],
+            foodbank_y[is_changed],
+            max_radius,
+        )
+        postcode_codes = od_matrix.codes_many(postcodes["postcode"])[postcode_pos]
+        changed_ids = foodbanks["ID"].to_numpy()[is_changed][foodbank_pos]
+
+    od_matrix = od_matrix.replace_foodbanks(
+        [int(foodbank_id) for foodbank_id in changed + removed],
+        postcode_codes,
+        changed_ids,
+        distances,
+    )
+    od_matrix.save(snapshot_dir)
+    write_manifest(snapshot_dir, manifest)
+    if write_csv:
+        od_matrix.to_frame().to_csv(
+            os.path.join(data_dir, config["OD_FILENAME"]), index=False
+        )
+    return len(od_matrix)
+
+
+def build_od(config: dict, write_csv: bool = True, network: bool = False) -> int:
+    """Build the OD matrix csv and binary snapshot, a chunk of postcodes at a
+    time, and a binary snapshot of the postcode index
+
+    Parameters
+    ----------
+    config : dict
+        pipeline configuration
+    write_csv : bool, optional
+        whether to write the csv export as well as the binary snapshot, by
+        default True
+    network : bool, optional
+        whether to measure walking distances over the road network extract
+        in `NETWORK_NODES_FILENAME` and `NETWORK_EDGES_FILENAME`, rather than
+        straight line distances, by default False. The csv export then has
+        walking times in minutes at `WALKING_SPEED` as well
+
+    Returns
+    -------
+    int
+        number of OD pairs written
+    """
+    data_dir = config["DATA_DIR"]
+    max_radius = config.get("OD_MAX_RADIUS", np.inf)
+    chunk_size = config.get("OD_CHUNK_SIZE", 10000)
+
+    foodbanks, foodbank_x, foodbank_y = read_projected(
+        os.path.join(data_dir, config["FOODBANK_FILENAME"]), ["ID"]
+    )
+    postcodes, postcode_x, postcode_y = read_projected(
+        os.path.join(data_dir, config["POSTCODE_FILENAME"]), ["postcode"]
     )
+    PostcodeIndex.from_csv(os.path.join(data_dir, config["POSTCODE_FILENAME"])).save(
+        os.path.join(data_dir, config["POSTCODE_SNAPSHOT_DIRNAME"])
+    )
+
+    # postcode codes are positions in sorted canonical postcode order, which
+    # `ODMatrix` binary searches
+    postcode_names = np.array(
+        [canonical_postcode(postcode) for postcode in postcodes["postcode"]], dtype=str
+    )
+    order = np.argsort(postcode_names, kind="stable")
+    postcode_names = postcode_names[order]
+    postcode_x, postcode_y = postcode_x[order], postcode_y[order]
+    foodbank_ids = foodbanks["ID"].to_numpy()
 
-    # convert to geopandas dataframe
-    foodbank_gdf = convert_to_geodataframe(foodbank_df)
-    postcode_gdf = convert_to_geodataframe(postcode_df)
+    if network:
+        road_network = RoadNetwork.from_csv(
+            os.path.join(data_dir, config["NETWORK_NODES_FILENAME"]),
+            os.path.join(data_dir, config["NETWORK_EDGES_FILENAME"]),
+        )
+        postcode_nodes, postcode_access = road_network.snap(postcode_x, postcode_y)
+        foodbank_nodes, foodbank_access = road_network.snap(foodbank_x, foodbank_y)
+        # one Dijkstra search per distinct foodbank node, stopping at the
+        # radius as nothing further is kept, and keeping only the distances to
+        # the distinct postcode nodes
+        sources, source_pos = np.unique(foodbank_nodes, return_inverse=True)
+        targets, postcode_nodes = np.unique(postcode_nodes, return_inverse=True)
+        node_distances = road_network.distances_from(sources, max_radius, targets)[
+            source_pos
+        ]
 
-    # convert CRS to calculate correct distances
-    foodbank_gdf = foodbank_gdf.to_crs("EPSG:27700")
-    postcode_gdf = postcode_gdf.to_crs("EPSG:27700")
+    csv_path = os.path.join(data_dir, config["OD_FILENAME"])
+    snapshot_dir = os.path.join(data_dir, config["OD_SNAPSHOT_DIRNAME"])
+    snapshot = ODSnapshotWriter(snapshot_dir, np.unique(postcode_names))
+    n_pairs = 0
+    for start in range(0, len(postcode_names), chunk_size):
+        end = start + chunk_size
+        if network:
+            postcode_pos, foodbank_pos, distances = network_pairs(
+                postcode_nodes[start:end],
+                postcode_access[start:end],
+                foodbank_access,
+                node_distances,
+                max_radius,
+            )
+        else:
+            postcode_pos, foodbank_pos, distances = od_pairs(
+                postcode_x[start:end],
+                postcode_y[start:end],
+                foodbank_x,
+                foodbank_y,
+                max_radius,
+            )
+        postcode_pos += start
 
-    # create cross product of geometries (all possible co-ord pairs)
-    combined_gdf = foodbank_gdf[["ID", "postcode", "geometry"]].merge(
-        postcode_gdf[["postcode", "geometry"]],
-        how="cross",
-        suffixes=["_foodbank", "_post_code"]
+        # export lookup, streamed to disk a chunk at a time
+        if write_csv:
+            chunk = pd.DataFrame(
+                {
+                    "ID": foodbank_ids[foodbank_pos],
+                    "postcode": postcode_names[postcode_pos],
+                    "distance": distances,
+                }
+            )
+            if network:
+                chunk["minutes"] = distances / config.get("WALKING_SPEED", 80)
+            chunk.to_csv(
+                csv_path, mode="w" if start == 0 else "a", header=start == 0, index=False
+            )
+        snapshot.write(
+            np.searchsorted(snapshot.postcodes, postcode_names[postcode_pos]),
+            foodbank_ids[foodbank_pos],
+            distances,
+        )
+        n_pairs += len(distances)
+    snapshot.close()
+    write_manifest(
+        snapshot_dir, build_manifest(config, "network" if network else "straight")
     )
+    return n_pairs
 
-    # get distances between foodbanks and post codes
-    foodbank_coords = gpd.GeoSeries(combined_gdf["geometry_foodbank"])
-    post_code_coords = gpd.GeoSeries(combined_gdf["geometry_post_code"])
-    combined_gdf["distance"] = foodbank_coords.distance(post_code_coords)
-
-    # export lookup
-    out_df = combined_gdf[["ID", "postcode_post_code", "distance"]]
-    out_df = out_df.rename(columns={"postcode_post_code": "postcode"})
-    out_df.to_csv(
-        os.path.join(
-            config["DATA_DIR"], config["OD_FILENAME"]
-        ),
-        index=False,
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only recompute foodbanks changed since the previous build",
+    )
+    parser.add_argument(
+        "--no-csv", action="store_true", help="skip the csv export of the matrix"
     )
+    parser.add_argument(
+        "--csv",
+        action="store_true",
+        help="rewrite the csv export after an incremental update as well",
+    )
+    parser.add_argument("--region", help="region to build, by default the default region")
+    parser.add_argument(
+        "--network",
+        action="store_true",
+        help="measure walking distances over the road network extract",
+    )
+    args = parser.parse_args(argv)
+
+    # Load config
+    config = region_config(load_config(), args.region)
+
+    start = time.perf_counter()
+    n_pairs = None
+    network = args.network
+    if args.incremental and not network and previous_method(config) == "network":
+        # keep walking distances rather than replace them with straight lines
+        print("Previous build measured distances over the road network, rebuilding with it")
+        network = True
+    if args.incremental and not network:
+        n_pairs = update_od(config, write_csv=args.csv)
+        if n_pairs is None:
+            print("No compatible previous build, building in full")
+    if n_pairs is None:
+        n_pairs = build_od(config, write_csv=not args.no_csv, network=network)
+    elapsed = time.perf_counter() - start
 
+    # peak resident memory of this process, reported in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Built {n_pairs} OD pairs in {elapsed:.2f}s, peak memory {peak_mb:.0f} MB")
 
-# pipeline configuration file
-CONFIG_FILEPATH = "pipeline.toml"
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,187 @@
+""" Utility script to find foodbanks for every row of a caseload csv
+
+Streams an input csv of postcodes and/or coordinates in chunks, resolves each
+chunk with one vectorised `foodfind_batch` call across a pool of processes,
+and streams the results to a csv or parquet file, e.g.
+
+    python -m src.backend.scripts.bulk_query caseload.csv nearest.csv \
+        --query-type asap --num-results 3 --workers 4
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.backend.frontend_handler import SHARDS, foodfind_batch
+from src.backend.open_times import WEEK
+
+# foodbank details written alongside each result
+FOODBANK_COLUMNS = {"ID": "ID", "name": "foodbank_name", "postcode": "foodbank_postcode"}
+
+
+def chunk_origins(chunk, postcode_col, lat_col, long_col):
+    """ Origins for each row of a chunk, the postcode when given, otherwise the
+    (long, lat) pair """
+    postcodes = (
+        chunk[postcode_col] if postcode_col in chunk.columns
+        else pd.Series(np.nan, index=chunk.index)
+    )
+    if lat_col in chunk.columns and long_col in chunk.columns:
+        coords = zip(chunk[long_col].to_numpy(float), chunk[lat_col].to_numpy(float))
+    else:
+        coords = [(np.nan, np.nan)] * len(chunk)
+    return [
+        str(postcode) if isinstance(postcode, str) and postcode.strip() else coord
+        for postcode, coord in zip(postcodes, coords)
+    ]
+
+
+def process_chunk(task):
+    """ Finds foodbanks for one chunk of rows, returning one row per result """
+    first_row, origins, search = task
+    results = foodfind_batch(origins, **search)
+
+    results.insert(0, "row", results.pop("origin") + first_row)
+    foodbanks = pd.concat(
+        [
+            SHARDS.get(region).foodbanks[list(FOODBANK_COLUMNS)].assign(region=region)
+            for region in results["region"].unique()
+        ]
+        or [pd.DataFrame(columns=[*FOODBANK_COLUMNS, "region"])]
+    )
+    results = results.merge(
+        foodbanks.rename(columns=FOODBANK_COLUMNS),
+        on=["region", "ID"],
+        how="left",
+    )
+    if "time_to_open" in results.columns:
+        results["time_to_open"] = results["time_to_open"].dt.total_seconds() // 60
+    return results
+
+
+class Progress:
+    """ Reports rows processed and throughput """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.rows = 0
+        self.results = 0
+
+    def update(self, rows, results):
+        self.rows += rows
+        self.results += results
+        print(f"{self.rows} rows, {self.results} results, {self.rate():.0f} rows/sec", file=sys.stderr)
+
+    def rate(self):
+        return self.rows / max(time.perf_counter() - self.start, 1e-9)
+
+
+def write_next(pending, writer, progress):
+    """ Waits for the oldest chunk in flight and writes its results """
+    n_rows, future = pending.popleft()
+    results = future.result()
+    writer.write(results)
+    progress.update(n_rows, len(results))
+
+
+class ResultWriter:
+    """ Streams result chunks to a csv, or a parquet file when the path ends
+    in .parquet (requires pyarrow) """
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self.writer = None
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table.cast(self.writer.schema))
+        else:
+            df.to_csv(self.path, mode="a" if self.writer else "w", header=not self.writer, index=False)
+            self.writer = True
+
+    def close(self):
+        if self.parquet and self.writer is not None:
+            self.writer.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="input csv of postcodes and/or coordinates")
+    parser.add_argument("output", help="output .csv or .parquet file")
+    parser.add_argument("--query-type", choices=["nearest", "asap"], default="nearest")
+    parser.add_argument("--dist-range", type=float, default=5000, help="meters")
+    parser.add_argument("--num-results", type=int, default=3)
+    parser.add_argument("--days", default=",".join(WEEK), help="comma separated, for nearest")
+    parser.add_argument("--time-stamp", type=datetime.fromisoformat, help="ISO time, for asap")
+    parser.add_argument("--engine", choices=["od", "projected", "haversine"], default="od")
+    parser.add_argument("--postcode-col", default="postcode")
+    parser.add_argument("--lat-col", default="lat")
+    parser.add_argument("--long-col", default="long")
+    parser.add_argument("--chunksize", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+    # fail before any chunk is computed, rather than when writing the first
+    if args.output.endswith(".parquet") and importlib.util.find_spec("pyarrow") is None:
+        parser.error("parquet output requires pyarrow, install it or write a .csv")
+    args.days = [day.strip().capitalize() for day in args.days.split(",")]
+    unknown_days = sorted(set(args.days) - set(WEEK))
+    if unknown_days:
+        parser.error(f"{unknown_days} are not valid days, expecting any of {WEEK}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    search = {
+        "query_type": args.query_type,
+        "dist_range": args.dist_range,
+        "num_results": args.num_results,
+        "days": dict.fromkeys(args.days, True),
+        "time_stamp": args.time_stamp or datetime.now(),
+        "engine": args.engine,
+    }
+
+    reader = pd.read_csv(args.input, chunksize=args.chunksize, dtype={args.postcode_col: str})
+    writer = ResultWriter(args.output)
+    progress = Progress()
+    first_row = 0
+
+    # keep a bounded number of chunks in flight, so the input is streamed
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        pending = deque()
+        for chunk in reader:
+            origins = chunk_origins(chunk, args.postcode_col, args.lat_col, args.long_col)
+            future = executor.submit(process_chunk, (first_row, origins, search))
+            pending.append((len(chunk), future))
+            first_row += len(chunk)
+            while len(pending) > 2 * args.workers:
+                write_next(pending, writer, progress)
+        while pending:
+            write_next(pending, writer, progress)
+    writer.close()
+
+    elapsed = time.perf_counter() - progress.start
+    print(
+        f"Done: {progress.rows} rows, {progress.results} results in {elapsed:.1f}s "
+        f"({progress.rate():.0f} rows/sec)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
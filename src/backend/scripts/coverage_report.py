@@ -0,0 +1,61 @@
+""" Utility script to report foodbank coverage of every postcode
+
+Counts the foodbanks open within each radius of every postcode on each day of
+the week, with the distance to the nearest one open, from a region's OD matrix
+and opening days. Writes the table to `COVERAGE_FILENAME` and a GeoJSON layer of
+the postcodes with no foodbank open within `COVERAGE_GAP_RADIUS` on some day to
+`COVERAGE_GAPS_FILENAME`, and prints the number of such postcodes per day, e.g.
+
+    python -m src.backend.scripts.coverage_report --radii 1000 2000 5000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from src.backend.config import load_config, region_config
+from src.backend.coverage import coverage, coverage_gaps
+from src.backend.open_times import WEEK
+from src.backend.regions import RegionShard
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--region", help="region to report on, by default the default region")
+    parser.add_argument("--radii", type=float, nargs="+", help="meters, by default `COVERAGE_RADII`")
+    parser.add_argument("--gap-radius", type=float, help="meters, by default `COVERAGE_GAP_RADIUS`")
+    args = parser.parse_args()
+
+    config = region_config(load_config(), args.region)
+    gap_radius = args.gap_radius or config["COVERAGE_GAP_RADIUS"]
+    radii = sorted(set(args.radii or config["COVERAGE_RADII"]) | {gap_radius})
+    if radii[-1] > config.get("OD_MAX_RADIUS", float("inf")):
+        sys.exit(f"Radii beyond OD_MAX_RADIUS ({config['OD_MAX_RADIUS']}m) would be undercounted")
+
+    start = time.perf_counter()
+    shard = RegionShard.from_config(config)
+    loaded = time.perf_counter()
+    table = coverage(shard.od_matrix, shard.day_masks, radii)
+    gaps = coverage_gaps(table, shard.postcode_index, gap_radius)
+    computed = time.perf_counter()
+
+    data_dir = config["DATA_DIR"]
+    table.to_csv(os.path.join(data_dir, config["COVERAGE_FILENAME"]), index=False)
+    with open(os.path.join(data_dir, config["COVERAGE_GAPS_FILENAME"]), "w") as f:
+        json.dump(gaps, f, separators=(",", ":"))
+
+    uncovered = (
+        table.assign(uncovered=table["reachable"] == 0)
+        .pivot_table(index="day", columns="radius", values="uncovered", aggfunc="sum")
+        .reindex(WEEK)
+    )
+    print(f"Postcodes with no foodbank open within each radius (m), of {len(shard.od_matrix.postcodes)}")
+    print(uncovered.to_string())
+    print(f"{len(gaps['features'])} postcodes without a foodbank open within {gap_radius:g}m on some day")
+    print(f"Loaded in {loaded - start:.2f}s, computed in {computed - loaded:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
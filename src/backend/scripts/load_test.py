@@ -0,0 +1,161 @@
+""" Utility script to load test the app at increasing concurrency
+
+Drives `app.app` in-process through the Flask test client with a weighted mix
+of requests, from a pool of threads (one worker sharing the interpreter) or
+processes (like gunicorn sync workers forked from a preloaded app), and reports
+throughput and latency percentiles per route at each concurrency, e.g.
+
+    python -m src.backend.scripts.load_test --models threads processes \
+        --concurrency 1 2 4 8 --duration 10
+
+Search origins are sampled from the default region's postcode lookup. The knee
+of each worker model is the highest concurrency that still raised throughput
+by `LOADTEST_KNEE_GAIN`, beyond which requests mostly queue.
+"""
+
+import argparse
+import contextlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.backend.config import load_config, region_config
+
+VALID_MODELS = {"threads", "processes"}
+
+# every day ticked in the search form
+FORM_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def sample_origins(config, n=1000, seed=0):
+    """ Postcodes and their (lat, long) coordinates sampled from the default
+    region's postcode lookup """
+    config = region_config(config)
+    postcodes = pd.read_csv(
+        os.path.join(config["DATA_DIR"], config["POSTCODE_FILENAME"]),
+        usecols=["postcode", "lat", "long"],
+    )
+    return postcodes.sample(n, replace=len(postcodes) < n, random_state=seed).to_dict("records")
+
+
+def make_request(kind, origin, search_range=5.0):
+    """ Method, path and form data of a request, one of "index" (the search page)
+    or "<postcode|coords>_<nearest|asap>" searches from `origin` """
+    if kind == "index":
+        return "GET", "/", None
+
+    location, query_type = kind.split("_")
+    form = {"query_type": query_type, "range_val": str(search_range)}
+    form.update((day, "on") for day in FORM_DAYS)
+    if location == "postcode":
+        form.update(query_location="postcode", pcode=origin["postcode"])
+    else:
+        form.update(query_location="coords", coords=f"LatLng({origin['lat']}, {origin['long']})")
+    return "POST", "/", form
+
+
+def drive(task):
+    """ Sends requests drawn from the mix until the deadline, from one thread or
+    process. Returns (kind, latency in seconds, status code) per request. """
+    deadline, mix, origins, seed = task
+    import app
+
+    client = app.app.test_client()
+    rng = np.random.default_rng(seed)
+    kinds = list(mix)
+    weights = np.array([mix[kind] for kind in kinds], dtype=float)
+    weights /= weights.sum()
+
+    records = []
+    while time.time() < deadline:
+        kind = kinds[rng.choice(len(kinds), p=weights)]
+        method, path, form = make_request(kind, origins[rng.integers(len(origins))])
+        start = time.perf_counter()
+        response = client.open(path, method=method, data=form)
+        records.append((kind, time.perf_counter() - start, response.status_code))
+    return records
+
+
+def run_level(model, concurrency, duration, mix, origins, seed=0):
+    """ Drives the app from `concurrency` threads or processes for `duration`
+    seconds, returning one row per request with columns 'kind', 'latency' and
+    'status' """
+    if model not in VALID_MODELS:
+        raise ValueError(f"{model} is not a valid model. Expecting one of {VALID_MODELS}")
+    executor = ThreadPoolExecutor if model == "threads" else ProcessPoolExecutor
+
+    deadline = time.time() + duration
+    tasks = [(deadline, mix, origins, seed + worker) for worker in range(concurrency)]
+    # searches from coordinates print the location found, silenced in the
+    # threads and the processes forked from them
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with executor(max_workers=concurrency) as pool:
+            records = [record for worker in pool.map(drive, tasks) for record in worker]
+    return pd.DataFrame(records, columns=["kind", "latency", "status"])
+
+
+def summarise(records, duration):
+    """ Requests, errors, throughput and latency percentiles in milliseconds per
+    route, and for all routes as "all" """
+    groups = list(records.groupby("kind")) + [("all", records)]
+    rows = []
+    for kind, group in groups:
+        ms = group["latency"].to_numpy() * 1000
+        rows.append(
+            {
+                "route": kind,
+                "requests": len(group),
+                "errors": int((group["status"] >= 400).sum()),
+                "rps": len(group) / duration,
+                "p50_ms": np.percentile(ms, 50),
+                "p95_ms": np.percentile(ms, 95),
+                "p99_ms": np.percentile(ms, 99),
+            }
+        )
+    return pd.DataFrame(rows).set_index("route")
+
+
+def find_knee(throughputs, gain=0.1):
+    """ Highest concurrency whose throughput rose by at least `gain` over the
+    previous level, given throughput keyed by concurrency """
+    levels = sorted(throughputs)
+    knee = levels[0]
+    for previous, level in zip(levels, levels[1:]):
+        if throughputs[level] < throughputs[previous] * (1 + gain):
+            break
+        knee = level
+    return knee
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", default=["threads", "processes"], choices=sorted(VALID_MODELS))
+    parser.add_argument("--concurrency", type=int, nargs="+", help="levels, by default `LOADTEST_CONCURRENCY`")
+    parser.add_argument("--duration", type=float, help="seconds per level, by default `LOADTEST_DURATION`")
+    args = parser.parse_args()
+
+    config = load_config()
+    mix = dict(config["LOADTEST_MIX"])
+    levels = args.concurrency or config["LOADTEST_CONCURRENCY"]
+    duration = args.duration or config["LOADTEST_DURATION"]
+    origins = sample_origins(config)
+
+    # load the app before starting workers, so forked processes share it
+    import app  # noqa: F401
+
+    for model in args.models:
+        throughputs = {}
+        for concurrency in levels:
+            summary = summarise(run_level(model, concurrency, duration, mix, origins), duration)
+            throughputs[concurrency] = summary.loc["all", "rps"]
+            print(f"\n{model}, concurrency {concurrency}")
+            print(summary.to_string(float_format="{:.1f}".format))
+        knee = find_knee(throughputs, config["LOADTEST_KNEE_GAIN"])
+        print(f"\n{model}: throughput {throughputs[knee]:.1f} requests/s at the knee, concurrency {knee}")
+
+
+if __name__ == "__main__":
+    main()
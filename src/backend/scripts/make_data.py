@@ -1,59 +1,118 @@
+import argparse
+import hashlib
+import io
+import itertools
 import os
 import re
 import pandas as pd
 import requests
-import toml
 from zipfile import ZipFile
 
+from src.backend.checksum import file_checksum
+from src.backend.config import load_config, region_config
 
-def postcode_to_coords(DATA_DIR):
+
+POSTCODE_URL = "http://download.geonames.org/export/zip/GB_full.csv.zip"
+POSTCODE_MEMBER = "GB_full.txt"
+
+# GeoNames columns kept for the lookup, by position in the tab separated file
+POSTCODE_COLUMNS = {
+    1: "postcode",
+    2: "area",
+    3: "country",
+    4: "country_code",
+    5: "region",
+    7: "district",
+    8: "district_code",
+    9: "lat",
+    10: "long",
+}
+
+
+def fetch_archive(source, DATA_DIR, sha256=None):
+    """Local path to the GeoNames archive, downloading it when needed
+
+    `source` may be a URL or a local file path. A URL is streamed to disk in
+    DATA_DIR, and the download is skipped when the archive there already
+    matches `sha256`, or the checksum recorded when it was last downloaded.
+    """
+    if not source.startswith(("http://", "https://")):
+        if sha256 and file_checksum(source) != sha256:
+            raise ValueError(f"{source} does not match checksum {sha256}")
+        return source
+
+    filepath = f"{DATA_DIR}/{source.split('/')[-1]}"
+    checksum_path = f"{filepath}.sha256"
+    expected = sha256
+    if expected is None and os.path.exists(checksum_path):
+        with open(checksum_path, "r") as f:
+            expected = f.read().strip()
+    if expected and os.path.exists(filepath) and file_checksum(filepath) == expected:
+        print(f"{filepath} already exists")
+        return filepath
+
+    digest = hashlib.sha256()
+    with requests.get(source, stream=True) as r:
+        r.raise_for_status()
+        with open(f"{filepath}.part", "wb") as f:
+            for block in r.iter_content(chunk_size=1 << 20):
+                digest.update(block)
+                f.write(block)
+    if sha256 and digest.hexdigest() != sha256:
+        os.remove(f"{filepath}.part")
+        raise ValueError(f"{source} does not match checksum {sha256}")
+
+    os.replace(f"{filepath}.part", filepath)
+    with open(checksum_path, "w") as f:
+        f.write(digest.hexdigest())
+    print(f"Saved {filepath}")
+    return filepath
+
+
+def postcode_to_coords(DATA_DIR, source=POSTCODE_URL, sha256=None,
+                       area="Sheffield", district="Sheffield", chunksize=100000,
+                       filename="shef_pc_coords_lookup.csv"):
 
     """Ingests and processes postcodes and coordinates for
     all postcodes in Sheffield district
+
+    The archive is read straight from its zip member a chunk at a time, and
+    only rows in the given area or district are kept.
     """
 
-    URL = "http://download.geonames.org/export/zip/GB_full.csv.zip"
-    filename = URL.split("/")[-1]
-    filepath = f"{DATA_DIR}/{filename}"
-    r = requests.get(URL)
-
-    if r.ok:
-        with open(filepath, "wb") as f:
-            f.write(r.content)
-
-            with ZipFile(f"{filepath}", "r") as zip:
-                    for info in zip.infolist():
-                        if not os.path.exists(f"{DATA_DIR}/{info.filename}"):
-                            zip.extract(info, f"{DATA_DIR}")
-                            print(f"Saved {info.filename}")
-                        else:
-                            print(f"{info.filename} already exists")
-        r.close()
-        print("Ingest complete")
-
-    gb_postcodes = pd.read_csv(f"{DATA_DIR}/GB_full.txt", sep="\t", header=None)
-    gb_postcodes = gb_postcodes.iloc[:, 1:-1]
-    gb_postcodes.columns = ["postcode",
-                            "area",
-                            "country",
-                            "country_code",
-                            "region",
-                            "blank",
-                            "district",
-                            "district_code",
-                            "lat",
-                            "long"]
-    gb_postcodes.drop(columns="blank", inplace=True)
-
-    # 13407 postcodes in Sheffield District
-    # 1143 postcodes in Sheffield District not classified as Sheffield area
-    shef_postcodes = gb_postcodes[(gb_postcodes["area"]=="Sheffield")|
-                                (gb_postcodes["district"].str.contains("Sheffield"))].reset_index(drop=True)
+    archive = fetch_archive(source, DATA_DIR, sha256)
+
+    chunks = []
+    with ZipFile(archive, "r") as zip, zip.open(POSTCODE_MEMBER) as f:
+        lines = io.TextIOWrapper(f, encoding="utf-8")
+        while batch := list(itertools.islice(lines, chunksize)):
+            # cheap text match first, so only candidate rows are parsed
+            batch = [line for line in batch if area in line or district in line]
+            if not batch:
+                continue
+            chunk = pd.read_csv(
+                io.StringIO("".join(batch)),
+                sep="\t",
+                header=None,
+                usecols=list(POSTCODE_COLUMNS),
+                dtype={col: str for col in POSTCODE_COLUMNS if col not in (9, 10)},
+            ).rename(columns=POSTCODE_COLUMNS)
+            # 13407 postcodes in Sheffield District
+            # 1143 postcodes in Sheffield District not classified as Sheffield area
+            in_area = (chunk["area"] == area) | chunk["district"].str.contains(district, na=False)
+            chunks.append(chunk[in_area])
+    print("Ingest complete")
+    if not chunks:
+        raise ValueError(
+            f"No postcodes in {archive} are in area {area!r} or district {district!r}"
+        )
+
+    shef_postcodes = pd.concat(chunks).reset_index(drop=True)
 
     # Remove spaces
     shef_postcodes['postcode'] = shef_postcodes['postcode'].str.replace(" ", "")
 
-    shef_postcodes.to_csv(f"{DATA_DIR}/shef_pc_coords_lookup.csv")
+    shef_postcodes.to_csv(f"{DATA_DIR}/{filename}")
     print("Lookup file exported")
     return shef_postcodes
 
@@ -92,12 +151,21 @@ def foodbank_coords(DATA_DIR, source_file, pc_data):
 
 
 def main():
-     
-    # Load config
-    with open("pipeline.toml", "r") as f:
-        config = toml.load(f)
+    parser = argparse.ArgumentParser(description="Assigns coordinates to postcodes and foodbanks")
+    parser.add_argument("--region", help="region to build, by default the default region")
+    args = parser.parse_args()
 
-    pc_data = postcode_to_coords(config["DATA_DIR"])
+    # Load config
+    config = region_config(load_config(), args.region)
+
+    pc_data = postcode_to_coords(
+        config["DATA_DIR"],
+        source=config.get("POSTCODE_SOURCE", POSTCODE_URL),
+        sha256=config.get("POSTCODE_SHA256") or None,
+        area=config.get("POSTCODE_AREA", "Sheffield"),
+        district=config.get("POSTCODE_DISTRICT", "Sheffield"),
+        filename=config.get("POSTCODE_FILENAME", "shef_pc_coords_lookup.csv"),
+    )
     foodbank_coords(config["DATA_DIR"], config['RAW_FILENAME'], pc_data)
 
 
@@ -0,0 +1,154 @@
+""" Utility script to generate synthetic datasets at multiples of the Sheffield size
+
+Tiles shifted copies of the Sheffield postcodes and foodbanks side by side,
+renaming postcodes and writing fresh opening hours for each copy, then builds
+the matching OD matrix and postcode index snapshots, e.g.
+
+    python -m src.backend.scripts.make_synthetic --scales 1 10 100
+
+Each scale is written to its own data directory under `BENCHMARK_DIR`, with
+the file names from `pipeline.toml`, ready for `DataStore.use_config`.
+"""
+
+import argparse
+import math
+import os
+import string
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.backend.config import load_config, region_config
+from src.backend.open_times import WEEK
+from src.backend.scripts.build_od import build_od
+
+# opening sessions, as (opening, closing) hours, and the dashes written
+# between them
+SESSIONS = [
+    ("9.00", "12.00"), ("10.00", "12.00"), ("10.30", "12.00"), ("11.00", "13.00"),
+    ("12.00", "14.00"), ("12.30", "14.30"), ("13.00", "15.00"), ("14.00", "16.00"),
+    ("17.00", "19.00"), ("18.00", "19.30"),
+]
+DASHES = [" – ", " - ", "-"]
+
+
+def synthetic_config(config, scale):
+    """ Region configuration of the synthetic dataset at a scale, the only
+    region of its own data store """
+    config = region_config(config)
+    config.update(
+        DATA_DIR=os.path.join(config["BENCHMARK_DIR"], f"{scale}x"),
+        DEFAULT_REGION=f"synthetic_{scale}x",
+        REGION=f"synthetic_{scale}x",
+        OD_MAX_RADIUS=config["BENCHMARK_OD_MAX_RADIUS"],
+    )
+    return config
+
+
+def area_code(tile):
+    """ Postcode area of a tile, "S" for the original then two letters per copy """
+    if tile == 0:
+        return "S"
+    return string.ascii_uppercase[tile // 26 % 26] + string.ascii_uppercase[tile % 26]
+
+
+def tile_offsets(scale, long, lat):
+    """ (long, lat) offsets of each tile, laid out in a near square grid that
+    doesn't overlap the extent of the original coordinates """
+    columns = math.ceil(math.sqrt(scale))
+    width = long.max() - long.min()
+    height = lat.max() - lat.min()
+    return [
+        ((tile % columns) * width, (tile // columns) * height) for tile in range(scale)
+    ]
+
+
+def opening_hours(rng):
+    """ Random opening hours in the style of the foodbank data, e.g.
+    "Tuesday 11.00 – 13.00\\nFriday 11.00 – 13.00" or "Monday to Friday 9.00 - 12.00" """
+    dash = DASHES[rng.integers(len(DASHES))]
+    if rng.random() < 0.15:
+        first = rng.integers(len(WEEK) - 1)
+        last = rng.integers(first + 1, len(WEEK))
+        start, end = SESSIONS[rng.integers(len(SESSIONS))]
+        return f"{WEEK[first]} to {WEEK[last]} {start}{dash}{end}"
+
+    lines = []
+    for day in sorted(rng.choice(len(WEEK), size=rng.integers(1, 4), replace=False)):
+        start, end = SESSIONS[rng.integers(len(SESSIONS))]
+        lines.append(f"{WEEK[day]} {start}{dash}{end}")
+    return "\n".join(lines)
+
+
+def synthetic_postcodes(postcodes, scale):
+    """ Postcode lookup tiled `scale` times, renaming the area of each copy """
+    offsets = tile_offsets(scale, postcodes["long"], postcodes["lat"])
+    inner = postcodes["postcode"].str.replace(r"^S", "", regex=True)
+    tiles = [
+        postcodes.assign(
+            postcode=area_code(tile) + inner,
+            long=postcodes["long"] + dx,
+            lat=postcodes["lat"] + dy,
+        )
+        for tile, (dx, dy) in enumerate(offsets)
+    ]
+    return pd.concat(tiles, ignore_index=True)
+
+
+def synthetic_foodbanks(foodbanks, postcodes, scale, seed=0):
+    """ Foodbanks tiled `scale` times, offset with the postcodes and renamed, with
+    fresh opening hours for every copy after the first """
+    rng = np.random.default_rng(seed)
+    offsets = tile_offsets(scale, postcodes["long"], postcodes["lat"])
+    inner = foodbanks["postcode"].str.replace(r"^S", "", regex=True)
+    tiles = []
+    for tile, (dx, dy) in enumerate(offsets):
+        copy = foodbanks.assign(
+            postcode=area_code(tile) + inner,
+            long=foodbanks["long"] + dx,
+            lat=foodbanks["lat"] + dy,
+        )
+        if tile:
+            copy["name"] = copy["name"] + f" {tile}"
+            copy["opening"] = [opening_hours(rng) for _ in range(len(copy))]
+        tiles.append(copy)
+    out = pd.concat(tiles, ignore_index=True)
+    out["ID"] = np.arange(len(out))
+    return out
+
+
+def make_synthetic(config, scale, seed=0):
+    """ Writes the synthetic dataset for a scale, and builds its OD matrix and
+    postcode index snapshots. Returns the number of OD pairs. """
+    source = region_config(config)
+    synthetic = synthetic_config(config, scale)
+    postcodes = pd.read_csv(os.path.join(source["DATA_DIR"], source["POSTCODE_FILENAME"]), index_col=0)
+    foodbanks = pd.read_csv(os.path.join(source["DATA_DIR"], source["FOODBANK_FILENAME"]))
+
+    data_dir = synthetic["DATA_DIR"]
+    os.makedirs(data_dir, exist_ok=True)
+    synthetic_postcodes(postcodes, scale).to_csv(
+        os.path.join(data_dir, synthetic["POSTCODE_FILENAME"])
+    )
+    synthetic_foodbanks(foodbanks, postcodes, scale, seed).to_csv(
+        os.path.join(data_dir, synthetic["FOODBANK_FILENAME"]), index=False
+    )
+    return build_od(synthetic, write_csv=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scales", type=int, nargs="+", help="multiples of the Sheffield size, by default `BENCHMARK_SCALES`")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated opening hours")
+    args = parser.parse_args()
+
+    config = load_config()
+    for scale in args.scales or config["BENCHMARK_SCALES"]:
+        start = time.perf_counter()
+        n_pairs = make_synthetic(config, scale, args.seed)
+        print(f"Built {scale}x dataset with {n_pairs} OD pairs in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
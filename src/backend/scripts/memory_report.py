@@ -0,0 +1,155 @@
+""" Utility script to report shared and private memory of each web worker
+
+Reads `/proc/<pid>/smaps_rollup` (Linux) for a gunicorn master and its
+workers. Shared memory is pages still shared with other processes, such as
+data loaded by a preloading master, and private memory is pages the process
+has copied or allocated for itself, e.g.
+
+    python -m src.backend.scripts.memory_report --pidfile gunicorn.pid
+
+Without a running server, `--simulate` forks workers from this process the
+way gunicorn would, with or without preloading, runs searches in each and
+reports on them:
+
+    python -m src.backend.scripts.memory_report --simulate 4
+    python -m src.backend.scripts.memory_report --simulate 4 --no-preload
+"""
+
+import argparse
+import gc
+import os
+import signal
+import sys
+
+# fields of smaps_rollup reported, in kB
+SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared",
+    "Shared_Dirty": "shared",
+    "Private_Clean": "private",
+    "Private_Dirty": "private",
+}
+
+
+def process_memory(pid):
+    """ Resident, proportional, shared and private memory of a process in MB """
+    memory = {"rss": 0.0, "pss": 0.0, "shared": 0.0, "private": 0.0}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            field, _, value = line.partition(":")
+            if field in SMAPS_FIELDS:
+                memory[SMAPS_FIELDS[field]] += int(value.split()[0]) / 1024
+    return memory
+
+
+def child_pids(pid):
+    """ Process IDs of the children of a process """
+    with open(f"/proc/{pid}/task/{pid}/children", "r") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def format_report(master, workers):
+    """ Memory table of a master and its workers, with totals. The total PSS is
+    the memory the processes use between them. """
+    lines = [f"{'process':<16}{'rss MB':>10}{'pss MB':>10}{'shared MB':>11}{'private MB':>12}"]
+    rows = [(f"master {master}", process_memory(master))]
+    rows += [(f"worker {pid}", process_memory(pid)) for pid in workers]
+    for name, memory in rows:
+        lines.append(
+            f"{name:<16}{memory['rss']:>10.1f}{memory['pss']:>10.1f}"
+            f"{memory['shared']:>11.1f}{memory['private']:>12.1f}"
+        )
+    total_pss = sum(memory["pss"] for _, memory in rows)
+    worker_private = [memory["private"] for _, memory in rows[1:]]
+    lines.append(f"{'total':<16}{'':>10}{total_pss:>10.1f}")
+    if worker_private:
+        lines.append(f"mean private memory per worker {sum(worker_private) / len(worker_private):.1f} MB")
+    return "\n".join(lines)
+
+
+def run_searches(n_requests):
+    """ Searches from postcodes across the region, as a worker would serve them """
+    import app
+
+    client = app.app.test_client()
+    postcodes = app.STORE.postcode_index.postcodes
+    step = max(len(postcodes) // max(n_requests, 1), 1)
+    for postcode in postcodes[::step][:n_requests]:
+        for query_type in ["nearest", "asap"]:
+            client.post(
+                "/",
+                data={
+                    "query_type": query_type,
+                    "query_location": "postcode",
+                    "pcode": str(postcode),
+                    "range_val": "5",
+                    "Monday": "on",
+                },
+            )
+
+
+def simulate(n_workers, n_requests=100, preload=True):
+    """ Forks workers like gunicorn, preloading and freezing the data in this
+    process first when `preload` is set, runs searches in each worker and
+    returns their process IDs once they are all idle """
+    if preload:
+        gc.disable()
+        import app
+        from src.api import foodbank_geojson
+
+        app.STORE.warm()
+        foodbank_geojson()
+        gc.collect()
+        gc.freeze()
+
+    workers = []
+    for _ in range(n_workers):
+        ready, done = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready)
+            gc.enable()
+            run_searches(n_requests)
+            os.write(done, b"1")
+            signal.pause()
+            os._exit(0)
+        os.close(done)
+        workers.append((pid, ready))
+
+    for _, ready in workers:
+        os.read(ready, 1)
+        os.close(ready)
+    return [pid for pid, _ in workers]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pid", type=int, help="gunicorn master process ID")
+    parser.add_argument("--pidfile", help="file holding the gunicorn master process ID")
+    parser.add_argument("--simulate", type=int, metavar="WORKERS", help="fork this many workers instead")
+    parser.add_argument("--requests", type=int, default=100, help="searches per simulated worker")
+    parser.add_argument("--no-preload", action="store_true", help="load the data in each simulated worker")
+    args = parser.parse_args()
+
+    if args.simulate:
+        workers = simulate(args.simulate, args.requests, preload=not args.no_preload)
+        try:
+            print(format_report(os.getpid(), workers))
+        finally:
+            for pid in workers:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+        return
+
+    pid = args.pid
+    if pid is None and args.pidfile:
+        with open(args.pidfile, "r") as f:
+            pid = int(f.read().strip())
+    if pid is None:
+        sys.exit("Expecting --pid, --pidfile or --simulate")
+    print(format_report(pid, child_pids(pid)))
+
+
+if __name__ == "__main__":
+    main()
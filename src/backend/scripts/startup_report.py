@@ -0,0 +1,34 @@
+""" Utility script to report where app start up time goes
+
+Imports the app as a web worker would, then builds the lazily built indexes,
+and prints the time spent importing modules, loading datasets and building
+indexes, e.g.
+
+    python -m src.backend.scripts.startup_report
+"""
+
+import time
+
+
+def main():
+    start = time.perf_counter()
+    from src.backend.data_store import STORE
+
+    import app  # noqa: F401
+
+    booted = time.perf_counter() - start
+
+    # module imports are what the app import spent outside timed steps
+    timed = sum(
+        seconds for (phase, _), seconds in STORE.timings.items() if phase != "import"
+    )
+    STORE.timings[("import", "app modules")] = booted - timed
+    STORE.warm()
+    total = time.perf_counter() - start
+    print(STORE.report())
+    print(f"{'':<8}{'app import':<24}{booted * 1000:>8.1f}")
+    print(f"{'':<8}{'app import and warm up':<24}{total * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,14 @@
-import geopandas as gpd
+from typing import TYPE_CHECKING
+
+import numpy as np
 import pandas as pd
-from shapely.geometry import Point
+from src.backend.data_store import STORE
+from src.backend.metrics import METRICS
+from src.backend.projection import to_bng
+from src.coordinates import LongLat
+
+if TYPE_CHECKING:
+    import geopandas as gpd
 
 
 def convert_to_geodataframe(
@@ -8,7 +16,7 @@ def convert_to_geodataframe(
     lat: str = 'lat',
     long: str = 'long',
     crs: str = 'EPSG:4326',
-) -> gpd.GeoDataFrame:
+) -> "gpd.GeoDataFrame":
     """Convert pandas dataframe to a geopandas dataframe
 
     Parameters
@@ -27,6 +35,8 @@ def convert_to_geodataframe(
     gpd.GeoDataFrame
         output geopandas dataframe
     """
+    import geopandas as gpd
+
     return gpd.GeoDataFrame(
         df,
         geometry=gpd.points_from_xy(x=df[long], y=df[lat]),
@@ -34,20 +44,42 @@ def convert_to_geodataframe(
     )
 
 
-# read in post code lookup, create a geodataframe and convert CRS
-PC_LOOKUP = pd.read_csv("data/shef_pc_coords_lookup.csv", usecols=["postcode", "lat", "long"])
-PC_LOOKUP = convert_to_geodataframe(PC_LOOKUP).to_crs("EPSG:27700")
+def points_to_array(points) -> np.ndarray:
+    """Convert points into an (n, 2) array of (long, lat) coordinates
+
+    Parameters
+    ----------
+    points : iterable
+        shapely Points or `LongLat`s, or (long, lat) coordinate pairs, in CRS
+        EPSG 4326
+
+    Returns
+    -------
+    np.ndarray
+        float array of shape (n, 2), with columns long and lat
+    """
+    if isinstance(points, np.ndarray):
+        if points.dtype == object:
+            import shapely
+
+            return shapely.get_coordinates(points)
+    else:
+        points = [
+            (point.x, point.y) if hasattr(point, "x") else point
+            for point in points
+        ]
+    return np.asarray(points, dtype=float).reshape(-1, 2)
 
 
 def snap_to_nearest_postcode(
-    point: type[Point] = Point(-1.470599, 53.379244)
+    point: LongLat = LongLat(-1.470599, 53.379244)
 ) -> dict:
     """utility function to snap a point to the nearest postcode
 
     Parameters
     ----------
-    point : type[Point]
-        point to snap
+    point : LongLat
+        point to snap, a `LongLat` or shapely Point in CRS EPSG 4326
 
     Returns
     -------
@@ -55,8 +87,8 @@ def snap_to_nearest_postcode(
         closest postcode dictionary containing the keys 'postcode' (closest
         postcode, as a string), 'lat' (latitude of closest postcode), 'long'
         (longitude of closest postcode), 'geometry' (point object for closest
-        postcode in CRS EPSG 27700) and 'distance' (distance between the
-        provided oint and the closest postcode)
+        postcode in CRS EPSG 27700) and 'dist' (distance between the
+        provided point and the closest postcode in meters)
 
     Notes
     -----
@@ -65,15 +97,51 @@ def snap_to_nearest_postcode(
     this site offers an API. Could wrap this in as a furture TODO.
     """
 
-    # convert point to geoseries
-    point = gpd.GeoSeries(
-        [point]*len(PC_LOOKUP), crs="EPSG:4326"
-    ).to_crs("EPSG:27700")
+    from shapely.geometry import Point
 
-    # calculate distance to all postcodes
-    pc_lookup = PC_LOOKUP.copy()
-    pc_lookup['dist'] = pc_lookup.distance(point)
+    # project point and query the spatial index for the closest postcode
+    with METRICS.timed("snap"):
+        tree = STORE.default_shard.postcode_tree
+        x, y = to_bng().transform(point.x, point.y)
+        dist, ind = tree.query([x, y])
 
-    # get closest as row within minimum distance and convert to a dict
-    closest = pc_lookup.loc[pc_lookup['dist'].argmin(), :].to_dict()
-    return closest
\ No newline at end of file
+    index = STORE.postcode_index
+    return {
+        "postcode": str(index.postcodes[ind]),
+        "lat": float(index.lat[ind]),
+        "long": float(index.long[ind]),
+        "geometry": Point(tree.data[ind]),
+        "dist": float(dist),
+    }
+
+
+def snap_many(points) -> pd.DataFrame:
+    """snap many points to their nearest postcodes in one vectorised call
+
+    Parameters
+    ----------
+    points : iterable
+        shapely Points or `LongLat`s, or (long, lat) coordinate pairs, in CRS
+        EPSG 4326
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per input point, in input order, with columns 'postcode'
+        (closest postcode), 'lat' and 'long' (coordinates of the closest
+        postcode) and 'dist' (distance between the point and the closest
+        postcode in meters)
+    """
+    coords = points_to_array(points)
+    x, y = to_bng().transform(coords[:, 0], coords[:, 1])
+    dist, ind = STORE.default_shard.postcode_tree.query(np.column_stack([x, y]))
+
+    index = STORE.postcode_index
+    return pd.DataFrame(
+        {
+            "postcode": index.postcodes[ind],
+            "lat": index.lat[ind],
+            "long": index.long[ind],
+            "dist": dist,
+        }
+    )
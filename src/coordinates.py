@@ -1,28 +1,151 @@
 # Utilities for getting coordinates out of information from the user forms
+import os
 import re
+from typing import NamedTuple
 
-import pandas as pd
+import numpy as np
 
+from src.backend.data_store import STORE
 
-PC_DATA = pd.read_csv("data/shef_pc_coords_lookup.csv")
-PC_LIST = PC_DATA['postcode'].to_list()
 
+class LongLat(NamedTuple):
+    """ Lightweight starting location, with the x (long) and y (lat) attributes of a shapely Point. """
+    x: float
+    y: float
 
-def get_coords_from_postcode(postcode):
-    """ Helper, getting coordinate pair from postcode. """
-    if postcode in PC_LIST:
-        ind = PC_LIST.index(postcode)
-        return [PC_DATA.lat[ind], PC_DATA.long[ind]]
-    # If postcode not viable, return None
-    else:
-        return None
+
+def canonical_postcode(postcode: str) -> str:
+    """ Helper, normalising a postcode to upper case with one space before the inward code. """
+    postcode = "".join(str(postcode).split()).upper()
+    if len(postcode) > 3:
+        return postcode[:-3] + " " + postcode[-3:]
+    return postcode
+
+
+class PostcodeIndex:
+    """ Sorted index from canonical postcode to postcode centroid coordinates.
+
+    Lookups are insensitive to case and spacing, e.g. "s11aa", "S11AA" and
+    "S1 1AA" all find the same postcode. The index is held in NumPy arrays
+    rather than Python objects, so forked web workers keep sharing its pages,
+    and lookups are O(log n) binary searches rather than hash lookups.
+    """
+
+    def __init__(self, postcodes, lat, long, canonical=False):
+        if canonical:
+            self.postcodes = np.asarray(postcodes, dtype=str)
+        else:
+            self.postcodes = np.array([canonical_postcode(pc) for pc in postcodes], dtype=str)
+        self.lat = np.asarray(lat, dtype=float)
+        self.long = np.asarray(long, dtype=float)
+
+        # positions in sorted postcode order, for binary searches
+        self.order = np.argsort(self.postcodes, kind="stable")
+        self.sorted_postcodes = self.postcodes[self.order]
+
+        # sorted, space free postcodes for prefix searches
+        unique = np.unique(self.postcodes)
+        keys = np.char.replace(unique, " ", "")
+        search_order = np.argsort(keys, kind="stable")
+        self.search_keys = keys[search_order]
+        self.search_postcodes = unique[search_order]
+
+    @classmethod
+    def from_csv(cls, path):
+        """ Helper, building the index from a postcode lookup csv. """
+        import pandas as pd
+
+        df = pd.read_csv(path, usecols=["postcode", "lat", "long"])
+        return cls(df["postcode"], df["lat"], df["long"])
+
+    @classmethod
+    def from_snapshot(cls, snapshot_dir):
+        """ Helper, building the index from a snapshot written by `save`. """
+        arrays = [np.load(os.path.join(snapshot_dir, f"{name}.npy")) for name in ["postcodes", "lat", "long"]]
+        return cls(*arrays, canonical=True)
+
+    def save(self, snapshot_dir):
+        """ Writes the canonical postcodes and coordinates as .npy arrays. """
+        os.makedirs(snapshot_dir, exist_ok=True)
+        for name in ["postcodes", "lat", "long"]:
+            path = os.path.join(snapshot_dir, f"{name}.npy")
+            np.save(path + ".tmp.npy", getattr(self, name))
+            os.replace(path + ".tmp.npy", path)
+
+    def __len__(self):
+        return len(self.postcodes)
+
+    def __contains__(self, postcode):
+        return self.position(postcode) is not None
+
+    def position(self, postcode):
+        """ Position of a postcode in the index arrays, None if not present. """
+        postcode = canonical_postcode(postcode)
+        # the last of any duplicate postcodes, in index order
+        found = int(np.searchsorted(self.sorted_postcodes, postcode, side="right")) - 1
+        if found < 0 or self.sorted_postcodes[found] != postcode:
+            return None
+        return int(self.order[found])
+
+    def positions_many(self, postcodes):
+        """ Positions of many postcodes in the index arrays, -1 where not present. """
+        canonical = np.array([canonical_postcode(pc) for pc in postcodes], dtype=str)
+        if not len(canonical) or not len(self.sorted_postcodes):
+            return np.full(len(canonical), -1, dtype=np.int64)
+        # the last of any duplicate postcodes, in index order
+        found = np.searchsorted(self.sorted_postcodes, canonical, side="right") - 1
+        present = (found >= 0) & (self.sorted_postcodes[found.clip(0)] == canonical)
+        return np.where(present, self.order[found.clip(0)], -1).astype(np.int64)
+
+    def lookup(self, postcode):
+        """ Coordinate pair [lat, long] for a postcode, None if not present. """
+        ind = self.position(postcode)
+        if ind is None:
+            return None
+        return [float(self.lat[ind]), float(self.long[ind])]
+
+    def lookup_many(self, postcodes):
+        """ Coordinates of many postcodes, as an (n, 2) array of lat, long.
+
+        Rows for postcodes not present in the index are NaN.
+        """
+        ind = self.positions_many(postcodes)
+        coords = np.column_stack([self.lat[ind], self.long[ind]])
+        coords[ind < 0] = np.nan
+        return coords
+
+    def prefix_search(self, prefix, limit=10):
+        """ Up to `limit` canonical postcodes starting with a prefix, in sorted order.
+
+        The prefix is matched ignoring case and spacing, an empty prefix matches nothing.
+        """
+        prefix = "".join(str(prefix).split()).upper()
+        limit = max(0, limit)
+        if not prefix or not limit:
+            return []
+        start = np.searchsorted(self.search_keys, prefix)
+        candidates = self.search_keys[start:start + limit]
+        return self.search_postcodes[start:start + limit][np.char.startswith(candidates, prefix)].tolist()
+
+
+def __getattr__(name):
+    # The shared postcode index, loaded on first use
+    if name == "PC_INDEX":
+        return STORE.postcode_index
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_coords_from_postcode(postcode, shards=None):
+    """ Helper, getting coordinate pair from postcode, in whichever region holds it. """
+    # If postcode not viable, returns None
+    return (shards or STORE.shards).lookup(postcode)
 
 
 def get_coords_from_coords(coord_string):
     """ Helper, getting coordinates out of a coordinate string. """
     coords = re.search(
                 r"LatLng\(([0-9\.-]+), ([0-9§.-]+)\)", coord_string  # noqa:W605
-            )    
+            )
     if coords:
         gr = coords.groups()
         return [float(gr[0]), float(gr[1])]
@@ -1,4 +1,6 @@
 # Utilities for helping to display data
+from datetime import datetime
+
 import numpy as np
 
 
@@ -11,68 +13,142 @@ def clean_whitespace(x: str) -> str:
     return x.replace("\n", "<br>").replace("\r", "").strip()
 
 
-def html_table(df):
-    """ Formats the information nicely for display purposes. """
-    # Ranks, indexed from 1 for readability
-    df_out = df.assign(rank=range(len(df)))
-    df_out["rank"] = df_out["rank"] + 1
+def describe_time_to_open(time_to_open) -> str:
+    """ Describes the time until a foodbank next opens, e.g. "Opens in 1 day 2 hours". """
+    minutes = int(time_to_open.total_seconds() // 60)
+    if minutes <= 0:
+        return "Open now"
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    parts = [
+        f"{value} {unit}{'' if value == 1 else 's'}"
+        for value, unit in [(days, "day"), (hours, "hour"), (minutes, "minute")]
+        if value
+    ]
+    return "Opens in " + " ".join(parts[:2])
+
+
+# Results table, as rendered by `DataFrame.to_html`
+TABLE_CLASSES = "table table-striped table-bordered table-sm table-hover"
+TABLE_COLUMNS = ["Name", "Opening", "Contact", "Information", "Referencing"]
+TABLE_HEAD = (
+    f'<table border="1" class="dataframe {TABLE_CLASSES}">\n  <thead>\n    <tr style="text-align: right;">\n'
+    + "".join(f"      <th>{col}</th>\n" for col in TABLE_COLUMNS)
+    + "    </tr>\n  </thead>\n  <tbody>\n"
+)
+TABLE_TAIL = "  </tbody>\n</table>"
+CONTROL_ESCAPES = str.maketrans({"\t": r"\t", "\n": r"\n", "\r": r"\r"})
+
+
+def foodbank_cells(df):
+    """ Renders the table cells of each foodbank that don't depend on the search.
 
+    The name cell is rendered without its leading "<b>" and rank, which are added per search.
+    """
     # Handles missing contact details
-    df_out = df_out.fillna("")
-    
+    df_out = df.fillna("")
+
     # Replace newline characters with html break
     for col in ['opening', 'email', 'phone', 'address']:
         df_out[col] = df_out[col].apply(clean_whitespace)
 
-    # Tidy name, id number, address and postcode into one column
-    df_out['name'] = "<b>" + df_out['rank'].astype(str) + " - " + df_out['name'] + "</b><br>" +\
+    # Tidy name, address and postcode into one column
+    df_out['name'] = " - " + df_out['name'] + "</b><br>" +\
         df_out['address'].str.replace("\n", "<br>").str.replace("\r", "") + "<br>" + df_out['postcode']
 
     # Reformat the contact links into one field, for compact display
     df_out['email'] = "Email: " + '<a href="mailto:' + df_out['email'] + '">' + df_out['email'] + '</a>'
     df_out['website'] = "Website: " + '<a href="' + "https://" +  df_out['website'] + '">' + df_out['website'] + "</a>"
     df_out['phone'] = "Phone: " + '<a href="tel:' + df_out['phone'].str.replace('0', '') + '">' + df_out['phone'] + "</a>"
-    df_out['contact'] = df_out.apply(lambda row: "<br>".join([row['website'], row['email'], row['phone']]), axis=1)
-
-    # Mark metadata clearly
-    df_out['referral_required'] = np.where(df['referral_required'], "Yes", "")
-    df_out['delivery_option'] = np.where(df['delivery_option'], "Yes", "")
+    df_out['contact'] = df_out['website'] + "<br>" + df_out['email'] + "<br>" + df_out['phone']
 
     # Mark out referral link
     df_out['referral_link'] = '<a href="' + "https://" +  df_out['referral_link'] + '">' + df_out['referral_link'] + "</a>"
 
     df_out['information'] = "<b>" + df_out['category'] + "</b>"
 
-    df_out['information'] = np.where(df_out['referral_required'],
+    df_out['information'] = np.where(df['referral_required'],
                                      df_out['information'] + "<br><hr>Referral needed",
                                      df_out['information'])
     
-    df_out['information'] = np.where(df_out['delivery_option'],
+    df_out['information'] = np.where(df['delivery_option'],
                                      df_out['information'] + "<br><hr>Makes deliveries",
                                      df_out['information'])
 
     df_out['information'] = np.where(df_out['support'].str.strip() != "",
                                      df_out['information'] + "<br><hr>" + df_out['support'].str.replace("\n", "<br>").str.replace("\r", ""),
                                      df_out['information'])
-    
-    
-    # Format table column heads for readability
-    df_out = df_out.rename(
-        columns={"referral_required": "referral", "delivery_option": "delivery", "rank": "number", "referral_link": "referencing"}
-    )[
-        [
-            "name",
-            "opening",
-            "contact",
-            "information",
-            "referencing"
-        ]
-    ]
-    df_out.columns = [col.capitalize() for col in df_out.columns]
-
-    return df_out.to_html(
-        classes="table table-striped table-bordered table-sm table-hover",
-        index=False,
-        escape=False,
-        render_links=True
-    )
+
+    # Match `DataFrame.to_html`, printing control characters escaped, stripping cells and
+    # keeping runs of spaces
+    cells = df_out[["name", "opening", "contact", "information", "referral_link"]].copy()
+    for col in cells.columns:
+        cells[col] = cells[col].str.translate(CONTROL_ESCAPES)
+        cells[col] = cells[col].str.rstrip() if col == "name" else cells[col].str.strip()
+        cells[col] = cells[col].str.replace("  ", "&nbsp;&nbsp;")
+    return cells
+
+
+class RowFragments:
+    """ Rendered table cells of each foodbank, keyed by region and ID.
+
+    Cells are rendered once per foodbank, the first time it is seen, so rendering a search
+    result only adds the ranks and time until opening and joins strings.
+    """
+
+    def __init__(self):
+        self.cells = {}
+
+    def add(self, df, region=None):
+        """ Renders and stores the cells of any foodbanks not seen before. """
+        regions = df['region'] if 'region' in df.columns else [region] * len(df)
+        keys = list(zip(regions, df['ID'].tolist()))
+        missing = [ind for ind, key in enumerate(keys) if key not in self.cells]
+        if missing:
+            cells = foodbank_cells(df.iloc[missing])
+            for ind, row in zip(missing, cells.itertuples(index=False, name=None)):
+                self.cells[keys[ind]] = row
+        return keys
+
+    def html_table(self, df):
+        """ Formats search results as an html table. """
+        keys = self.add(df)
+        if 'time_to_open' in df.columns:
+            leads = ["<b>" + describe_time_to_open(td) + "</b><br>" for td in df['time_to_open']]
+        else:
+            leads = [""] * len(keys)
+
+        rows = []
+        for rank, (key, lead) in enumerate(zip(keys, leads), start=1):
+            name, opening, contact, information, referencing = self.cells[key]
+            rows.append(
+                f"    <tr>\n      <td><b>{rank}{name}</td>\n      <td>{lead}{opening}</td>\n"
+                f"      <td>{contact}</td>\n      <td>{information}</td>\n      <td>{referencing}</td>\n    </tr>\n"
+            )
+        return TABLE_HEAD + "".join(rows) + TABLE_TAIL
+
+
+# Rendered cells shared across searches
+ROW_FRAGMENTS = RowFragments()
+
+
+def html_table(df):
+    """ Formats the information nicely for display purposes. """
+    return ROW_FRAGMENTS.html_table(df)
+
+
+def search_markers(df, now=None):
+    """ Map markers for search results, as lists of foodbank IDs, regions, ranks and colours.
+
+    Foodbanks open today or tomorrow are marked blue, others cyan. Locations are looked up
+    from the foodbank GeoJSON by the browser.
+    """
+    weekday = (now or datetime.now()).weekday()
+    soon = (1 << weekday) | (1 << (weekday + 1) % 7)
+    open_soon = (df['day_mask'].to_numpy(dtype=np.int64) & soon) != 0
+    return {
+        "ID": df['ID'].to_numpy().tolist(),
+        "region": df['region'].tolist() if 'region' in df.columns else [None] * len(df),
+        "rank": list(range(1, len(df) + 1)),
+        "color": np.where(open_soon, "blue", "cyan").tolist(),
+    }
@@ -0,0 +1,70 @@
+"""Test the JSON API endpoints"""
+
+import pytest
+from app import app
+from src.backend.frontend_handler import FOODBANKS
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def test_foodbanks_geojson(client):
+    """Test foodbank locations are served as GeoJSON, revalidated by ETag"""
+
+    response = client.get("/api/foodbanks.geojson")
+    assert response.status_code == 200
+    features = response.get_json(force=True)["features"]
+    assert [feature["id"] for feature in features] == FOODBANKS["ID"].to_list()
+    assert features[0]["geometry"]["coordinates"] == [
+        FOODBANKS["long"].iloc[0],
+        FOODBANKS["lat"].iloc[0],
+    ]
+
+    revalidated = client.get(
+        "/api/foodbanks.geojson", headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert revalidated.status_code == 304
+    assert client.get("/api/foodbanks.geojson?region=nowhere").status_code == 404
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"postcode": "S1 1AA", "days": [1, 2]},
+        {"postcode": "S1 1AA", "days": 5},
+        {"postcode": "S1 1AA", "days": ["Someday"]},
+        {"postcode": "S1 1AA", "days": {"Monday": "no"}},
+        {"postcode": "S1 1AA", "dist_range": "far"},
+        {"postcode": "S1 1AA", "time_stamp": 5},
+    ],
+)
+def test_search_invalid_params(client, params):
+    """Test invalid search parameters are rejected as bad requests"""
+
+    response = client.post("/api/search", json=params)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_search_days_object(client):
+    """Test days given as an object only select the days set to true"""
+
+    def found(days):
+        response = client.post("/api/search", json={"postcode": "S1 1AA", "dist_range": 50000, "days": days})
+        assert response.status_code == 200
+        return [result["ID"] for result in response.get_json()["results"]]
+
+    tuesday = found(["Tuesday"])
+    assert tuesday
+    assert found({"Monday": False, "Tuesday": True}) == tuesday
+    assert found({"Monday": False}) == []
+
+
+@pytest.mark.parametrize("limit, expected", [("3", 3), ("-3", 0), ("1000", 10)])
+def test_postcodes_limit(client, limit, expected):
+    """Test postcode autocomplete stays bounded whatever limit is asked for"""
+
+    response = client.get(f"/api/postcodes?prefix=S10&limit={limit}")
+    assert len(response.get_json()) == expected
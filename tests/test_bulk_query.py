@@ -0,0 +1,72 @@
+"""Test the bulk query command line script"""
+
+import importlib.util
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.backend.frontend_handler import FOODBANKS, foodfind_batch
+from src.backend.scripts.bulk_query import main, parse_args
+
+
+@pytest.mark.skipif(importlib.util.find_spec("pyarrow") is not None, reason="pyarrow is installed")
+def test_parquet_output_requires_pyarrow():
+    """Test parquet output without pyarrow fails before any query runs"""
+
+    with pytest.raises(SystemExit):
+        parse_args(["caseload.csv", "nearest.parquet"])
+    assert parse_args(["caseload.csv", "nearest.csv"]).output == "nearest.csv"
+
+
+def test_days_validated():
+    """Test misspelt days fail before any query runs"""
+
+    assert parse_args(["caseload.csv", "nearest.csv", "--days", "monday, Friday"]).days == ["Monday", "Friday"]
+    with pytest.raises(SystemExit):
+        parse_args(["caseload.csv", "nearest.csv", "--days", "Monday,Fryday"])
+
+
+@pytest.mark.parametrize("query_type", ["nearest", "asap"])
+def test_bulk_query(tmp_path, query_type):
+    """Test every row is searched across chunks, postcode or coordinates, with
+    results keyed by input row"""
+
+    # postcodes, coordinates, a blank row and an unknown postcode, in chunks
+    # of two rows
+    pd.DataFrame(
+        {
+            "postcode": ["S1 1AA", None, None, "not a postcode", "S9 1EA"],
+            "lat": [np.nan, 53.379244, np.nan, np.nan, np.nan],
+            "long": [np.nan, -1.470599, np.nan, np.nan, np.nan],
+        }
+    ).to_csv(tmp_path / "caseload.csv", index=False)
+    args = [
+        str(tmp_path / "caseload.csv"),
+        str(tmp_path / "found.csv"),
+        "--query-type", query_type,
+        "--days", "Tuesday,Thursday",
+        "--time-stamp", "2023-05-11T12:10",
+        "--chunksize", "2",
+        "--workers", "1",
+    ]
+    main(args)
+
+    found = pd.read_csv(tmp_path / "found.csv")
+    expected = foodfind_batch(
+        ["S1 1AA", (-1.470599, 53.379244), (np.nan, np.nan), "not a postcode", "S9 1EA"],
+        query_type,
+        num_results=3,
+        days={"Tuesday": True, "Thursday": True},
+        time_stamp=datetime(2023, 5, 11, 12, 10),
+    )
+    assert sorted(set(found["row"])) == [0, 1, 4]
+    assert found["row"].to_list() == expected["origin"].to_list()
+    assert found["ID"].to_list() == expected["ID"].to_list()
+    assert found["rank"].to_list() == expected["rank"].to_list()
+    names = FOODBANKS.set_index("ID")["name"]
+    assert found["foodbank_name"].to_list() == names[found["ID"]].to_list()
+    if query_type == "asap":
+        np.testing.assert_array_equal(
+            found["time_to_open"], expected["time_to_open"].dt.total_seconds() // 60
+        )
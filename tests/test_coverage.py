@@ -0,0 +1,77 @@
+"""Test the foodbank coverage report"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.backend.coverage import coverage, coverage_gaps
+from src.backend.frontend_handler import STORE, foodfind_nearest
+from src.backend.od_matrix import ODMatrix
+from src.coordinates import PostcodeIndex
+
+od_matrix = ODMatrix.from_frame(
+    pd.DataFrame(
+        {
+            "ID": [0, 1, 2, 0, 1],
+            "postcode": ["S11AA", "S11AA", "S11AA", "S102GB", "S102GB"],
+            "distance": [400.0, 1500.0, 900.0, 3000.0, 2500.0],
+        }
+    )
+)
+# foodbank 0 opens Mondays, 1 Monday and Tuesday, 2 Saturday, and 3 has no
+# pairs in the matrix
+day_masks = np.array([0b1, 0b11, 0b100000, 0b1111111])
+postcode_index = PostcodeIndex(["S1 1AA", "S10 2GB"], [53.38, 53.37], [-1.47, -1.50])
+
+# 1. two open within the radius, nearest first
+# 2. one open, further than the nearest pair overall
+# 3. none open within the radius
+# 4. none open at all
+test_conf = [
+    {"postcode": "S11AA", "day": "Monday", "radius": 2000, "reachable": 2, "nearest": 400.0},
+    {"postcode": "S11AA", "day": "Tuesday", "radius": 2000, "reachable": 1, "nearest": 1500.0},
+    {"postcode": "S102GB", "day": "Monday", "radius": 2000, "reachable": 0, "nearest": 2500.0},
+    {"postcode": "S102GB", "day": "Sunday", "radius": 5000, "reachable": 0, "nearest": np.nan},
+]
+
+
+@pytest.mark.parametrize("config", test_conf)
+def test_coverage(config):
+    """Test counts and nearest distances of foodbanks open on each day"""
+
+    table = coverage(od_matrix, day_masks, [5000, 2000])
+    assert len(table) == 2 * 7 * 2
+    row = table[
+        (table["postcode"] == config["postcode"])
+        & (table["day"] == config["day"])
+        & (table["radius"] == config["radius"])
+    ].iloc[0]
+    assert row["reachable"] == config["reachable"]
+    np.testing.assert_equal(row["nearest"], config["nearest"])
+
+
+def test_coverage_gaps():
+    """Test the gaps layer has each postcode once, with the days it is uncovered"""
+
+    gaps = coverage_gaps(coverage(od_matrix, day_masks, [2000]), postcode_index, 2000)
+    features = {feature["properties"]["postcode"]: feature for feature in gaps["features"]}
+    assert list(features) == ["S102GB", "S11AA"]
+    assert features["S11AA"]["properties"]["days"] == ["Wednesday", "Thursday", "Friday", "Sunday"]
+    assert features["S102GB"]["properties"]["nearest"][:2] == [2500.0, 2500.0]
+    assert features["S102GB"]["properties"]["nearest"][2] is None
+    assert features["S102GB"]["geometry"]["coordinates"] == [-1.50, 53.37]
+
+
+@pytest.mark.parametrize("day", ["Monday", "Saturday"])
+def test_coverage_matches_search(day):
+    """Test coverage of the Sheffield data matches searching from each postcode"""
+
+    shard = STORE.default_shard
+    table = coverage(shard.od_matrix, shard.day_masks, [2000])
+    table = table[table["day"] == day].set_index("postcode")
+    for postcode in shard.od_matrix.postcodes[::500]:
+        found = foodfind_nearest(
+            "postcode", postcode=postcode, dist_range=2000, days={day: True}, num_results=100
+        )
+        assert table.loc[postcode, "reachable"] == len(found)
+        if len(found):
+            assert table.loc[postcode, "nearest"] == pytest.approx(found["distance"].iloc[0])
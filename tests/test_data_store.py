@@ -0,0 +1,48 @@
+"""Test the shared data store"""
+
+import subprocess
+import sys
+
+from src.backend.data_store import DataStore
+
+
+def test_app_import_is_lean():
+    """Test importing the app leaves the heavy geospatial libraries unimported"""
+
+    code = (
+        "import sys, app; "
+        "print(sorted(m for m in ['geopandas', 'shapely', 'scipy', 'pyproj'] if m in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "[]"
+
+
+def test_search_is_lean():
+    """Test searching through the app leaves geopandas and shapely unimported"""
+
+    code = (
+        "import sys, app; "
+        "form = {'query_type': 'nearest', 'query_location': 'postcode', "
+        "'pcode': 'S1 1AD', 'range_val': '5', 'Monday': 'on'}; "
+        "assert app.app.test_client().post('/', data=form).status_code == 200; "
+        "print(sorted(m for m in ['geopandas', 'shapely'] if m in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip().splitlines()[-1] == "[]"
+
+
+def test_data_store_loads_once(tmp_path):
+    """Test datasets load once, falling back to csv without a snapshot, and are timed"""
+
+    store = DataStore(postcode_snapshot_path=str(tmp_path / "missing"))
+    assert store.postcode_index is store.postcode_index
+    assert store.default_shard.postcode_index is store.postcode_index
+    assert store.shards.get() is store.default_shard
+
+    phases = {phase for phase, _ in store.timings}
+    assert {"load", "index"} <= phases
+    assert "postcode_index" in store.report()
@@ -0,0 +1,47 @@
+"""Test rendering search results as an html table"""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+from src.backend.frontend_handler import FOODBANKS
+from src.display import TABLE_HEAD, TABLE_TAIL, RowFragments, search_markers
+
+
+def test_html_table():
+    """Test rows are ranked in result order, with cells rendered once per foodbank"""
+
+    fragments = RowFragments()
+    results = FOODBANKS.iloc[[2, 0]].assign(region="sheffield")
+    html = fragments.html_table(results)
+
+    assert html.startswith(TABLE_HEAD) and html.endswith(TABLE_TAIL)
+    assert html.count("<tr>") == 2
+    assert html.index(f"<b>1 - {results['name'].iloc[0]}") < html.index(
+        f"<b>2 - {results['name'].iloc[1]}"
+    )
+
+    fragments.html_table(FOODBANKS.iloc[[0, 1]].assign(region="sheffield"))
+    assert len(fragments.cells) == 3
+
+
+def test_html_table_time_to_open():
+    """Test leading with the time until opening, and rendering no results"""
+
+    fragments = RowFragments()
+    results = FOODBANKS.iloc[[0]].assign(
+        time_to_open=pd.to_timedelta([timedelta(hours=2)])
+    )
+    assert "<td><b>Opens in 2 hours</b><br>" in fragments.html_table(results)
+    assert fragments.html_table(results.iloc[:0]) == TABLE_HEAD + TABLE_TAIL
+
+
+def test_search_markers():
+    """Test markers are ranked and coloured by whether foodbanks open today or tomorrow"""
+
+    # a Sunday, so foodbanks open on Sunday or Monday are marked blue
+    results = FOODBANKS.iloc[[0, 1]].assign(day_mask=[0b1000000, 0b0000100])
+    markers = search_markers(results, now=datetime(2023, 5, 14))
+
+    assert markers["ID"] == results["ID"].to_list()
+    assert markers["rank"] == [1, 2]
+    assert markers["color"] == ["blue", "cyan"]
@@ -0,0 +1,41 @@
+"""Test the exact point to foodbank distance engine"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.backend.distance import DistanceEngine
+
+foodbanks = pd.DataFrame(
+    {
+        "ID": [0, 1],
+        "lat": [53.3792, 53.4011],
+        "long": [-1.4703, -1.4229],
+    }
+)
+
+# 1. start at the first foodbank
+# 2. start between both foodbanks
+test_conf = [
+    {"point": (-1.4703, 53.3792), "dist_range": 1000, "result": [0]},
+    {"point": (-1.4466, 53.3901), "dist_range": 5000, "result": [0, 1]},
+]
+
+
+@pytest.mark.parametrize("metric", ["projected", "haversine"])
+@pytest.mark.parametrize("config", test_conf)
+def test_distance_engine_query(config, metric):
+    """Test filtering foodbanks to a range around a point"""
+
+    engine = DistanceEngine(foodbanks, metric=metric)
+    near = engine.query(*config["point"], config["dist_range"])
+    assert sorted(near["ID"].to_list()) == config["result"]
+
+
+def test_distance_engine_metrics_agree():
+    """Test projected and haversine distances agree to within 0.5%"""
+
+    long, lat = np.array([-1.59391, -1.4466]), np.array([53.36835, 53.3901])
+    projected = DistanceEngine(foodbanks, "projected").distances(long, lat)
+    haversine = DistanceEngine(foodbanks, "haversine").distances(long, lat)
+    assert projected.shape == (2, 2)
+    np.testing.assert_allclose(projected, haversine, rtol=0.005)
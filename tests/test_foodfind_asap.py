@@ -1,19 +1,24 @@
 """Test foodfind_asap function in frontend_handler.py"""
 
 from datetime import datetime
+import pandas as pd
 import pytest
 from src.backend.frontend_handler import foodfind_asap
 
-# test for closest foodbank ID given date and starting postcode
+# test for closest foodbank ID given date and starting postcode. Foodbanks open
+# at the time come first, nearest first, then those opening soonest
 mock_data = [
-    {"timestamp": datetime(2023, 5, 11, 12, 10, 23, 442020), "postcode": "S1 1AA", "nearest_on_date": 15},
-    {"timestamp": datetime(2023, 6, 11, 12, 10, 23, 442020), "postcode": "S1 1AA", "nearest_on_date": 31},
-    {"timestamp": datetime(2023, 5, 11, 12, 10, 23, 442020), "postcode": "S9 1EA", "nearest_on_date": 17},
-    # same closest as above as Tuesday next availability from Sunday
-    {"timestamp": datetime(2023, 6, 11, 12, 10, 23, 442020), "postcode": "S9 1EA", "nearest_on_date": 17},
-
+    # Thursday 12:10, 34 (Monday to Friday 10.00 - 15.00) is open and nearest
+    {"timestamp": datetime(2023, 5, 11, 12, 10, 23, 442020), "postcode": "S1 1AA", "nearest_on_date": 34},
+    # Sunday 12:10, only 25 (Sunday to Tuesday 11.00 - 14.00) is open
+    {"timestamp": datetime(2023, 6, 11, 12, 10, 23, 442020), "postcode": "S1 1AA", "nearest_on_date": 25},
+    # Thursday 12:10, 6 (Thursday 11.00 - 13.00) is open and nearest
+    {"timestamp": datetime(2023, 5, 11, 12, 10, 23, 442020), "postcode": "S9 1EA", "nearest_on_date": 6},
+    # Sunday 12:10, only 25 is open, though further than others opening later
+    {"timestamp": datetime(2023, 6, 11, 12, 10, 23, 442020), "postcode": "S9 1EA", "nearest_on_date": 25},
 ]
 
+
 @pytest.mark.parametrize("config", mock_data)
 def test_foodfind_asap(config):
     """Test filtering to closest foodbank by distance and availability"""
@@ -24,3 +29,15 @@ def test_foodfind_asap(config):
     # assert that top hit is correct
     assert found.loc[0, "ID"] == config["nearest_on_date"]
 
+
+def test_foodfind_asap_cached_time_to_open():
+    """Test repeated searches rank by the time to open at each search time"""
+
+    times_to_open = []
+    for minute in [10, 40]:
+        found = foodfind_asap(method="postcode",
+                              time_stamp=datetime(2023, 5, 11, 12, minute),
+                              postcode="S1 1AA")
+        times_to_open.append(found.set_index("ID").loc[15, "time_to_open"])
+    # foodbank 15 opens on Thursdays at 12.30
+    assert times_to_open == [pd.Timedelta(minutes=20), pd.Timedelta(0)]
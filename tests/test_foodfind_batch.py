@@ -0,0 +1,66 @@
+"""Test foodfind_batch function in frontend_handler.py"""
+
+from datetime import datetime
+
+import pytest
+from shapely.geometry import Point
+from src.backend import frontend_handler
+from src.backend.frontend_handler import foodfind_asap, foodfind_batch, foodfind_nearest
+from src.backend.regions import RegionShard, ShardStore
+
+origins = ["S1 1AA", Point(-1.470599, 53.379244), "S9 1EA", "not a postcode"]
+
+
+def single_search(function, origin, **kwargs):
+    """Run a single origin search, returning the foodbank IDs found"""
+    if isinstance(origin, str):
+        found = function(method="postcode", postcode=origin, **kwargs)
+    else:
+        found = function(method="place_from", place_from=origin, **kwargs)
+    return found["ID"].to_list()
+
+
+@pytest.mark.parametrize("engine", ["od", "projected"])
+def test_foodfind_batch_nearest(engine):
+    """Test batch nearest searches match searching one origin at a time"""
+
+    days = {"Tuesday": True}
+    found = foodfind_batch(origins, "nearest", days=days, engine=engine)
+    for ind, origin in enumerate(origins):
+        assert found.loc[found["origin"] == ind, "ID"].to_list() == single_search(
+            foodfind_nearest, origin, days=days, engine=engine
+        )
+
+
+@pytest.mark.parametrize("engine", ["od", "projected"])
+def test_foodfind_batch_asap(engine):
+    """Test batch asap searches match searching one origin at a time"""
+
+    time_stamp = datetime(2023, 5, 11, 12, 10)
+    found = foodfind_batch(origins, "asap", time_stamp=time_stamp, engine=engine)
+    for ind, origin in enumerate(origins):
+        assert found.loc[found["origin"] == ind, "ID"].to_list() == single_search(
+            foodfind_asap, origin, time_stamp=time_stamp, engine=engine
+        )
+
+
+@pytest.mark.parametrize("query_type", ["nearest", "asap"])
+def test_foodfind_batch_unknown_ids(monkeypatch, query_type):
+    """Test foodbanks in an OD matrix older than the foodbanks are left out"""
+
+    shard = frontend_handler.DEFAULT_SHARD
+    dropped = shard.foodbanks["ID"].max()
+    stale = RegionShard(
+        "stale",
+        shard.postcode_index,
+        shard.foodbanks[shard.foodbanks["ID"] != dropped].copy(),
+        shard.od_matrix,
+    )
+    shards = ShardStore({"DEFAULT_REGION": "stale"})
+    shards.add(stale)
+    monkeypatch.setattr(frontend_handler, "SHARDS", shards)
+
+    found = foodfind_batch(["S1 1AA"], query_type, dist_range=50000)
+    assert len(found)
+    assert dropped not in found["ID"].to_list()
+    assert found["rank"].to_list() == list(range(1, len(found) + 1))
@@ -2,15 +2,15 @@ import pytest
 
 from src.backend.frontend_handler import foodfind_nearest
 
-# 1. test default function just monday
+# 1. test default function just monday, Ben's Centre opens Monday to Friday
 # 2. changes start postcode
-# 3. changes day to search
+# 3. changes day to search, Hillsborough opens on Tuesdays and is nearer
 test_conf = [
     {
         "method": "postcode",
         "postcode": "S1 1AD",
         "days": {"Monday": True},
-        "result": "S1 2BS",
+        "result": "S10 2GB",
     },  # noqa E501
     {
         "method": "postcode",
@@ -22,7 +22,7 @@ test_conf = [
         "method": "postcode",
         "postcode": "S1 1AD",
         "days": {"Tuesday": True},
-        "result": "S1 2BS",
+        "result": "S6 3BS",
     },  # noqa E501
 ]
 
@@ -37,3 +37,14 @@ def test_foodfind_nearest(config):
         days=config["days"],
     )
     assert closest["postcode"].iloc[0] == config["result"]
+
+
+@pytest.mark.parametrize("geometry", [False, True])
+def test_foodfind_nearest_geometry(geometry):
+    """Test foodbank geometries are only added when requested"""
+
+    closest = foodfind_nearest(method="postcode", postcode="S1 1AD", geometry=geometry)
+    assert ("geometry" in closest.columns) == geometry
+    if geometry:
+        assert closest.crs == "EPSG:4326"
+        assert closest.geometry.x.to_list() == closest["long"].to_list()
@@ -0,0 +1,32 @@
+"""Test the load test harness"""
+
+import pytest
+from src.backend.config import load_config
+from src.backend.scripts.load_test import find_knee, run_level, sample_origins, summarise
+
+
+def test_run_level():
+    """Test a short threaded run sends every kind of request successfully"""
+
+    config = load_config()
+    mix = dict(config["LOADTEST_MIX"])
+    records = run_level("threads", 2, 0.5, mix, sample_origins(config, n=20))
+    assert (records["status"] == 200).all()
+
+    summary = summarise(records, 0.5)
+    assert summary.loc["all", "requests"] == len(records)
+    assert set(summary.index) <= set(mix) | {"all"}
+
+
+@pytest.mark.parametrize(
+    "throughputs, knee",
+    [
+        ({1: 100, 2: 190, 4: 200, 8: 150}, 2),
+        ({1: 100, 2: 200, 4: 400}, 4),
+        ({1: 100, 2: 100}, 1),
+    ],
+)
+def test_find_knee(throughputs, knee):
+    """Test the knee is the last concurrency to raise throughput"""
+
+    assert find_knee(throughputs, gain=0.1) == knee
@@ -0,0 +1,56 @@
+"""Test ingesting the GeoNames postcode archive"""
+
+import zipfile
+
+import pandas as pd
+import pytest
+from src.backend.checksum import file_checksum
+from src.backend.scripts.make_data import POSTCODE_MEMBER, postcode_to_coords
+
+rows = [
+    ["GB", "S1 1AA", "Sheffield", "England", "ENG", "South Yorkshire", "", "Sheffield District (B)", "E08000019", 53.3811, -1.4989, 6],
+    ["GB", "S35 0AA", "Chapeltown", "England", "ENG", "South Yorkshire", "", "Sheffield District (B)", "E08000019", 53.4622, -1.4671, 6],
+    ["GB", "S60 1AA", "Rotherham", "England", "ENG", "South Yorkshire", "", "Rotherham District (B)", "E08000018", 53.4302, -1.3568, 6],
+    ["GB", "EC1A 1BB", "London", "England", "ENG", "Greater London", "", "Islington", "E09000019", 51.5202, -0.0979, 6],
+]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / "GB_full.csv.zip"
+    with zipfile.ZipFile(path, "w") as zip:
+        zip.writestr(
+            POSTCODE_MEMBER,
+            "\n".join("\t".join(str(value) for value in row) for row in rows),
+        )
+    return path
+
+
+@pytest.mark.parametrize("chunksize", [1, 100])
+def test_postcode_to_coords(archive, tmp_path, chunksize):
+    """Test filtering a local archive to the area and district, a chunk at a time"""
+
+    postcodes = postcode_to_coords(str(tmp_path), source=str(archive), chunksize=chunksize)
+
+    assert postcodes["postcode"].to_list() == ["S11AA", "S350AA"]
+    assert postcodes["lat"].to_list() == [53.3811, 53.4622]
+    exported = pd.read_csv(tmp_path / "shef_pc_coords_lookup.csv", index_col=0)
+    assert list(exported.columns) == [
+        "postcode", "area", "country", "country_code", "region",
+        "district", "district_code", "lat", "long",
+    ]
+
+
+def test_postcode_to_coords_checksum(archive, tmp_path):
+    """Test a local archive must match the expected checksum"""
+
+    postcode_to_coords(str(tmp_path), source=str(archive), sha256=file_checksum(archive))
+    with pytest.raises(ValueError):
+        postcode_to_coords(str(tmp_path), source=str(archive), sha256="0" * 64)
+
+
+def test_postcode_to_coords_no_matches(archive, tmp_path):
+    """Test an area and district matching no postcodes is reported by name"""
+
+    with pytest.raises(ValueError, match="Nowhere"):
+        postcode_to_coords(str(tmp_path), source=str(archive), area="Nowhere", district="Nowhere")
@@ -0,0 +1,55 @@
+"""Test the synthetic benchmark datasets and baseline comparison"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.backend.config import load_config
+from src.backend.od_matrix import read_od_snapshot
+from src.backend.open_times import OpeningSchedule, opening_day_mask
+from src.backend.scripts.benchmark import compare_baseline
+from src.backend.scripts.make_synthetic import make_synthetic, synthetic_config
+
+
+@pytest.mark.parametrize("scale", [1, 3])
+def test_make_synthetic(tmp_path, scale):
+    """Test tiling the Sheffield data, with unique postcodes and parseable opening hours"""
+
+    config = load_config()
+    config["BENCHMARK_DIR"] = str(tmp_path)
+    n_pairs = make_synthetic(config, scale)
+
+    synthetic = synthetic_config(config, scale)
+    postcodes = pd.read_csv(os.path.join(synthetic["DATA_DIR"], synthetic["POSTCODE_FILENAME"]))
+    foodbanks = pd.read_csv(os.path.join(synthetic["DATA_DIR"], synthetic["FOODBANK_FILENAME"]))
+    source = pd.read_csv(os.path.join(config["DATA_DIR"], config["POSTCODE_FILENAME"]))
+    assert len(postcodes) == scale * len(source)
+    assert postcodes["postcode"].is_unique
+    assert foodbanks["ID"].to_list() == list(range(len(foodbanks)))
+    assert (foodbanks["opening"].map(opening_day_mask) != 0).all()
+    generated = foodbanks["ID"][len(foodbanks) // scale:]
+    assert np.isin(generated, OpeningSchedule.from_foodbanks(foodbanks).ids).all()
+
+    od_matrix = read_od_snapshot(os.path.join(synthetic["DATA_DIR"], synthetic["OD_SNAPSHOT_DIRNAME"]))
+    assert len(od_matrix) == n_pairs
+    assert od_matrix.distances.max() <= config["BENCHMARK_OD_MAX_RADIUS"]
+
+
+def test_compare_baseline():
+    """Test slowdowns and memory growth beyond the tolerance are flagged"""
+
+    stats = {"p50_ms": 1.0, "peak_kb": 100.0}
+    baseline = {"1x": {"nearest": stats, "asap": stats}}
+    results = {
+        "1x": {
+            "nearest": {"p50_ms": 1.4, "peak_kb": 100.0},
+            "asap": {"p50_ms": 1.0, "peak_kb": 200.0},
+            "new": {"p50_ms": 9.0, "peak_kb": 900.0},
+            "process": {"rss_mb": 1e6},
+        },
+        "10x": {"nearest": {"p50_ms": 9.0, "peak_kb": 900.0}},
+    }
+    regressions = compare_baseline(results, baseline, tolerance=1.5)
+    assert regressions == ["1x asap peak_kb 200.00, baseline 100.00"]
+    assert len(compare_baseline(results, baseline, tolerance=1.2)) == 2
@@ -0,0 +1,26 @@
+"""Test the worker memory report"""
+
+import os
+import subprocess
+import sys
+
+from src.backend.scripts.memory_report import process_memory
+
+
+def test_process_memory():
+    """Test shared and private memory add up to the resident memory"""
+
+    memory = process_memory(os.getpid())
+    assert memory["rss"] > 0
+    assert abs(memory["shared"] + memory["private"] - memory["rss"]) < 1
+
+
+def test_simulated_workers():
+    """Test forking preloaded workers reports memory for each of them"""
+
+    output = subprocess.run(
+        [sys.executable, "-m", "src.backend.scripts.memory_report", "--simulate", "2", "--requests", "2"],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    assert sum(line.startswith("worker") for line in output.splitlines()) == 2
+    assert "mean private memory per worker" in output
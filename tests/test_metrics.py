@@ -0,0 +1,105 @@
+"""Test request metrics and their Prometheus export"""
+
+import json
+import os
+import subprocess
+import sys
+
+from app import app
+from src.backend import frontend_handler
+from src.backend.frontend_handler import QUERY_CACHE, foodfind_nearest
+from src.backend.metrics import METRICS, Metrics
+from src.coordinates import LongLat
+
+
+def test_metrics_aggregate_workers(tmp_path):
+    """Test histograms and counters are summed across live workers, and gauges
+    labelled by worker"""
+
+    other = Metrics()
+    other.observe("foodfinder_stage_seconds", 0.002, stage="geocode")
+    other.set_counter("foodfinder_query_cache_hits_total", 3)
+    other.set_gauge("foodfinder_startup_seconds", 0.5, phase="load", step="od_matrix")
+    (tmp_path / f"{os.getppid()}.json").write_text(json.dumps(other.snapshot()))
+
+    # files of exited workers are dropped
+    exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    dead_file = tmp_path / f"{exited.stdout.strip()}.json"
+    dead_file.write_text(json.dumps(other.snapshot()))
+
+    metrics = Metrics(directory=str(tmp_path))
+    metrics.observe("foodfinder_stage_seconds", 0.2, stage="geocode")
+    metrics.set_counter("foodfinder_query_cache_hits_total", 4)
+    lines = metrics.render().splitlines()
+
+    assert 'foodfinder_stage_seconds_bucket{stage="geocode",le="0.0025"} 1' in lines
+    assert 'foodfinder_stage_seconds_bucket{stage="geocode",le="+Inf"} 2' in lines
+    assert 'foodfinder_stage_seconds_count{stage="geocode"} 2' in lines
+    assert "foodfinder_query_cache_hits_total 7" in lines
+    assert f'foodfinder_startup_seconds{{phase="load",step="od_matrix",worker="{os.getppid()}"}} 0.5' in lines
+    assert "# TYPE foodfinder_stage_seconds histogram" in lines
+    assert not dead_file.exists()
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+
+
+def test_metrics_endpoint():
+    """Test a search records its stages, served at /metrics"""
+
+    client = app.test_client()
+    client.post(
+        "/",
+        data={"query_type": "nearest", "query_location": "postcode", "pcode": "S1 1AD", "range_val": "5", "Monday": "on"},
+    )
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    for stage in ["geocode", "origin", "od_filter", "day_filter", "html_table", "render"]:
+        assert f'foodfinder_stage_seconds_count{{stage="{stage}"}}' in text
+    assert 'foodfinder_startup_seconds{phase="load",step="postcode_index"' in text
+
+
+def test_metrics_flushed_from_requests(tmp_path, monkeypatch):
+    """Test query cache counts reach the worker's file, written only by requests"""
+
+    monkeypatch.setattr(METRICS, "directory", str(tmp_path))
+    monkeypatch.setattr(METRICS, "flush_interval", 0)
+    QUERY_CACHE.clear()
+    before = dict(METRICS.counters)
+
+    client = app.test_client()
+    for _ in range(3):
+        client.post(
+            "/",
+            data={"query_type": "nearest", "query_location": "postcode", "pcode": "S10 1AE", "range_val": "4", "Monday": "on"},
+        )
+    counters = {
+        name: value for name, _, value in json.loads((tmp_path / f"{os.getpid()}.json").read_text())["counters"]
+    }
+    for name, expected in [("foodfinder_query_cache_hits_total", 2), ("foodfinder_query_cache_misses_total", 1)]:
+        assert counters[name] - before.get((name, ""), 0) == expected
+
+
+def test_app_import_writes_no_metrics():
+    """Test importing the app writes no metrics file for the process"""
+
+    code = "import os, app; print(os.path.join(app.METRICS.directory, f'{os.getpid()}.json'))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert not os.path.exists(result.stdout.strip())
+
+
+def test_query_cache_evictions_counted(monkeypatch):
+    """Test query cache evictions are counted, and a place is snapped once per search"""
+
+    shard = frontend_handler.DEFAULT_SHARD
+    snap_many = shard.snap_many
+    snapped = []
+    monkeypatch.setattr(shard, "snap_many", lambda coords: snapped.append(coords) or snap_many(coords))
+    monkeypatch.setattr(QUERY_CACHE, "maxsize", 1)
+    QUERY_CACHE.clear()
+    key = ("foodfinder_query_cache_evictions_total", "")
+    before = METRICS.counters.get(key, 0)
+
+    foodfind_nearest(method="place_from", place_from=LongLat(-1.470599, 53.379244))
+    assert len(snapped) == 1
+    foodfind_nearest(method="postcode", postcode="S10 1AE")
+    assert METRICS.counters[key] - before == 1
@@ -0,0 +1,155 @@
+"""Test the binary OD matrix snapshot"""
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.backend.config import load_config
+from src.backend.od_matrix import (
+    ODMatrix,
+    ODSnapshotWriter,
+    read_od_snapshot,
+    write_od_snapshot,
+)
+from src.backend.scripts.build_od import build_od, od_pairs, update_od
+from src.coordinates import canonical_postcode
+
+od_df = pd.DataFrame(
+    {
+        "ID": [0, 1, 0, 1],
+        "postcode": ["S11AA", "S11AA", "S102GB", "S102GB"],
+        "distance": [150.0, 2500.0, 4000.0, 900.0],
+    }
+)
+
+# 1. both foodbanks in range, nearest first
+# 2. both foodbanks in range, limited to the nearest
+# 3. one foodbank out of range
+# 4. postcode not in the matrix
+test_conf = [
+    {"postcode": "S10 2GB", "dist_range": 5000, "num_results": None, "result": [1, 0]},
+    {"postcode": "S11AA", "dist_range": 5000, "num_results": 1, "result": [0]},
+    {"postcode": "S102GB", "dist_range": 1000, "num_results": None, "result": [1]},
+    {"postcode": "S99ZZ", "dist_range": 5000, "num_results": None, "result": []},
+]
+
+
+@pytest.mark.parametrize("config", test_conf)
+def test_od_snapshot_query(config, tmp_path):
+    """Test querying a written and memory-mapped snapshot"""
+
+    write_od_snapshot(od_df, tmp_path)
+    od_matrix = read_od_snapshot(tmp_path)
+
+    near = od_matrix.query(
+        config["postcode"], config["dist_range"], config["num_results"]
+    )
+    assert near["ID"].to_list() == config["result"]
+
+
+def test_od_postcode_search(tmp_path):
+    """Test canonical, sorted snapshot postcodes are searched in place, and
+    others through a sorted canonical copy"""
+
+    write_od_snapshot(od_df.assign(postcode=od_df["postcode"].map(canonical_postcode)), tmp_path)
+    od_matrix = read_od_snapshot(tmp_path)
+    postcodes, codes = od_matrix.postcode_search
+    assert postcodes is od_matrix.postcodes and codes is None
+    assert od_matrix.codes_many(["s102gb", "S1 1AA", "S99ZZ"]).tolist() == [1, 0, -1]
+
+    # raw postcodes sort "S102GB" before "S11AA"
+    od_matrix = ODMatrix.from_frame(od_df)
+    assert od_matrix.codes_many(["s102gb", "S1 1AA", "S99ZZ"]).tolist() == [0, 1, -1]
+
+
+def test_od_snapshot_writer(tmp_path):
+    """Test streaming a snapshot a chunk of postcodes at a time"""
+
+    expected = write_od_snapshot(od_df, tmp_path / "expected")
+    writer = ODSnapshotWriter(tmp_path / "streamed", expected.postcodes)
+    for code in range(len(expected.postcodes)):
+        start, end = expected.offsets[code], expected.offsets[code + 1]
+        writer.write(
+            [code] * (end - start), expected.ids[start:end], expected.distances[start:end]
+        )
+    writer.close()
+
+    streamed = read_od_snapshot(tmp_path / "streamed")
+    for postcode in ["S11AA", "S102GB"]:
+        pd.testing.assert_frame_equal(
+            streamed.query(postcode, 5000), expected.query(postcode, 5000)
+        )
+
+
+def test_od_replace_foodbanks(tmp_path):
+    """Test patching foodbanks into a snapshot matches building from scratch"""
+
+    write_od_snapshot(od_df, tmp_path)
+    od_matrix = read_od_snapshot(tmp_path, mmap_mode=None)
+
+    # foodbank 0 moves, foodbank 1 closes and foodbank 2 opens
+    changes = pd.DataFrame(
+        {
+            "ID": [0, 2, 0, 2],
+            "postcode": ["S11AA", "S11AA", "S102GB", "S102GB"],
+            "distance": [3000.0, 150.0, 100.0, 4000.0],
+        }
+    )
+    codes = np.searchsorted(od_matrix.postcodes, changes["postcode"].to_numpy(str))
+    patched = od_matrix.replace_foodbanks(
+        [0, 1], codes, changes["ID"].to_numpy(), changes["distance"].to_numpy()
+    )
+    expected = ODMatrix.from_frame(changes)
+
+    for postcode in ["S11AA", "S102GB"]:
+        pd.testing.assert_frame_equal(
+            patched.query(postcode, 5000), expected.query(postcode, 5000)
+        )
+
+
+@pytest.mark.parametrize("max_radius", [500, 8000, np.inf])
+def test_od_pairs(max_radius):
+    """Test pairs found near each chunk match comparing against every foodbank"""
+
+    rng = np.random.default_rng(0)
+    postcode_x, postcode_y = rng.uniform(0, 20000, (2, 200))
+    foodbank_x, foodbank_y = rng.uniform(-10000, 30000, (2, 50))
+    postcode_pos, foodbank_pos, distances = od_pairs(
+        postcode_x, postcode_y, foodbank_x, foodbank_y, max_radius
+    )
+
+    expected = np.hypot(
+        postcode_x[:, None] - foodbank_x[None, :], postcode_y[:, None] - foodbank_y[None, :]
+    ).astype(np.float32)
+    assert len(distances) == (expected <= max_radius).sum()
+    np.testing.assert_array_equal(distances, expected[postcode_pos, foodbank_pos])
+    assert (np.diff(postcode_pos) >= 0).all()
+
+
+def test_update_od(tmp_path):
+    """Test an incremental update matches a full build, without rewriting the csv"""
+
+    config = load_config()
+    for key in ["FOODBANK_FILENAME", "POSTCODE_FILENAME"]:
+        shutil.copy(os.path.join(config["DATA_DIR"], config[key]), tmp_path)
+    config["DATA_DIR"] = str(tmp_path)
+    build_od(config, write_csv=False)
+
+    foodbanks_path = tmp_path / config["FOODBANK_FILENAME"]
+    foodbanks = pd.read_csv(foodbanks_path)
+    foodbanks.loc[3, "lat"] += 0.01
+    foodbanks.drop(index=5).to_csv(foodbanks_path, index=False)
+    n_pairs = update_od(config)
+
+    snapshot_dir = tmp_path / config["OD_SNAPSHOT_DIRNAME"]
+    updated = read_od_snapshot(snapshot_dir).to_frame()
+    build_od(config, write_csv=False)
+    expected = read_od_snapshot(snapshot_dir).to_frame()
+    assert n_pairs == len(expected)
+    pd.testing.assert_frame_equal(
+        updated.sort_values(["postcode", "distance", "ID"], ignore_index=True),
+        expected.sort_values(["postcode", "distance", "ID"], ignore_index=True),
+    )
+    assert not (tmp_path / config["OD_FILENAME"]).exists()
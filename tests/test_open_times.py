@@ -4,7 +4,11 @@ PyTest functions
 """
 from datetime import datetime
 import pandas as pd
+import pytest
 from src.backend.open_times import (
+    OpeningSchedule,
+    days_to_mask,
+    opening_day_mask,
     parse_open_times,
     parse_opening_str,
     sort_by_time_to_open,
@@ -59,3 +63,45 @@ def test_sort_by_time():
         test_df.time_to_open,
         time_to_open,
     )
+
+
+@pytest.mark.parametrize(
+    "text, mask",
+    [
+        (open_str, 0b0010010),
+        ("Monday to Friday 9.00 - 12.00", 0b0011111),
+        ("Sunday to Tuesday 11.00 - 14.00", 0b1000011),
+        ("Open all week, call ahead", 0b1111111),
+        ("Ring for an appointment", 0),
+    ],
+)
+def test_opening_day_mask(text, mask):
+    assert opening_day_mask(text) == mask
+
+
+def test_days_to_mask():
+    assert days_to_mask({"Monday": True, "Tuesday": False, "Sunday": True}) == 0b1000001
+
+
+def test_parse_open_str_day_range():
+    test_str = parse_opening_str("Sunday to Monday 9.00 - 12.00\nWednesday 12.30", "bla")
+    assert test_str == [
+        {"id": "bla", "day": "Wednesday", "start": "12.30", "end": "12.30"},
+        {"id": "bla", "day": "Sunday", "start": "9.00", "end": "12.00"},
+        {"id": "bla", "day": "Monday", "start": "9.00", "end": "12.00"},
+    ]
+
+
+def test_minutes_to_open():
+    time_now = datetime(2023, 5, 9, 12, 30, 0, 0)
+    schedule = OpeningSchedule.from_foodbanks(open_df, col_in="Opening", col_id="Name")
+    minutes = schedule.minutes_to_open(["Hillsborough", "Crookes", "Unknown"], time_now)
+    assert minutes.tolist() == [0, 90, float("inf")]
+
+
+def test_parse_open_str_every_line():
+    text = "Monday 9.00 - 12.00\nTuesday 10.00 - 11.00\nWednesday 9.30 - 10.00\nFriday 12.00"
+    test_str = parse_opening_str(text, "bla")
+    days = {row["day"] for row in test_str}
+    assert days == {"Monday", "Tuesday", "Wednesday", "Friday"}
+    assert opening_day_mask(text) == sum(1 << day for day in [0, 1, 2, 4])
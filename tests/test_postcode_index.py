@@ -0,0 +1,79 @@
+"""Test the normalised postcode index"""
+
+import numpy as np
+import pytest
+from src.coordinates import PostcodeIndex, canonical_postcode
+
+pc_index = PostcodeIndex(
+    postcodes=["S11AA", "S10 2GB", "s6 3bs"],
+    lat=[53.3811, 53.3792, 53.3950],
+    long=[-1.4701, -1.4989, -1.4903],
+)
+
+# 1. no space, 2. extra spaces, 3. lower case, 4. not present
+test_conf = [
+    {"postcode": "S11AA", "result": [53.3811, -1.4701]},
+    {"postcode": " S10  2GB ", "result": [53.3792, -1.4989]},
+    {"postcode": "s63bs", "result": [53.3950, -1.4903]},
+    {"postcode": "S99 9ZZ", "result": None},
+]
+
+
+def test_canonical_postcode():
+    """Test postcodes are upper cased with one space before the inward code"""
+
+    assert canonical_postcode(" s1  1aa") == "S1 1AA"
+
+
+@pytest.mark.parametrize("config", test_conf)
+def test_lookup(config):
+    """Test looking up a postcode in any spacing or case"""
+
+    assert pc_index.lookup(config["postcode"]) == config["result"]
+
+
+def test_lookup_many():
+    """Test bulk lookups agree with single lookups, with NaN where missing"""
+
+    coords = pc_index.lookup_many([config["postcode"] for config in test_conf])
+    np.testing.assert_array_equal(
+        coords,
+        [config["result"] or [np.nan, np.nan] for config in test_conf],
+    )
+
+
+@pytest.mark.parametrize(
+    "prefix, result",
+    [("S1", ["S10 2GB", "S1 1AA"]), ("s6 3", ["S6 3BS"]), ("", []), ("S7", [])],
+)
+def test_prefix_search(prefix, result):
+    """Test prefix searches ignore case and spacing"""
+
+    assert pc_index.prefix_search(prefix) == result
+
+
+@pytest.mark.parametrize("limit, result", [(1, ["S10 2GB"]), (0, []), (-3, [])])
+def test_prefix_search_limit(limit, result):
+    """Test prefix searches return at most `limit` postcodes, none for negative limits"""
+
+    assert pc_index.prefix_search("S1", limit) == result
+
+
+def test_snapshot(tmp_path):
+    """Test an index read back from its snapshot matches the original"""
+
+    pc_index.save(tmp_path)
+    loaded = PostcodeIndex.from_snapshot(tmp_path)
+
+    assert loaded.postcodes.tolist() == pc_index.postcodes.tolist()
+    assert loaded.prefix_search("S1") == pc_index.prefix_search("S1")
+    assert loaded.lookup("s63bs") == pc_index.lookup("S6 3BS")
+
+
+def test_duplicate_postcodes():
+    """Test the last of duplicate postcodes is found, and listed once by prefix"""
+
+    index = PostcodeIndex(["S1 1AA", "S2 2BB", "s11aa"], [1.0, 2.0, 3.0], [4.0, 5.0, 6.0])
+    assert index.lookup("S1 1AA") == [3.0, 6.0]
+    assert index.positions_many(["S2 2BB", "S1 1AA", "S9 9ZZ"]).tolist() == [1, 2, -1]
+    assert index.prefix_search("S") == ["S1 1AA", "S2 2BB"]
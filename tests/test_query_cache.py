@@ -0,0 +1,37 @@
+"""Test the LRU query result cache"""
+
+from src.backend.query_cache import QueryCache
+
+
+def test_lru_eviction():
+    """Test the least recently used result is evicted when full"""
+
+    cache = QueryCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats() == {
+        "hits": 3, "misses": 1, "evictions": 1, "size": 2
+    }
+
+
+def test_ttl_expiry():
+    """Test results expire after the TTL"""
+
+    cache = QueryCache(ttl=-1)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_on_evict():
+    """Test each expired or least recently used result is reported"""
+
+    evicted = []
+    cache = QueryCache(maxsize=1, ttl=-1, on_evict=lambda: evicted.append(1))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("b")
+    assert len(evicted) == cache.stats()["evictions"] == 2
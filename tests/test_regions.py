@@ -0,0 +1,216 @@
+"""Test region shards, loaded lazily and searched across borders"""
+
+import threading
+import time
+
+import pandas as pd
+import pytest
+from shapely.geometry import Point
+import app
+from src import api
+from src.backend import frontend_handler
+from src.backend.config import region_config
+from src.backend.regions import RegionShard, ShardStore
+from src.backend.scripts.build_od import build_od
+
+# two neighbouring regions either side of longitude -1.45
+regions = {
+    "west": {
+        "postcodes": {"S1 1AA": (53.38, -1.48), "S1 1AB": (53.38, -1.46)},
+        "foodbanks": {"S1 1AA": (53.38, -1.48), "S1 1AB": (53.38, -1.46)},
+        "BOUNDS": [53.3, -1.5, 53.5, -1.45],
+        "OUTWARD_CODES": ["S1"],
+    },
+    "east": {
+        "postcodes": {"S60 1AA": (53.38, -1.445), "S60 1AB": (53.38, -1.42)},
+        "foodbanks": {"S60 1AA": (53.38, -1.445)},
+        "BOUNDS": [53.3, -1.45, 53.5, -1.4],
+        "OUTWARD_CODES": ["S60"],
+    },
+}
+
+# rest of the foodbank details shown in the results table
+CONTACT_DETAILS = {
+    "address": "1 High Street",
+    "phone": "0114 0000000",
+    "email": "help@example.org",
+    "website": "example.org",
+    "referral_required": 0.0,
+    "delivery_option": 0.0,
+    "category": "foodbank",
+    "support": "",
+    "referral_link": "",
+}
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = {
+        "FOODBANK_FILENAME": "foodbank_coords.csv",
+        "POSTCODE_FILENAME": "postcodes.csv",
+        "OD_FILENAME": "od.csv",
+        "OD_SNAPSHOT_DIRNAME": "od",
+        "POSTCODE_SNAPSHOT_DIRNAME": "postcode_index",
+        "DEFAULT_REGION": "west",
+        "regions": {},
+    }
+    for name, region in regions.items():
+        data_dir = tmp_path / name
+        data_dir.mkdir()
+        pd.DataFrame(
+            [(pc, lat, long) for pc, (lat, long) in region["postcodes"].items()],
+            columns=["postcode", "lat", "long"],
+        ).to_csv(data_dir / "postcodes.csv", index=False)
+        pd.DataFrame(
+            [
+                (ind, f"{name} {ind}", pc, "Monday 10.00 – 12.00", lat, long)
+                for ind, (pc, (lat, long)) in enumerate(region["foodbanks"].items())
+            ],
+            columns=["ID", "name", "postcode", "opening", "lat", "long"],
+        ).assign(**CONTACT_DETAILS).to_csv(data_dir / "foodbank_coords.csv", index=False)
+
+        config["regions"][name] = {
+            "DATA_DIR": str(data_dir),
+            "BOUNDS": region["BOUNDS"],
+            "OUTWARD_CODES": region["OUTWARD_CODES"],
+            "ADJACENT": [other for other in regions if other != name],
+        }
+        build_od(region_config(config, name))
+    return config
+
+
+def test_shards_load_lazily(config):
+    """Test shards load on first use, and are evicted beyond the memory budget"""
+
+    shards = ShardStore(config, memory_budget=1)
+    assert shards.stats()["loaded"] == []
+
+    assert shards.get("west").name == "west"
+    assert shards.get().name == "west"
+    assert shards.stats()["loads"] == 1
+
+    shards.get("east")
+    assert shards.stats()["loaded"] == ["east"]
+    assert shards.stats()["evictions"] == 1
+
+
+def test_shard_load_does_not_block(config):
+    """Test a region loading once does not hold up searches of loaded regions"""
+
+    release = threading.Event()
+    loads = []
+
+    def slow_loader(region):
+        loads.append(region["REGION"])
+        if region["REGION"] == "east":
+            assert release.wait(5)
+        return RegionShard.from_config(region)
+
+    shards = ShardStore(config, loader=slow_loader)
+    shards.get("west")
+    threads = [threading.Thread(target=shards.get, args=("east",)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    while "east" not in loads:
+        time.sleep(0.01)
+
+    start = time.perf_counter()
+    assert shards.get("west").name == "west"
+    assert time.perf_counter() - start < 1
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert loads == ["west", "east"]
+    assert sorted(shards.stats()["loaded"]) == ["east", "west"]
+
+
+# 1. postcode listed in a region's outward codes
+# 2. postcode not in any region
+# 3. place within a region's bounds
+# 4. place outside every region
+test_conf = [
+    {"origin": "s601ab", "region": "east"},
+    {"origin": "S99 9ZZ", "region": "west"},
+    {"origin": Point(-1.41, 53.4), "region": "east"},
+    {"origin": Point(-2.0, 53.4), "region": "west"},
+]
+
+
+@pytest.mark.parametrize("route", test_conf)
+def test_shard_routing(config, route):
+    """Test routing starting locations to their home region"""
+
+    shards = ShardStore(config)
+    if isinstance(route["origin"], str):
+        assert shards.region_for_postcode(route["origin"]) == route["region"]
+    else:
+        origin = route["origin"]
+        assert shards.region_for_point(origin.x, origin.y) == route["region"]
+
+
+@pytest.mark.parametrize("engine", ["od", "projected"])
+def test_cross_border_search(config, monkeypatch, engine):
+    """Test searching near a border consults the adjacent region"""
+
+    shards = ShardStore(config)
+    monkeypatch.setattr(frontend_handler, "SHARDS", shards)
+    frontend_handler.QUERY_CACHE.clear()
+
+    found = frontend_handler.foodfind_nearest(
+        method="postcode", postcode="S1 1AB", dist_range=3000, engine=engine
+    )
+    assert found["name"].to_list() == ["west 1", "east 0", "west 0"]
+    assert found["region"].to_list() == ["west", "east", "west"]
+
+    # the far side of the home region is out of range of the border
+    found = frontend_handler.foodfind_nearest(
+        method="place_from", place_from=Point(-1.49, 53.38), dist_range=1000, engine=engine
+    )
+    assert found["region"].to_list() == ["west"]
+    assert sorted(shards.stats()["loaded"]) == ["east", "west"]
+
+
+@pytest.fixture
+def client(config, monkeypatch):
+    """App test client serving the two regions"""
+    shards = ShardStore(config)
+    for module in [app, api, frontend_handler]:
+        monkeypatch.setattr(module, "SHARDS", shards)
+    frontend_handler.QUERY_CACHE.clear()
+    api.foodbank_records.cache_clear()
+    yield app.app.test_client()
+    frontend_handler.QUERY_CACHE.clear()
+    api.foodbank_records.cache_clear()
+
+
+def test_app_other_region(client):
+    """Test postcodes of a region other than the default are geocoded, searched
+    and autocompleted"""
+
+    response = client.post(
+        "/",
+        data={"query_type": "nearest", "query_location": "postcode", "pcode": "S60 1AB", "range_val": "3", "Monday": "on"},
+    )
+    assert response.status_code == 200
+    assert b"east 0" in response.data
+
+    assert client.get("/api/postcodes?prefix=S60").get_json() == ["S60 1AA", "S60 1AB"]
+    assert client.get("/api/postcodes?prefix=s").get_json() == ["S1 1AA", "S1 1AB", "S60 1AA", "S60 1AB"]
+    assert client.get("/api/postcodes?prefix=S601A&limit=1").get_json() == ["S60 1AA"]
+
+
+def test_api_search_regions(client):
+    """Test JSON searches route each origin to its home region"""
+
+    response = client.get("/api/search?postcode=S60%201AB&dist_range=2000")
+    assert [result["name"] for result in response.get_json()["results"]] == ["east 0"]
+
+    response = client.post(
+        "/api/search/batch",
+        json={
+            "origins": [{"postcode": "S60 1AB"}, {"postcode": "S1 1AA"}, {"lat": 53.38, "long": -1.42}],
+            "dist_range": 2000,
+        },
+    )
+    names = [[result["name"] for result in results] for results in response.get_json()["results"]]
+    assert names == [["east 0"], ["west 0", "west 1"], ["east 0"]]
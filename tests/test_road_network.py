@@ -0,0 +1,133 @@
+"""Test walking distances over a road network extract"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.backend.od_matrix import read_od_snapshot
+from src.backend import road_network
+from src.backend.projection import to_bng
+from src.backend.road_network import RoadNetwork
+from src.backend.scripts import build_od as build_od_script
+from src.backend.scripts.build_od import build_od
+
+
+def to_lat_long(x, y):
+    """lat/long of British National Grid coordinates"""
+    long, lat = to_bng().transform(x, y, direction="INVERSE")
+    return lat, long
+
+
+# two roads 200m apart either side of a river, 1km long with nodes every 100m,
+# joined by a single bridge at the east end
+road_x = 430000 + 100 * np.arange(11)
+node_x = np.concatenate([road_x, road_x])
+node_y = np.repeat([387000, 387200], 11)
+node_lat, node_long = to_lat_long(node_x, node_y)
+nodes = pd.DataFrame({"node": 1000 + np.arange(22), "lat": node_lat, "long": node_long})
+edges = pd.DataFrame(
+    {
+        "u": 1000 + np.concatenate([np.arange(10), 11 + np.arange(10), [10]]),
+        "v": 1000 + np.concatenate([1 + np.arange(10), 12 + np.arange(10), [21]]),
+        "length": 100.0,
+    }
+)
+edges.loc[20, "length"] = 200.0
+
+# a foodbank on the north bank at the west end, and postcodes opposite it and
+# next to the bridge on the south bank
+foodbank_lat, foodbank_long = to_lat_long(np.array([430000]), np.array([387200]))
+postcode_lat, postcode_long = to_lat_long(np.array([430000, 431000]), np.array([387000, 387000]))
+
+# 1. both postcodes reached, opposite the foodbank by walking over the bridge
+# 2. only the postcode by the bridge in range
+# 3. neither postcode in range, although one is 200m away in a straight line
+test_conf = [
+    {"max_radius": 5000, "result": {"S1 1AA": 2200.0, "S1 1AB": 1200.0}},
+    {"max_radius": 1500, "result": {"S1 1AB": 1200.0}},
+    {"max_radius": 1000, "result": {}},
+]
+
+
+def write_network_data(tmp_path, max_radius):
+    """Write the foodbank, postcodes and network files, returning the build
+    configuration"""
+    pd.DataFrame(
+        {"ID": [0], "postcode": ["S12AA"], "lat": foodbank_lat, "long": foodbank_long}
+    ).to_csv(tmp_path / "foodbanks.csv", index=False)
+    pd.DataFrame(
+        {"postcode": ["S11AA", "S11AB"], "lat": postcode_lat, "long": postcode_long}
+    ).to_csv(tmp_path / "postcodes.csv", index=False)
+    nodes.to_csv(tmp_path / "nodes.csv", index=False)
+    edges.to_csv(tmp_path / "edges.csv", index=False)
+    return {
+        "DATA_DIR": str(tmp_path),
+        "FOODBANK_FILENAME": "foodbanks.csv",
+        "POSTCODE_FILENAME": "postcodes.csv",
+        "POSTCODE_SNAPSHOT_DIRNAME": "postcode_index",
+        "OD_FILENAME": "od.csv",
+        "OD_SNAPSHOT_DIRNAME": "od",
+        "OD_MAX_RADIUS": max_radius,
+        "NETWORK_NODES_FILENAME": "nodes.csv",
+        "NETWORK_EDGES_FILENAME": "edges.csv",
+        "WALKING_SPEED": 80,
+    }
+
+
+@pytest.mark.parametrize("config", test_conf)
+def test_build_od_network(config, tmp_path):
+    """Test the OD matrix built over the network has walking distances"""
+
+    build_config = write_network_data(tmp_path, config["max_radius"])
+    n_pairs = build_od(build_config, network=True)
+
+    od = read_od_snapshot(os.path.join(tmp_path, "od")).to_frame()
+    assert n_pairs == len(od) == len(config["result"])
+    assert od["postcode"].to_list() == list(config["result"])
+    np.testing.assert_allclose(od["distance"], list(config["result"].values()), atol=0.1)
+    export = pd.read_csv(tmp_path / "od.csv")
+    np.testing.assert_allclose(export["minutes"].astype(float), export["distance"].astype(float) / 80)
+
+
+def test_road_network_edges():
+    """Test parallel segments keep the shortest, and unknown nodes are rejected"""
+
+    parallel = pd.concat([edges, pd.DataFrame({"u": [1021], "v": [1010], "length": [50.0]})])
+    network = RoadNetwork(nodes, parallel)
+    distances = network.distances_from(np.array([0]))
+    assert distances[0, 11] == pytest.approx(1000 + 50 + 1000)
+
+    node, access = network.snap(np.array([430040]), np.array([387010]))
+    assert node[0] == 0
+    assert access[0] == pytest.approx(np.hypot(40, 10), abs=0.1)
+
+    with pytest.raises(ValueError):
+        RoadNetwork(nodes, pd.DataFrame({"u": [1000], "v": [999], "length": [1.0]}))
+
+
+def test_distances_from_batches(monkeypatch):
+    """Test distances computed a few sources at a time match a single batch"""
+
+    network = RoadNetwork(nodes, edges)
+    sources, targets = np.array([0, 5, 11, 21]), np.array([3, 14])
+    expected = network.distances_from(sources)
+
+    monkeypatch.setattr(road_network, "BATCH_CELLS", 2 * len(network))
+    distances = network.distances_from(sources, targets=targets)
+    assert distances.dtype == np.float32
+    assert distances.shape == (4, 2)
+    np.testing.assert_array_equal(distances, expected[:, targets])
+
+
+def test_incremental_keeps_network(tmp_path, monkeypatch):
+    """Test an incremental build after a network build keeps walking distances"""
+
+    config = write_network_data(tmp_path, max_radius=5000)
+    build_od(config, network=True)
+    monkeypatch.setattr(build_od_script, "load_config", lambda: config)
+
+    build_od_script.main(["--incremental"])
+    od = read_od_snapshot(os.path.join(tmp_path, "od")).to_frame()
+    np.testing.assert_allclose(od["distance"], [2200.0, 1200.0], atol=0.1)
+    assert build_od_script.previous_method(config) == "network"
@@ -1,13 +1,14 @@
 """Test snapping a point to nearest postcodes"""
 
 import pytest
-from src.backend.utils import snap_to_nearest_postcode
+from src.backend.utils import snap_many, snap_to_nearest_postcode
 from shapely.geometry import Point
 
-# test a city centre, suburban and rural postcode
+# test a city centre, suburban and rural postcode. Each point has a single
+# nearest postcode, as some postcodes share their centroid
 test_conf = [
     {'point': Point(-1.470599, 53.379244), 'result': "S1 2HJ"},
-    {'point': Point(-1.422872, 53.401068), 'result': "S9 2AG"},
+    {'point': Point(-1.421672, 53.401668), 'result': "S9 2AG"},
     {'point': Point(-1.59391, 53.36835), 'result': "S10 4QX"},
 ]
 
@@ -18,3 +19,13 @@ def test_snap_to_nearest_postcode(config):
 
     closest = snap_to_nearest_postcode(config["point"])
     assert closest["postcode"] == config["result"]
+
+
+def test_snap_many():
+    """Test batch snapping agrees with snapping one point at a time"""
+
+    points = [config["point"] for config in test_conf]
+    closest = snap_many(points)
+    assert closest["postcode"].to_list() == [
+        snap_to_nearest_postcode(point)["postcode"] for point in points
+    ]